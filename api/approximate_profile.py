@@ -0,0 +1,239 @@
+import json
+import math
+import random
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import salesforce.api.chunked_extract as chunked_extract
+import salesforce.api.columnar as columnar
+import salesforce.api.metadata_cache as metadata_cache
+import salesforce.api.query as query
+import salesforce.api.sketches as sketches
+import salesforce.log_config as log_config
+import salesforce.soql.soql as soql
+from salesforce.soql.soql_statement import quote_soql_value
+
+logger = log_config.get_logger(__name__)
+
+DEFAULT_EXACT_THRESHOLD = 50000
+DEFAULT_SAMPLE_BLOCKS = 20
+DEFAULT_BLOCK_SIZE = 500
+DEFAULT_TOP_VALUES = 3
+DEFAULT_CONCURRENCY = 4
+SAMPLE_BY_FIELDS = ('Id', 'CreatedDate')
+SALESFORCE_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f%z'
+
+
+class FieldProfile:
+    # Streams one field's values block by block. In exact mode it keeps a Counter; otherwise a
+    # HyperLogLog for distinct values, a Count-Min sketch for frequencies and a distinct value
+    # sample for the share of values seen exactly once, which is what scales distinct counts.
+    def __init__(self, field_name, exact=False, top_values=DEFAULT_TOP_VALUES):
+        self.field_name = field_name
+        self.exact = exact
+        self.top_values = top_values
+        self.nulls_by_block = []
+        self.sizes_by_block = []
+        if exact:
+            self.counts = Counter()
+        else:
+            self.distinct = sketches.HyperLogLog()
+            self.frequencies = sketches.CountMinSketch(top_k=top_values)
+            self.distinct_sample = sketches.DistinctSample()
+            # Exact counts per sampled block, bounded by the sample size, for the top value bounds.
+            self.counts_by_block = []
+
+    def start_block(self):
+        self.nulls_by_block.append(0)
+        self.sizes_by_block.append(0)
+        if not self.exact:
+            self.counts_by_block.append(Counter())
+
+    def add(self, value):
+        self.sizes_by_block[-1] += 1
+        if value is None:
+            self.nulls_by_block[-1] += 1
+            return
+        value = to_key(value)
+        if self.exact:
+            self.counts[value] += 1
+            return
+        self.counts_by_block[-1][value] += 1
+        hashes = sketches.hash_value(value)
+        self.distinct.add(value, hashes)
+        self.frequencies.add(value, hashes)
+        self.distinct_sample.add(value, hashes)
+
+    def summarize(self, total_records):
+        sampled = sum(self.sizes_by_block)
+        nulls = sum(self.nulls_by_block)
+        if self.exact:
+            distinct = len(self.counts)
+            return {
+                'fieldName': self.field_name,
+                'nullRate': create_bounds(nulls / sampled if sampled else 0.0),
+                'nonNullCount': create_bounds(sampled - nulls),
+                'distinctCount': create_bounds(distinct),
+                'topValues': [{'value': value, **create_bounds(count)} for value, count in self.counts.most_common(self.top_values)]
+            }
+
+        null_rate, null_lower, null_upper = sketches.cluster_ratio_interval(self.nulls_by_block, self.sizes_by_block)
+        non_null_upper = total_records * (1 - null_lower)
+        return {
+            'fieldName': self.field_name,
+            'nullRate': create_bounds(null_rate, null_lower, null_upper),
+            'nonNullCount': create_bounds(round(total_records * (1 - null_rate)), math.floor(total_records * (1 - null_upper)), math.ceil(non_null_upper)),
+            'distinctCount': self.estimate_distinct(min(sampled / total_records, 1) if total_records else 0, non_null_upper),
+            'topValues': self.estimate_top_values(total_records)
+        }
+
+    def estimate_distinct(self, sample_share, maximum):
+        # The point estimate is Haas and Stokes' Duj1, d / (1 - (1 - q) * f1 / n), which scales up
+        # when most sampled values are unique and stays near d when they repeat. The bounds are those
+        # of the guaranteed-error estimator: each value seen once stands for between 1 and 1 / q values.
+        # d is the HyperLogLog count, f1 the values seen once, n the non-null values and q the sampled share.
+        sample_distinct = self.distinct.count()
+        values = self.frequencies.total
+        if not values or not sample_share:
+            return create_bounds(0)
+        error = 2 * self.distinct.relative_error()
+        singletons = sample_distinct * self.distinct_sample.singleton_share()
+        repeated = sample_distinct - singletons
+        lower = max(sample_distinct * (1 - error), 1)
+        upper = min((singletons / sample_share + repeated) * (1 + error), maximum)
+        estimate = sample_distinct / max(1 - (1 - sample_share) * singletons / values, sample_share)
+        return create_bounds(round(min(max(estimate, lower), upper)), math.floor(min(lower, upper)), math.ceil(upper))
+
+    def estimate_top_values(self, total_records):
+        # The Count-Min sketch picks the candidates; their bounds come from their exact count in each
+        # block, with the same block-level interval as the null rate, since rows in a block are alike.
+        top_values = []
+        for value, _ in self.frequencies.get_top(self.top_values):
+            counts = [block_counts[value] for block_counts in self.counts_by_block]
+            share, lower, upper = sketches.cluster_ratio_interval(counts, self.sizes_by_block)
+            top_values.append({'value': value, **create_bounds(round(share * total_records), math.floor(lower * total_records), math.ceil(upper * total_records))})
+        return top_values
+
+
+def profile_object(object_name, field_names=None, exact_threshold=DEFAULT_EXACT_THRESHOLD, sample_blocks=DEFAULT_SAMPLE_BLOCKS,
+                   block_size=DEFAULT_BLOCK_SIZE, sample_by='Id', top_values=DEFAULT_TOP_VALUES, concurrency=DEFAULT_CONCURRENCY, seed=None):
+    # Estimates null rate, distinct count and most common values per field from sample_blocks runs
+    # of block_size consecutive rows starting at uniformly random rows in Id (or CreatedDate) order,
+    # with 95% bounds. Objects of at most exact_threshold rows are read in full instead and the results are exact.
+    if sample_by not in SAMPLE_BY_FIELDS:
+        raise ValueError(f"sample_by must be one of {SAMPLE_BY_FIELDS}")
+    if field_names is None:
+        field_names = [field['name'] for field in metadata_cache.get_metadata_cache().get_describe(object_name)['fields']]
+    total_records = fetch_total_records(object_name)
+    exact = total_records <= exact_threshold
+    profiles = {field_name: FieldProfile(field_name, exact=exact, top_values=top_values) for field_name in field_names}
+    groups = soql.plan_select_field_groups(object_name, field_names)
+
+    if exact:
+        blocks = [[soql.get_records_in_id_range(object_name, group) for group in groups]]
+    else:
+        starts = get_random_starts(object_name, sample_by, sample_blocks, random.Random(seed), total_records)
+        blocks = [[soql.get_sample_block(object_name, group, sample_by, start, block_size) for group in groups] for start in starts]
+
+    seen_keys = set()
+    sampled_rows = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for block in executor.map(fetch_block, blocks):
+            for profile in profiles.values():
+                profile.start_block()
+            sampled_rows += add_block(block, profiles, seen_keys)
+
+    logger.info("Profiled %s fields of %s from %s of %s rows (%s)", len(field_names), object_name, sampled_rows, total_records, 'exact' if exact else 'approximate')
+    return {
+        'objectName': object_name,
+        'totalRecords': total_records,
+        'sampledRows': sampled_rows,
+        'blocks': len(blocks),
+        'sampleBy': sample_by,
+        'exact': exact,
+        'fields': [profile.summarize(total_records) for profile in profiles.values()]
+    }
+
+def fetch_total_records(object_name):
+    return query.fetch_query_page(query.QUERY_PATH, params=query.prepare_payload(soql.get_record_count(object_name)))['totalSize']
+
+def fetch_block(query_strings):
+    # One list of records per field group; the groups select the same rows in the same order.
+    return [list(query.iter_query(query_string, prefetch=False)) for query_string in query_strings]
+
+def add_block(block, profiles, seen_keys):
+    # Rows already seen in an overlapping block are skipped so no row is counted twice.
+    rows = {}
+    for records in block:
+        for record in records:
+            rows.setdefault(record['Id'], {}).update(columnar.flatten_record(record))
+    added = 0
+    for key, row in rows.items():
+        if key in seen_keys:
+            continue
+        seen_keys.add(key)
+        added += 1
+        for field_name, profile in profiles.items():
+            profile.add(row.get(field_name))
+    return added
+
+def get_random_starts(object_name, sample_by, count, rng, total_records):
+    # Draws row ranks uniformly and finds the sample_by value at each rank, so the starts follow
+    # where the records are. Starts drawn uniformly between the lowest and highest value would mostly
+    # land in the gaps of sparse, clustered Ids and select the same rows after each gap. A rank is
+    # found by halving the value range with COUNT() queries (counts are shared between ranks) until
+    # the range holds at most soql.MAX_OFFSET rows, then reading the row at its offset.
+    to_number, to_literal = get_sample_key_codec(sample_by)
+    lower = to_number(fetch_boundary_value(object_name, sample_by)) - 1
+    upper = to_number(fetch_boundary_value(object_name, sample_by, descending=True)) + 1
+    counts = {}
+
+    def count_range(range_lower, range_upper):
+        if (range_lower, range_upper) not in counts:
+            where_clause = f'{sample_by} > {to_literal(range_lower)} AND {sample_by} <= {to_literal(range_upper)}'
+            counts[(range_lower, range_upper)] = query.fetch_query_page(
+                query.QUERY_PATH, params=query.prepare_payload(soql.get_record_count(object_name, where_clause)))['totalSize']
+        return counts[(range_lower, range_upper)]
+
+    starts = []
+    for rank in sorted(rng.randrange(max(total_records, 1)) for _ in range(count)):
+        range_lower, range_upper, offset = lower, upper, rank
+        size = count_range(range_lower, range_upper)
+        while size > soql.MAX_OFFSET and range_upper - range_lower > 1:
+            middle = (range_lower + range_upper) // 2
+            left = count_range(range_lower, middle)
+            if offset < left:
+                range_upper, size = middle, left
+            else:
+                range_lower, offset, size = middle, offset - left, size - left
+        if size == 0:
+            continue
+        query_string = soql.get_value_at_offset(object_name, sample_by, to_literal(range_lower), to_literal(range_upper), min(offset, size - 1))
+        records = query.fetch_query_page(query.QUERY_PATH, params=query.prepare_payload(query_string))['records']
+        if records:
+            starts.append(to_literal(to_number(records[0][sample_by])))
+    return starts
+
+def get_sample_key_codec(sample_by):
+    # Maps sample_by values to integers that keep their order, and integers back to SOQL literals.
+    if sample_by == 'Id':
+        return chunked_extract.id_to_number, lambda number: quote_soql_value(chunked_extract.number_to_id(number))
+    return (lambda value: int(datetime.strptime(value, SALESFORCE_DATETIME_FORMAT).timestamp()),
+            lambda seconds: quote_soql_value(datetime.fromtimestamp(seconds, tz=timezone.utc)))
+
+def fetch_boundary_value(object_name, field_name, descending=False):
+    query_string = soql.get_boundary_value(object_name, field_name, descending=descending)
+    return query.fetch_query_page(query.QUERY_PATH, params=query.prepare_payload(query_string))['records'][0][field_name]
+
+def create_bounds(estimate, lower=None, upper=None):
+    return {
+        'estimate': estimate,
+        'lower': estimate if lower is None else lower,
+        'upper': estimate if upper is None else upper
+    }
+
+def to_key(value):
+    if isinstance(value, (str, int, float, bool)):
+        return value
+    return json.dumps(value, sort_keys=True, default=str)
@@ -0,0 +1,64 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import salesforce.api.query as query
+import salesforce.api.transport as transport
+import salesforce.log_config as log_config
+
+logger = log_config.get_logger(__name__)
+
+DEFAULT_CONCURRENCY = 8
+
+# Requests are still made with the pooled blocking transport; asyncio only schedules them on a
+# thread pool sized to the concurrency cap, so every worker shares the same login and connections.
+
+async def run_query_async(query_string, semaphore, executor, tooling=False):
+    async with semaphore:
+        loop = asyncio.get_running_loop()
+        try:
+            records = await loop.run_in_executor(executor, fetch_all_records, query_string, tooling)
+            return create_result(query_string, records=records)
+        except requests.exceptions.RequestException as e:
+            logger.error("Error occurred while querying Salesforce API: %s", e)
+            return create_result(query_string, error=e)
+        except Exception as e:
+            # E.g. ApiLimitError or an undecodable page: fails this query only, not the whole gather.
+            logger.error("Error occurred while running query %s: %s: %s", query_string, type(e).__name__, e)
+            return create_result(query_string, error=e)
+
+async def run_queries_async(query_strings, concurrency=DEFAULT_CONCURRENCY, tooling=False):
+    if concurrency > transport.get_transport().pool_size:
+        logger.warning("Concurrency %s is larger than the connection pool size %s", concurrency, transport.get_transport().pool_size)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # Log in once up front so the workers don't all queue on the session lock.
+        await asyncio.get_running_loop().run_in_executor(executor, query.authenticate_and_get_session)
+        return await asyncio.gather(*(run_query_async(query_string, semaphore, executor, tooling=tooling) for query_string in query_strings))
+
+def run_queries(query_strings, concurrency=DEFAULT_CONCURRENCY, tooling=False):
+    return asyncio.run(run_queries_async(query_strings, concurrency=concurrency, tooling=tooling))
+
+def fetch_all_records(query_string, tooling=False):
+    return list(query.iter_query(query_string, tooling=tooling, prefetch=False))
+
+def create_result(query_string, records=None, error=None):
+    error_message, error_code = get_error_details(error)
+    return {
+        'queryString': query_string,
+        'records': records if records is not None else [],
+        'errorMessage': error_message,
+        'errorCode': error_code,
+        'hasError': error is not None
+    }
+
+def get_error_details(error):
+    if error is None:
+        return '', ''
+    try:
+        body = error.response.json()
+        return body[0]['message'], body[0]['errorCode']
+    except (AttributeError, KeyError, IndexError, TypeError, ValueError):
+        return str(error), ''
@@ -1,16 +1,38 @@
-import requests
+import hashlib
+import json
+import os
+import threading
+import time
+
 from xml.etree import ElementTree as ET
+import salesforce.api.tracing as tracing
+import salesforce.api.transport as transport
 import utilities.environment as environment
 
+SESSION_CACHE_DIR_VARIABLE = 'SALESFORCE_SESSION_CACHE_DIR'
+LOGIN_URL_VARIABLE = 'SALESFORCE_LOGIN_URL'
+LOGIN_PATH = '/services/Soap/u/58.0'
+DEFAULT_SESSION_SECONDS = 2 * 60 * 60
+EXPIRY_MARGIN_SECONDS = 5 * 60
+
+_session_managers = {}
+_session_managers_lock = threading.Lock()
+
 def authenticate_api(username, password, security_token, sandbox=False):
-    endpoint = 'https://test.salesforce.com/services/Soap/u/58.0' if sandbox else 'https://login.salesforce.com/services/Soap/u/58.0'
+    endpoint = get_login_endpoint(sandbox)
 
-    response = requests.post(endpoint, headers=get_header(), data=get_body(username, password, security_token))
-    response.raise_for_status()
+    with tracing.span('login', sandbox=sandbox):
+        response = transport.post(endpoint, headers=get_header(), data=get_body(username, password, security_token))
+        response.raise_for_status()
 
-    tree = get_tree(response.content)
+        tree = get_tree(response.content)
 
-    return get_session_id(tree, get_namespaces()), get_server_url(tree, get_namespaces()) 
+        return get_session_id(tree, get_namespaces()), get_server_url(tree, get_namespaces()) 
+
+def get_login_endpoint(sandbox=False):
+    # SALESFORCE_LOGIN_URL points logins at a My Domain or a local stub instead of login/test.salesforce.com.
+    login_url = os.environ.get(LOGIN_URL_VARIABLE) or ('https://test.salesforce.com' if sandbox else 'https://login.salesforce.com')
+    return login_url.rstrip('/') + LOGIN_PATH
 
 def get_header():
     return { 'content-type': 'text/xml',
@@ -44,6 +66,104 @@ def get_server_url(tree, namespaces):
     return tree.find('.//urn:serverUrl', namespaces).text
 
 
+class SessionManager:
+    # Logs in once and hands the same (session_id, server_url) to every caller until it
+    # expires or is invalidated. The lock is held while logging in so that threads asking
+    # at the same moment wait for the one login instead of starting their own.
+    def __init__(self, username, password, security_token, sandbox=False, cache_dir=None, session_seconds=DEFAULT_SESSION_SECONDS):
+        self._username = username
+        self._password = password
+        self._security_token = security_token
+        self._sandbox = sandbox
+        self._cache_dir = cache_dir
+        self._session_seconds = session_seconds
+        self._session = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+
+    def get_session(self):
+        with self._lock:
+            if self._session is None or time.time() >= self._expires_at:
+                with tracing.span('session') as span:
+                    cached = self._read_cache()
+                    span.set(cacheHit=cached is not None)
+                    self._session, self._expires_at = cached or self._login()
+            return self._session
+
+    def invalidate(self, session_id=None):
+        # Passing the session id that failed only drops it if nobody has refreshed it yet,
+        # so many threads hitting INVALID_SESSION_ID together cause a single new login.
+        with self._lock:
+            if self._session is not None and session_id not in (None, self._session[0]):
+                return
+            self._session = None
+            self._expires_at = 0
+            self._remove_cache()
+
+    def refresh(self, session_id=None):
+        self.invalidate(session_id)
+        return self.get_session()
+
+    def _login(self):
+        session = authenticate_api(self._username, self._password, self._security_token, sandbox=self._sandbox)
+        expires_at = time.time() + self._session_seconds - EXPIRY_MARGIN_SECONDS
+        self._write_cache(session, expires_at)
+        return session, expires_at
+
+    def _get_cache_path(self):
+        if not self._cache_dir:
+            return None
+        key = hashlib.sha256(f"{self._username}|{self._sandbox}".encode('utf-8')).hexdigest()
+        return os.path.join(self._cache_dir, f"session_{key}.json")
+
+    def _read_cache(self):
+        path = self._get_cache_path()
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as cache_file:
+                cached = json.load(cache_file)
+            if time.time() >= cached['expires_at']:
+                return None
+            return (cached['session_id'], cached['server_url']), cached['expires_at']
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _write_cache(self, session, expires_at):
+        path = self._get_cache_path()
+        if path is None:
+            return
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as cache_file:
+                json.dump({'session_id': session[0], 'server_url': session[1], 'expires_at': expires_at}, cache_file)
+        except OSError:
+            pass
+
+    def _remove_cache(self):
+        path = self._get_cache_path()
+        if path is not None and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def get_session_manager(username, password, security_token, sandbox=False, cache_dir=None):
+    if cache_dir is None:
+        cache_dir = os.environ.get(SESSION_CACHE_DIR_VARIABLE)
+    with _session_managers_lock:
+        key = (username, sandbox)
+        if key not in _session_managers:
+            _session_managers[key] = SessionManager(username, password, security_token, sandbox=sandbox, cache_dir=cache_dir)
+        return _session_managers[key]
+
+def clear_session_managers():
+    with _session_managers_lock:
+        _session_managers.clear()
+
+
 def main():
     session_id, server_url = authenticate_api(environment.get_salesforce_username(), environment.get_salesforce_password(), environment.get_salesforce_access_token(), sandbox=True)
     print(session_id)
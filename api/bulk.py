@@ -0,0 +1,141 @@
+import time
+
+import pandas as pd
+import requests
+
+import salesforce.api.columnar as columnar
+import salesforce.api.query as query
+import salesforce.log_config as log_config
+
+logger = log_config.get_logger(__name__)
+
+BULK_QUERY_PATH = '/services/data/v58.0/jobs/query'
+BULK_THRESHOLD = 50000
+DEFAULT_MAX_RECORDS = 50000
+DEFAULT_POLL_INTERVAL = 1
+MAX_POLL_INTERVAL = 30
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+FINISHED_STATE = 'JobComplete'
+ABORTED_STATE = 'Aborted'
+FAILED_STATES = ('Failed', ABORTED_STATE)
+
+
+class BulkJobError(Exception):
+    def __init__(self, job_id, state, message=''):
+        super().__init__(f"Bulk query job {job_id} ended in state {state}: {message}")
+        self.job_id = job_id
+        self.state = state
+        self.message = message
+
+
+def create_query_job(query_string, query_all=False):
+    body = {
+        'operation': 'queryAll' if query_all else 'query',
+        'query': query_string
+    }
+    response = query.post_with_session(BULK_QUERY_PATH, json=body)
+    response.raise_for_status()
+    job_id = response.json()['id']
+    logger.info("Created bulk query job %s", job_id)
+    return job_id
+
+def get_job_info(job_id):
+    response = query.get_with_session(f"{BULK_QUERY_PATH}/{job_id}")
+    response.raise_for_status()
+    return response.json()
+
+def wait_for_job(job_id, poll_interval=DEFAULT_POLL_INTERVAL, max_poll_interval=MAX_POLL_INTERVAL, timeout=None):
+    # Polls with exponential backoff so a long extract costs a handful of status calls, not hundreds.
+    started_at = time.monotonic()
+    while True:
+        job_info = get_job_info(job_id)
+        state = job_info['state']
+        if state == FINISHED_STATE:
+            return job_info
+        if state in FAILED_STATES:
+            raise BulkJobError(job_id, state, job_info.get('errorMessage', ''))
+        if timeout is not None and time.monotonic() - started_at + poll_interval > timeout:
+            # Nobody will read the results, so stop the job rather than leave it running on the org.
+            abort_job(job_id)
+            raise TimeoutError(f"Bulk query job {job_id} still {state} after {timeout} seconds")
+        logger.debug("Bulk query job %s is %s, checking again in %s seconds", job_id, state, poll_interval)
+        time.sleep(poll_interval)
+        poll_interval = min(poll_interval * 2, max_poll_interval)
+
+def abort_job(job_id):
+    try:
+        response = query.patch_with_session(f"{BULK_QUERY_PATH}/{job_id}", json={'state': ABORTED_STATE})
+        response.raise_for_status()
+        logger.info("Aborted bulk query job %s", job_id)
+    except requests.exceptions.RequestException as e:
+        logger.error("Error aborting bulk query job %s: %s", job_id, e)
+
+def iter_result_responses(job_id, max_records=DEFAULT_MAX_RECORDS):
+    # Each response is one CSV chunk; Sforce-Locator points at the next one until it reads 'null'.
+    locator = None
+    while True:
+        params = {'maxRecords': max_records}
+        if locator:
+            params['locator'] = locator
+        response = query.get_with_session(f"{BULK_QUERY_PATH}/{job_id}/results", params=params, stream=True)
+        response.raise_for_status()
+        response.raw.decode_content = True
+        try:
+            yield response
+        finally:
+            response.close()
+        locator = response.headers.get('Sforce-Locator')
+        if not locator or locator == 'null':
+            return
+
+def download_results(job_id, path, max_records=DEFAULT_MAX_RECORDS):
+    # Streams every chunk into one CSV file, keeping only the first chunk's header row.
+    record_count = 0
+    with open(path, 'wb') as output_file:
+        for index, response in enumerate(iter_result_responses(job_id, max_records=max_records)):
+            skip_header = index > 0
+            for content in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                if skip_header:
+                    header_end = content.find(b'\n')
+                    if header_end == -1:
+                        continue
+                    content = content[header_end + 1:]
+                    skip_header = False
+                output_file.write(content)
+            record_count += int(response.headers.get('Sforce-NumberOfRecords', 0))
+    logger.info("Downloaded %s records from bulk query job %s to %s", record_count, job_id, path)
+    return record_count
+
+def iter_result_dataframes(job_id, max_records=DEFAULT_MAX_RECORDS):
+    for response in iter_result_responses(job_id, max_records=max_records):
+        try:
+            frame = pd.read_csv(response.raw, dtype=str, keep_default_na=False)
+        except pd.errors.EmptyDataError:
+            # A chunk with no body at all, which can come back for a query without results.
+            frame = pd.DataFrame()
+        yield frame
+
+def run_bulk_query(query_string, path=None, query_all=False, max_records=DEFAULT_MAX_RECORDS, timeout=None):
+    # Returns the record count when writing to path, otherwise a generator of DataFrame chunks.
+    job_id = create_query_job(query_string, query_all=query_all)
+    wait_for_job(job_id, timeout=timeout)
+    if path is not None:
+        return download_results(job_id, path, max_records=max_records)
+    return iter_result_dataframes(job_id, max_records=max_records)
+
+def iter_query_dataframes(query_string, use_bulk=None, bulk_threshold=BULK_THRESHOLD, max_records=DEFAULT_MAX_RECORDS):
+    # With use_bulk left as None, the first REST page decides: its totalSize tells us whether the
+    # result is big enough to be worth a bulk job before any further pages are pulled.
+    if use_bulk:
+        yield from run_bulk_query(query_string, max_records=max_records)
+        return
+
+    first_page = query.fetch_query_page(query.QUERY_PATH, params=query.prepare_payload(query_string))
+    if use_bulk is None and first_page.get('totalSize', 0) > bulk_threshold:
+        logger.info("Query returns %s records, switching to Bulk API 2.0", first_page['totalSize'])
+        yield from run_bulk_query(query_string, max_records=max_records)
+        return
+
+    for records in query.iter_pages(first_page):
+        yield columnar.records_to_dataframe(records)
@@ -0,0 +1,203 @@
+import csv
+import json
+import math
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import salesforce.api.bulk as bulk
+import salesforce.api.columnar as columnar
+import salesforce.api.limits as limits
+import salesforce.api.query as query
+import salesforce.api.tracing as tracing
+import salesforce.api.transport as transport
+import salesforce.log_config as log_config
+import salesforce.soql.soql as soql
+
+logger = log_config.get_logger(__name__)
+
+DEFAULT_WORKERS = 8
+DEFAULT_CHUNK_SIZE = 100000
+DEFAULT_MAX_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 2
+# Record Ids are base62 in this alphabet, which is also their ASCII sort order, so a 15 character
+# Id can be treated as a number and Id ranges computed arithmetically.
+ID_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+ID_LENGTH = 15
+RETRYABLE_ERRORS = (requests.exceptions.RequestException, bulk.BulkJobError, TimeoutError)
+
+
+class ChunkExtractError(Exception):
+    def __init__(self, object_name, failed_chunks):
+        super().__init__(f"{len(failed_chunks)} chunk(s) of {object_name} failed: "
+                         + '; '.join(f"chunk {chunk['index']}: {chunk['error']}" for chunk in failed_chunks))
+        self.object_name = object_name
+        self.failed_chunks = failed_chunks
+
+
+def extract_object(object_name, field_names, output_dir, workers=DEFAULT_WORKERS, chunk_size=DEFAULT_CHUNK_SIZE,
+                   use_bulk=False, where_clause=None, max_retries=DEFAULT_MAX_RETRIES, skip_existing=True):
+    # Splits the object into Id ranges of about chunk_size records and extracts them in parallel,
+    # one CSV file per chunk in output_dir. Each chunk is retried on its own. The ranges are saved in
+    # a manifest, so re-running after a failure reuses them and only fetches the missing chunk files.
+    os.makedirs(output_dir, exist_ok=True)
+    ranges = load_manifest(output_dir, object_name, field_names, where_clause) if skip_existing else None
+    if ranges is None:
+        ranges = plan_id_ranges(object_name, chunk_size, where_clause)
+        save_manifest(output_dir, object_name, field_names, where_clause, ranges)
+    logger.info("Extracting %s in %s chunks with %s workers", object_name, len(ranges), workers)
+    if not use_bulk and workers > transport.get_transport().pool_size:
+        logger.warning("%s workers is more than the connection pool size %s", workers, transport.get_transport().pool_size)
+
+    def run(index_and_range):
+        index, (lower_id, upper_id) = index_and_range
+        path = get_chunk_path(output_dir, object_name, index)
+        query_string = soql.get_records_in_id_range(object_name, field_names, lower_id, upper_id, where_clause)
+        return run_chunk(index, query_string, field_names, path, lower_id, upper_id, use_bulk, max_retries, skip_existing)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        chunks = list(executor.map(run, enumerate(ranges)))
+
+    failed = [chunk for chunk in chunks if chunk['error']]
+    logger.info("Extracted %s records of %s into %s chunks, %s failed",
+                sum(chunk['records'] for chunk in chunks), object_name, len(chunks), len(failed))
+    if failed:
+        raise ChunkExtractError(object_name, failed)
+    return chunks
+
+def get_manifest_path(output_dir, object_name):
+    return os.path.join(output_dir, f'{object_name}_manifest.json')
+
+def save_manifest(output_dir, object_name, field_names, where_clause, ranges):
+    # Removes chunk files of an earlier plan first: their ranges need not match the new ones.
+    chunk_file_pattern = re.compile(rf'{re.escape(object_name)}_\d{{5}}\.csv')
+    for name in os.listdir(output_dir):
+        if chunk_file_pattern.fullmatch(name):
+            os.remove(os.path.join(output_dir, name))
+    manifest = {
+        'objectName': object_name,
+        'fieldNames': list(field_names),
+        'whereClause': where_clause,
+        'chunks': [{'index': index, 'lowerId': lower_id, 'upperId': upper_id} for index, (lower_id, upper_id) in enumerate(ranges)]
+    }
+    path = get_manifest_path(output_dir, object_name)
+    with open(f'{path}.part', 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(f'{path}.part', path)
+
+def load_manifest(output_dir, object_name, field_names, where_clause):
+    # Returns the saved ranges, or None when there is no manifest for this extract.
+    path = get_manifest_path(output_dir, object_name)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest['fieldNames'] != list(field_names) or manifest['whereClause'] != where_clause:
+        raise ValueError(f"{output_dir} holds an extract of {object_name} with other fields or filter; "
+                         "use another directory or pass skip_existing=False")
+    return [(chunk['lowerId'], chunk['upperId']) for chunk in sorted(manifest['chunks'], key=lambda chunk: chunk['index'])]
+
+def plan_id_ranges(object_name, chunk_size=DEFAULT_CHUNK_SIZE, where_clause=None):
+    # Three cheap calls: the record count picks the number of chunks, the lowest and highest Id bound them.
+    record_count = query.fetch_query_page(query.QUERY_PATH, params=query.prepare_payload(soql.get_record_count(object_name, where_clause)))['totalSize']
+    if record_count == 0:
+        return []
+    chunk_count = max(1, math.ceil(record_count / chunk_size))
+    if chunk_count == 1:
+        return [(None, None)]
+    min_id = get_boundary_id(object_name, where_clause)
+    max_id = get_boundary_id(object_name, where_clause, descending=True)
+    boundaries = compute_id_boundaries(min_id, max_id, chunk_count)
+    # The outer ranges are left open so records created outside [min_id, max_id] meanwhile are kept.
+    return list(zip([None] + boundaries, boundaries + [None]))
+
+def get_boundary_id(object_name, where_clause=None, descending=False):
+    query_string = soql.get_boundary_id(object_name, where_clause, descending=descending)
+    records = query.fetch_query_page(query.QUERY_PATH, params=query.prepare_payload(query_string))['records']
+    return records[0]['Id'][:ID_LENGTH]
+
+def compute_id_boundaries(min_id, max_id, chunk_count):
+    # Returns the chunk_count - 1 inner boundaries splitting [min_id, max_id] into equal Id ranges.
+    # Integer arithmetic throughout: 15 character Ids are far beyond what a float holds exactly.
+    low, high = id_to_number(min_id), id_to_number(max_id)
+    boundaries = []
+    for index in range(1, chunk_count):
+        boundary = number_to_id(low + (high - low) * index // chunk_count)
+        if not boundaries or boundary > boundaries[-1]:
+            boundaries.append(boundary)
+    return boundaries
+
+def id_to_number(record_id):
+    number = 0
+    for character in record_id[:ID_LENGTH]:
+        number = number * len(ID_ALPHABET) + ID_ALPHABET.index(character)
+    return number
+
+def number_to_id(number):
+    characters = []
+    for _ in range(ID_LENGTH):
+        number, remainder = divmod(number, len(ID_ALPHABET))
+        characters.append(ID_ALPHABET[remainder])
+    return ''.join(reversed(characters))
+
+def get_chunk_path(output_dir, object_name, index):
+    return os.path.join(output_dir, f'{object_name}_{index:05d}.csv')
+
+def run_chunk(index, query_string, field_names, path, lower_id, upper_id, use_bulk, max_retries, skip_existing):
+    chunk = {'index': index, 'lowerId': lower_id, 'upperId': upper_id, 'path': path, 'records': 0, 'attempts': 0, 'skipped': False, 'error': None}
+    if skip_existing and os.path.exists(path):
+        chunk['skipped'] = True
+        return chunk
+
+    with tracing.span('extract_chunk', index=index, bulk=use_bulk) as span:
+        while True:
+            chunk['attempts'] += 1
+            try:
+                chunk['records'] = extract_chunk(query_string, field_names, path, use_bulk)
+                chunk['error'] = None
+                break
+            except limits.ApiLimitError as e:
+                # Out of API budget: retrying would only spend more of it.
+                chunk['error'] = str(e)
+                break
+            except RETRYABLE_ERRORS as e:
+                chunk['error'] = str(e)
+                if chunk['attempts'] > max_retries:
+                    break
+                logger.warning("Chunk %s failed on attempt %s, retrying: %s", index, chunk['attempts'], e)
+                time.sleep(RETRY_BACKOFF_SECONDS * 2 ** (chunk['attempts'] - 1))
+            except Exception as e:
+                # Not worth retrying, but reported with the other chunks rather than ending the extract.
+                chunk['error'] = f'{type(e).__name__}: {e}'
+                break
+        span.set(records=chunk['records'], retries=chunk['attempts'] - 1)
+    if chunk['error']:
+        logger.error("Chunk %s failed after %s attempts: %s", index, chunk['attempts'], chunk['error'])
+    return chunk
+
+def extract_chunk(query_string, field_names, path, use_bulk=False):
+    # Writes to a temporary file and renames it when complete, so a chunk file on disk is always whole.
+    temporary_path = f'{path}.part'
+    try:
+        if use_bulk:
+            record_count = bulk.run_bulk_query(query_string, path=temporary_path)
+        else:
+            record_count = write_records_csv(query.iter_query(query_string, batched=True, prefetch=False), field_names, temporary_path)
+        os.replace(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+    return record_count
+
+def write_records_csv(pages, field_names, path):
+    record_count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as output_file:
+        writer = csv.DictWriter(output_file, fieldnames=field_names, extrasaction='ignore')
+        writer.writeheader()
+        for records in pages:
+            writer.writerows(columnar.flatten_record(record) for record in records)
+            record_count += len(records)
+    return record_count
@@ -0,0 +1,101 @@
+import pandas as pd
+
+import salesforce.api.metadata_cache as metadata_cache
+import salesforce.api.query as query
+import salesforce.api.tracing as tracing
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+NUMERIC_TYPES = ('double', 'currency', 'percent')
+
+
+class ColumnBuilder:
+    # Appends each record straight into per-column lists, so only the values are kept rather than
+    # one dict per row. Columns seen for the first time part way through are back-filled with None.
+    def __init__(self, field_types=None):
+        self.field_types = field_types or {}
+        self.columns = {}
+        self.row_count = 0
+
+    def add_records(self, records):
+        with tracing.span('flatten_records', records=len(records)):
+            for record in records:
+                flat_record = flatten_record(record)
+                for column in flat_record:
+                    if column not in self.columns:
+                        self.columns[column] = [None] * self.row_count
+                for column, values in self.columns.items():
+                    values.append(flat_record.get(column))
+                self.row_count += 1
+        return self
+
+    def to_dataframe(self):
+        # Columns are converted and released one at a time to keep the peak close to one copy.
+        with tracing.span('dataframe', records=self.row_count, columns=len(self.columns)):
+            self.drop_null_relationship_columns()
+            data = {}
+            for column in list(self.columns):
+                data[column] = convert_column(self.columns.pop(column), self.field_types.get(column))
+            self.row_count = 0
+            return pd.DataFrame(data)
+
+    def drop_null_relationship_columns(self):
+        # A null relationship ('Owner': None) arrives as a plain column; where other records filled in
+        # its child columns (Owner.Name), those already hold None for it and the plain column goes.
+        prefixes = {column.rsplit('.', 1)[0] for column in self.columns if '.' in column}
+        for prefix in list(prefixes):
+            while '.' in prefix:
+                prefix = prefix.rsplit('.', 1)[0]
+                prefixes.add(prefix)
+        for column in prefixes & set(self.columns):
+            if all(value is None for value in self.columns[column]):
+                del self.columns[column]
+
+    def to_arrow(self):
+        if pyarrow is None:
+            raise ImportError("pyarrow is required to build Arrow tables")
+        return pyarrow.Table.from_pandas(self.to_dataframe(), preserve_index=False)
+
+
+def flatten_record(record, prefix=''):
+    # Drops 'attributes' and turns relationship objects such as Owner into Owner.Name columns.
+    flat_record = {}
+    for key, value in record.items():
+        if key == 'attributes':
+            continue
+        if isinstance(value, dict) and 'records' not in value:
+            flat_record.update(flatten_record(value, prefix=f'{prefix}{key}.'))
+        else:
+            flat_record[f'{prefix}{key}'] = value
+    return flat_record
+
+def convert_column(values, field_type=None):
+    if field_type == 'date':
+        return pd.to_datetime(pd.Series(values, dtype=object), format='%Y-%m-%d', errors='coerce')
+    if field_type == 'datetime':
+        return pd.to_datetime(pd.Series(values, dtype=object), utc=True, errors='coerce')
+    if field_type == 'int':
+        return pd.Series(values, dtype='Int64')
+    if field_type in NUMERIC_TYPES:
+        return pd.Series(values, dtype='Float64')
+    if field_type == 'boolean':
+        return pd.Series(values, dtype='boolean')
+    if field_type == 'picklist':
+        return pd.Series(values, dtype='category')
+    return pd.Series(values)
+
+def get_field_types(object_name):
+    return {field['name']: field['type'] for field in metadata_cache.get_metadata_cache().get_describe(object_name)['fields']}
+
+def records_to_dataframe(records, field_types=None):
+    return ColumnBuilder(field_types).add_records(records).to_dataframe()
+
+def query_to_dataframe(query_string, object_name=None, tooling=False, as_arrow=False, cached=False):
+    # Builds the frame page by page from iter_query; pass object_name to type columns from its describe.
+    builder = ColumnBuilder(get_field_types(object_name) if object_name else None)
+    for records in query.iter_query(query_string, tooling=tooling, batched=True, cached=cached):
+        builder.add_records(records)
+    return builder.to_arrow() if as_arrow else builder.to_dataframe()
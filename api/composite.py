@@ -0,0 +1,137 @@
+import threading
+from concurrent.futures import Future
+from urllib.parse import urlencode
+
+import salesforce.api.query as query
+import salesforce.log_config as log_config
+
+logger = log_config.get_logger(__name__)
+
+API_VERSION = 'v58.0'
+COMPOSITE_BATCH_PATH = f'/services/data/{API_VERSION}/composite/batch'
+MAX_BATCH_SIZE = 25
+DEFAULT_FLUSH_INTERVAL = 0.05
+
+_batch_requester = None
+_batch_requester_lock = threading.Lock()
+
+
+class CompositeRequestError(Exception):
+    def __init__(self, status_code, result):
+        message = result[0].get('message', '') if isinstance(result, list) and result else str(result)
+        super().__init__(f"Sub-request failed with status {status_code}: {message}")
+        self.status_code = status_code
+        self.result = result
+
+
+class CompositeBatchError(Exception):
+    pass
+
+
+class BatchRequester:
+    # Collects sub-requests from any number of callers and sends them to /composite/batch up to
+    # 25 at a time. A batch goes out as soon as it is full or flush_interval seconds after its
+    # first sub-request arrived, so concurrent callers share round trips without coordinating.
+    def __init__(self, max_batch_size=MAX_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL, auto_flush=True):
+        self.max_batch_size = min(max_batch_size, MAX_BATCH_SIZE)
+        self.flush_interval = flush_interval
+        self.auto_flush = auto_flush
+        self._pending = []
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def submit(self, method, url):
+        future = Future()
+        with self._lock:
+            self._pending.append(({'method': method, 'url': url}, future))
+            if len(self._pending) >= self.max_batch_size:
+                batch = self._take_pending()
+            else:
+                batch = None
+                if self.auto_flush and self._timer is None:
+                    self._timer = threading.Timer(self.flush_interval, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+        if batch:
+            send_batch(batch)
+        return future
+
+    def query(self, query_string, tooling=False):
+        return self.submit('GET', get_query_url(query_string, tooling=tooling))
+
+    def describe(self, object_name):
+        return self.submit('GET', get_describe_url(object_name))
+
+    def limits(self):
+        return self.submit('GET', get_limits_url())
+
+    def flush(self):
+        with self._lock:
+            batch = self._take_pending()
+        if batch:
+            send_batch(batch)
+
+    def _take_pending(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        return batch
+
+
+def get_query_url(query_string, tooling=False):
+    endpoint = 'tooling/query' if tooling else 'query'
+    return f"{API_VERSION}/{endpoint}?{urlencode({'q': query_string})}"
+
+def get_describe_url(object_name):
+    return f"{API_VERSION}/sobjects/{object_name}/describe"
+
+def get_limits_url():
+    return f"{API_VERSION}/limits"
+
+def send_batch(batch):
+    # Resolves every future in the batch, including when the composite call itself fails.
+    try:
+        response = query.post_with_session(COMPOSITE_BATCH_PATH, json={
+            'batchRequests': [sub_request for sub_request, _ in batch],
+            'haltOnError': False
+        })
+        response.raise_for_status()
+        results = response.json()['results']
+    except Exception as e:
+        logger.error("Error occurred while sending composite batch: %s", e)
+        for _, future in batch:
+            future.set_exception(e)
+        return
+
+    logger.debug("Composite batch of %s sub-requests completed", len(batch))
+    for index, (_, future) in enumerate(batch):
+        try:
+            result = results[index]
+            if 200 <= result['statusCode'] < 300:
+                future.set_result(result['result'])
+            else:
+                future.set_exception(CompositeRequestError(result['statusCode'], result['result']))
+        except (IndexError, KeyError, TypeError) as e:
+            # A truncated or malformed response must not leave callers waiting forever.
+            future.set_exception(CompositeBatchError(f"No result for sub-request {index + 1} of {len(batch)} in the composite response: {e!r}"))
+
+def get_batch_requester():
+    global _batch_requester
+    with _batch_requester_lock:
+        if _batch_requester is None:
+            _batch_requester = BatchRequester()
+        return _batch_requester
+
+def describe_objects(object_names, requester=None):
+    requester = requester or get_batch_requester()
+    futures = [requester.describe(object_name) for object_name in object_names]
+    requester.flush()
+    return {object_name: future.result() for object_name, future in zip(object_names, futures)}
+
+def run_queries_in_batches(query_strings, tooling=False, requester=None):
+    # Returns the records of each query in input order; any further pages are fetched with plain REST.
+    requester = requester or get_batch_requester()
+    futures = [requester.query(query_string, tooling=tooling) for query_string in query_strings]
+    requester.flush()
+    return [[record for records in query.iter_pages(future.result(), prefetch=False) for record in records] for future in futures]
@@ -0,0 +1,221 @@
+import re
+import threading
+import time
+
+import salesforce.log_config as log_config
+
+logger = log_config.get_logger(__name__)
+
+LIMITS_PATH = '/services/data/v58.0/limits'
+DEFAULT_DAILY_SHARE = 0.8
+DEFAULT_MAX_CONCURRENT = 20
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_POLL_INTERVAL = 5 * 60
+# Once over budget, /limits is asked again before refusing, at most this often.
+REPOLL_INTERVAL = 30
+# Full concurrency while at least this share of the job's budget is left, scaling down to one below it.
+FULL_CONCURRENCY_HEADROOM = 0.2
+MIN_BACKOFF_SECONDS = 1
+MAX_BACKOFF_SECONDS = 120
+THROTTLE_STATUS_CODES = (429, 503)
+LIMIT_INFO_PATTERN = re.compile(r'api-usage=(\d+)/(\d+)')
+
+_governor = None
+_governor_lock = threading.Lock()
+
+
+class ApiLimitError(Exception):
+    def __init__(self, used, maximum, share):
+        super().__init__(f"Daily API usage {used}/{maximum} is over the allowed share of {share:.0%}")
+        self.used = used
+        self.maximum = maximum
+        self.share = share
+
+
+class LimitGovernor:
+    # Sits in front of every request the shared transport sends. It caps concurrent requests,
+    # lowering the cap as the daily budget runs out, optionally spaces them to a request rate,
+    # refuses to start new work once this job has used its share of the daily allowance (read from
+    # Sforce-Limit-Info and /limits, which is re-polled before refusing), and backs off adaptively
+    # after 429/503/REQUEST_LIMIT_EXCEEDED responses.
+    def __init__(self, daily_share=DEFAULT_DAILY_SHARE, max_concurrent=DEFAULT_MAX_CONCURRENT,
+                 max_requests_per_second=None, max_retries=DEFAULT_MAX_RETRIES, poll_interval=None, poller=None):
+        self.daily_share = daily_share
+        self.max_concurrent = max_concurrent
+        self.max_requests_per_second = max_requests_per_second
+        self.max_retries = max_retries
+        self.poll_interval = poll_interval
+        self.poller = poller
+        self._lock = threading.Lock()
+        self._slot_freed = threading.Condition(self._lock)
+        self._concurrency_limit = max_concurrent
+        self._local = threading.local()
+        self._daily_used = None
+        self._daily_max = None
+        self._in_flight = 0
+        self._requests_sent = 0
+        self._throttled = 0
+        self._backoff = 0
+        self._backoff_until = 0
+        self._next_request_at = 0
+        self._last_poll = None
+
+    def acquire(self):
+        # The poller's own /limits request skips the checks, so polling can't recurse or be refused.
+        if not getattr(self._local, 'polling', False):
+            self._poll_if_due()
+            self._check_daily_budget()
+            self._wait_for_turn()
+        with self._slot_freed:
+            while self._in_flight >= self._concurrency_limit:
+                self._slot_freed.wait()
+            self._in_flight += 1
+            self._requests_sent += 1
+
+    def release(self, response=None):
+        with self._slot_freed:
+            self._in_flight -= 1
+            self._slot_freed.notify()
+        if response is not None:
+            self.update_from_response(response)
+
+    def update_from_response(self, response):
+        match = LIMIT_INFO_PATTERN.search(response.headers.get('Sforce-Limit-Info', '') or '')
+        with self._lock:
+            if match:
+                self._daily_used, self._daily_max = int(match.group(1)), int(match.group(2))
+                self._adjust_concurrency()
+            if is_throttled(response):
+                self._throttled += 1
+                retry_after = get_retry_after(response)
+                self._backoff = min(max(self._backoff * 2, MIN_BACKOFF_SECONDS), MAX_BACKOFF_SECONDS)
+                self._backoff_until = time.monotonic() + max(self._backoff, retry_after)
+                logger.warning("Salesforce throttled a request (status %s), backing off %s seconds", response.status_code, max(self._backoff, retry_after))
+            elif self._backoff:
+                self._backoff = self._backoff / 2 if self._backoff > MIN_BACKOFF_SECONDS else 0
+
+    def update_from_limits(self, limits):
+        daily = limits.get('DailyApiRequests', {})
+        with self._lock:
+            if 'Max' in daily and 'Remaining' in daily:
+                self._daily_max = daily['Max']
+                self._daily_used = daily['Max'] - daily['Remaining']
+                self._adjust_concurrency()
+
+    def should_retry(self, response, attempt):
+        return attempt < self.max_retries and is_throttled(response)
+
+    def get_usage(self):
+        with self._lock:
+            return {
+                'dailyUsed': self._daily_used,
+                'dailyMax': self._daily_max,
+                'dailyShare': self.daily_share,
+                'inFlight': self._in_flight,
+                'maxConcurrent': self.max_concurrent,
+                'concurrencyLimit': self._concurrency_limit,
+                'requestsSent': self._requests_sent,
+                'throttled': self._throttled,
+                'backoffSeconds': self._backoff
+            }
+
+    def _check_daily_budget(self):
+        if not self._is_over_budget():
+            return
+        # Usage may be stale, e.g. the day rolled over or other jobs finished; ask once more.
+        with self._lock:
+            repoll = self.poller is not None and (self._last_poll is None or time.monotonic() - self._last_poll >= REPOLL_INTERVAL)
+        if repoll:
+            self._poll(force=True)
+        if self._is_over_budget():
+            with self._lock:
+                raise ApiLimitError(self._daily_used, self._daily_max, self.daily_share)
+
+    def _is_over_budget(self):
+        with self._lock:
+            used, maximum = self._daily_used, self._daily_max
+        return used is not None and bool(maximum) and used >= maximum * self.daily_share
+
+    def _adjust_concurrency(self):
+        # Called with the lock held.
+        budget = self._daily_max * self.daily_share
+        headroom = max(budget - self._daily_used, 0) / budget if budget else 1
+        limit = max(1, min(self.max_concurrent, round(self.max_concurrent * headroom / FULL_CONCURRENCY_HEADROOM)))
+        if limit != self._concurrency_limit:
+            logger.info("Concurrency limit now %s with %.0f%% of the API budget left", limit, headroom * 100)
+            if limit > self._concurrency_limit:
+                self._slot_freed.notify_all()
+            self._concurrency_limit = limit
+
+    def _wait_for_turn(self):
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._backoff_until, self._next_request_at)
+            if self.max_requests_per_second:
+                self._next_request_at = start_at + 1 / self.max_requests_per_second
+        if start_at > now:
+            time.sleep(start_at - now)
+
+    def _poll_if_due(self):
+        if self.poll_interval is not None:
+            self._poll()
+
+    def _poll(self, force=False):
+        if self.poller is None:
+            return
+        with self._lock:
+            if not force and self._last_poll is not None and time.monotonic() - self._last_poll < self.poll_interval:
+                return
+            # Set before polling so concurrent requests don't all poll at once.
+            self._last_poll = time.monotonic()
+        self._local.polling = True
+        try:
+            self.poller(self)
+        except Exception as e:
+            logger.error("Error occurred while polling API limits: %s", e)
+        finally:
+            self._local.polling = False
+
+
+def is_throttled(response):
+    if response.status_code in THROTTLE_STATUS_CODES:
+        return True
+    if response.status_code == 403:
+        try:
+            return b'REQUEST_LIMIT_EXCEEDED' in response.content
+        except (AttributeError, TypeError):
+            return False
+    return False
+
+def get_retry_after(response):
+    try:
+        return float(response.headers.get('Retry-After', 0))
+    except (TypeError, ValueError):
+        return 0
+
+def poll_limits(governor=None):
+    # Imported here because the transport imports this module and query imports the transport.
+    import salesforce.api.query as query
+
+    governor = governor or get_governor()
+    response = query.get_with_session(LIMITS_PATH)
+    response.raise_for_status()
+    limits = response.json()
+    governor.update_from_limits(limits)
+    return limits
+
+def get_governor():
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = LimitGovernor(poll_interval=DEFAULT_POLL_INTERVAL, poller=poll_limits)
+        return _governor
+
+def set_governor(governor):
+    global _governor
+    with _governor_lock:
+        previous, _governor = _governor, governor
+    return previous
+
+def get_usage():
+    return get_governor().get_usage()
@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from email.utils import formatdate
+
+import salesforce.api.composite as composite
+import salesforce.api.query as query
+import salesforce.api.tracing as tracing
+import salesforce.log_config as log_config
+import utilities.environment as environment
+
+logger = log_config.get_logger(__name__)
+
+METADATA_CACHE_PATH_VARIABLE = 'SALESFORCE_METADATA_CACHE'
+CACHE_HOME_VARIABLES = ('XDG_CACHE_HOME', 'LOCALAPPDATA')
+DEFAULT_TTL = 24 * 60 * 60
+
+CUSTOM_OBJECTS_QUERY = "SELECT Id, DeveloperName, NamespacePrefix FROM CustomObject"
+CUSTOM_FIELDS_QUERY = "SELECT TableEnumOrId, DeveloperName, NamespacePrefix FROM CustomField"
+
+_metadata_cache = None
+_metadata_cache_lock = threading.Lock()
+
+
+class MetadataCache:
+    # Keeps CustomObject/CustomField tooling records and sObject describes in SQLite with a TTL,
+    # and mirrors them into dictionaries so lookups after warm-up never touch the network or disk.
+    def __init__(self, path=':memory:', ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("""CREATE TABLE IF NOT EXISTS metadata (
+                                        kind TEXT NOT NULL,
+                                        name TEXT NOT NULL,
+                                        fetched_at REAL NOT NULL,
+                                        last_modified TEXT,
+                                        payload TEXT NOT NULL,
+                                        PRIMARY KEY (kind, name))""")
+        self._connection.commit()
+        self._lock = threading.RLock()
+        self._custom_objects = None
+        self._custom_fields = None
+        self._object_names_by_id = {}
+        self._field_names_by_object_id = {}
+        self._describes = {}
+        self._fields_by_object = {}
+        self._expires_at = {}
+        self._describes_in_flight = {}
+
+    def get_custom_objects(self):
+        with self._lock:
+            if self._custom_objects is None or self._is_expired_in_memory('tooling', 'CustomObject'):
+                self._custom_objects = self._load_tooling_records('CustomObject', CUSTOM_OBJECTS_QUERY)
+                self._object_names_by_id = {record['Id']: record['DeveloperName'] for record in self._custom_objects}
+            return self._custom_objects
+
+    def get_custom_fields(self):
+        with self._lock:
+            if self._custom_fields is None or self._is_expired_in_memory('tooling', 'CustomField'):
+                self._custom_fields = self._load_tooling_records('CustomField', CUSTOM_FIELDS_QUERY)
+                self._field_names_by_object_id = {}
+                for record in self._custom_fields:
+                    self._field_names_by_object_id.setdefault(record['TableEnumOrId'], []).append(record['DeveloperName'])
+            return self._custom_fields
+
+    def get_describe(self, object_name):
+        # Fetched outside the lock so concurrent describes of different objects can share a composite
+        # batch; concurrent misses for the same object wait on the first caller's Future.
+        with self._lock:
+            if object_name in self._describes and not self._is_expired_in_memory('describe', object_name):
+                return self._describes[object_name]
+            future = self._describes_in_flight.get(object_name)
+            if future is None:
+                future = self._describes_in_flight[object_name] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return future.result()
+
+        try:
+            with tracing.span('describe', objectName=object_name):
+                describe = self._load_describe(object_name)
+            with self._lock:
+                self._index_describe(object_name, describe)
+            future.set_result(describe)
+            return describe
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._describes_in_flight.pop(object_name, None)
+
+    def get_object_name(self, object_id):
+        self.get_custom_objects()
+        return self._object_names_by_id.get(object_id)
+
+    def get_object_field_names(self, object_id):
+        self.get_custom_fields()
+        return self._field_names_by_object_id.get(object_id, [])
+
+    def get_field_description(self, object_name, field_name):
+        self.get_describe(object_name)
+        return self._fields_by_object[object_name].get(field_name)
+
+    def get_field_type(self, object_name, field_name):
+        field = self.get_field_description(object_name, field_name)
+        return field['type'] if field else None
+
+    def invalidate(self, kind=None, name=None):
+        with self._lock:
+            if kind is None:
+                self._connection.execute("DELETE FROM metadata")
+            elif name is None:
+                self._connection.execute("DELETE FROM metadata WHERE kind = ?", (kind,))
+            else:
+                self._connection.execute("DELETE FROM metadata WHERE kind = ? AND name = ?", (kind, name))
+            self._connection.commit()
+            self._custom_objects = None
+            self._custom_fields = None
+            self._describes.clear()
+            self._fields_by_object.clear()
+            self._expires_at.clear()
+
+    def _index_describe(self, object_name, describe):
+        self._describes[object_name] = describe
+        self._fields_by_object[object_name] = {field['name']: field for field in describe['fields']}
+
+    def _load_tooling_records(self, name, query_string):
+        row = self._read('tooling', name)
+        if row is not None and not self._is_expired(row):
+            self._expires_at[('tooling', name)] = row['fetched_at'] + self.ttl
+            return json.loads(row['payload'])
+
+        records = [strip_attributes(record) for record in query.iter_query(query_string, tooling=True)]
+        self._write('tooling', name, records)
+        return records
+
+    def _load_describe(self, object_name):
+        # Runs without the lock held; only the SQLite reads and writes take it.
+        row = self._read('describe', object_name)
+        if row is None:
+            describe = composite.get_batch_requester().describe(object_name).result()
+            self._write('describe', object_name, describe)
+            return describe
+        if not self._is_expired(row):
+            with self._lock:
+                self._expires_at[('describe', object_name)] = row['fetched_at'] + self.ttl
+            return json.loads(row['payload'])
+
+        # Expired: ask the server whether the describe changed since we stored it.
+        path = f"/services/data/{composite.API_VERSION}/sobjects/{object_name}/describe"
+        response = query.get_with_session(path, headers={'If-Modified-Since': row['last_modified']})
+        if response.status_code == 304:
+            logger.debug("Describe for %s not modified since %s", object_name, row['last_modified'])
+            self._touch('describe', object_name)
+            return json.loads(row['payload'])
+        response.raise_for_status()
+        describe = response.json()
+        self._write('describe', object_name, describe, last_modified=response.headers.get('Last-Modified'))
+        return describe
+
+    def _is_expired_in_memory(self, kind, name):
+        return time.time() >= self._expires_at.get((kind, name), 0)
+
+    def _is_expired(self, row):
+        return time.time() - row['fetched_at'] >= self.ttl
+
+    def _read(self, kind, name):
+        with self._lock:
+            row = self._connection.execute("SELECT fetched_at, last_modified, payload FROM metadata WHERE kind = ? AND name = ?", (kind, name)).fetchone()
+        if row is None:
+            return None
+        return {'fetched_at': row[0], 'last_modified': row[1], 'payload': row[2]}
+
+    def _write(self, kind, name, payload, last_modified=None):
+        now = time.time()
+        with self._lock:
+            self._expires_at[(kind, name)] = now + self.ttl
+            self._connection.execute("INSERT OR REPLACE INTO metadata (kind, name, fetched_at, last_modified, payload) VALUES (?, ?, ?, ?, ?)",
+                                     (kind, name, now, last_modified or formatdate(now, usegmt=True), json.dumps(payload)))
+            self._connection.commit()
+
+    def _touch(self, kind, name):
+        with self._lock:
+            self._expires_at[(kind, name)] = time.time() + self.ttl
+            self._connection.execute("UPDATE metadata SET fetched_at = ? WHERE kind = ? AND name = ?", (time.time(), kind, name))
+            self._connection.commit()
+
+
+def strip_attributes(record):
+    return {key: value for key, value in record.items() if key != 'attributes'}
+
+def get_default_cache_path():
+    # One SQLite file per user under the user cache directory, since describes differ between orgs.
+    query.load_environment()
+    key = hashlib.sha256(environment.get_salesforce_username().encode('utf-8')).hexdigest()[:16]
+    cache_home = next((os.environ[name] for name in CACHE_HOME_VARIABLES if os.environ.get(name)), None)
+    return os.path.join(cache_home or os.path.join(os.path.expanduser('~'), '.cache'), 'salesforce', f'metadata_{key}.sqlite')
+
+def open_metadata_cache(path):
+    # SALESFORCE_METADATA_CACHE=:memory: keeps the cache in memory only.
+    try:
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        return MetadataCache(path)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning("Keeping org metadata in memory, could not open %s: %s", path, e)
+        return MetadataCache()
+
+def get_metadata_cache():
+    global _metadata_cache
+    with _metadata_cache_lock:
+        if _metadata_cache is None:
+            _metadata_cache = open_metadata_cache(os.environ.get(METADATA_CACHE_PATH_VARIABLE) or get_default_cache_path())
+        return _metadata_cache
+
+def set_metadata_cache(cache):
+    global _metadata_cache
+    with _metadata_cache_lock:
+        previous, _metadata_cache = _metadata_cache, cache
+    return previous
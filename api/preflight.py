@@ -0,0 +1,227 @@
+import hashlib
+import re
+
+import salesforce.api.bulk as bulk
+import salesforce.api.chunked_extract as chunked_extract
+import salesforce.api.query as query
+import salesforce.api.result_cache as result_cache
+import salesforce.log_config as log_config
+
+logger = log_config.get_logger(__name__)
+
+REST_STRATEGY = 'rest'
+REST_PAGED_STRATEGY = 'rest_paged'
+BULK_STRATEGY = 'bulk'
+CHUNKED_STRATEGY = 'chunked'
+
+REST_PAGE_SIZE = 2000
+CHUNKED_THRESHOLD = 5000000
+# Explain reports relativeCost > 1 for plans the optimizer considers non-selective.
+SELECTIVE_RELATIVE_COST = 1
+# A non-selective query over more rows than this is expected to hit the REST query timeout.
+NON_SELECTIVE_ROW_LIMIT = 1000000
+DEFAULT_PLAN_TTL = 60 * 60
+DEFAULT_COUNT_TTL = 5 * 60
+
+STRING_LITERAL_PATTERN = re.compile(r"'(?:[^'\\]|\\.)*'")
+NUMBER_LITERAL_PATTERN = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?(?:-\d\d-\d\d(?:T[\d:.]+(?:Z|[+-]\d\d:?\d\d)?)?)?(?![\w.])')
+AGGREGATE_PATTERN = re.compile(r'\b(COUNT|COUNT_DISTINCT|SUM|AVG|MIN|MAX)\s*\(', re.IGNORECASE)
+TRAILING_CLAUSE_PATTERN = re.compile(r'\s+(ORDER\s+BY\s+[^()]*?|LIMIT\s+\d+|OFFSET\s+\d+|FOR\s+(VIEW|REFERENCE|UPDATE))\s*$', re.IGNORECASE)
+LIMIT_PATTERN = re.compile(r'\bLIMIT\s+(\d+)\b', re.IGNORECASE)
+CLAUSE_KEYWORD_PATTERN = re.compile(r'\b(WITH|GROUP\s+BY|ORDER\s+BY|LIMIT|OFFSET|FOR\s+(VIEW|REFERENCE|UPDATE))\b', re.IGNORECASE)
+
+_plan_cache = None
+
+
+class QueryRejectedError(Exception):
+    def __init__(self, query_string, reason, plan=None):
+        super().__init__(f"Query rejected before running: {reason}")
+        self.query_string = query_string
+        self.reason = reason
+        self.plan = plan
+
+
+def plan_query(query_string, max_rows=None, use_count=True, cache=None):
+    # Decides how to run a query from its explain plan and a COUNT() of the rows it matches, and
+    # raises QueryRejectedError when it shouldn't run at all. Explain plans are cached per query
+    # shape (the query with its literals blanked out), but only the plan's index choice and
+    # selectivity carry over between literals; row counts always come from the query itself.
+    cache = cache or get_plan_cache()
+    parts = parse_query(query_string)
+    normalized = result_cache.normalize_soql(query_string)
+    shape_entry = cache.get_or_fetch(make_key('explain', get_query_shape(query_string)),
+                                     lambda: {'queryString': normalized, 'explain': fetch_explain(query_string)}, ttl=DEFAULT_PLAN_TTL)
+    best_plan = get_best_plan(shape_entry['explain'])
+    selective = best_plan.get('relativeCost', 0) <= SELECTIVE_RELATIVE_COST
+    object_rows = best_plan.get('sobjectCardinality', 0)
+
+    counted = False
+    if use_count and not parts['isAggregate'] and (selective or object_rows <= NON_SELECTIVE_ROW_LIMIT):
+        # Counting is skipped where it would be as slow as the query itself.
+        count_query = get_count_query(parts)
+        estimated_rows = cache.get_or_fetch(make_key('count', result_cache.normalize_soql(count_query)), lambda: fetch_count(count_query), ttl=DEFAULT_COUNT_TTL)
+        counted = True
+    elif shape_entry['queryString'] == normalized:
+        estimated_rows = best_plan.get('cardinality', object_rows)
+    else:
+        # The shape's plan was explained for other literals; explain this query for its own estimate.
+        explain = cache.get_or_fetch(make_key('explain_query', normalized), lambda: fetch_explain(query_string), ttl=DEFAULT_COUNT_TTL)
+        estimated_rows = get_best_plan(explain).get('cardinality', object_rows)
+    if parts['limit'] is not None:
+        estimated_rows = min(estimated_rows, parts['limit'])
+
+    plan = {
+        'queryString': query_string,
+        'objectName': parts['objectName'],
+        'estimatedRows': estimated_rows,
+        'counted': counted,
+        'objectRows': object_rows,
+        'selective': selective,
+        'relativeCost': best_plan.get('relativeCost'),
+        'leadingOperationType': best_plan.get('leadingOperationType'),
+        'notes': [note.get('description') for note in best_plan.get('notes', [])],
+        'strategy': None,
+        'reason': None
+    }
+    plan['strategy'], plan['reason'] = choose_strategy(parts, plan, max_rows)
+    if plan['strategy'] is None:
+        raise QueryRejectedError(query_string, plan['reason'], plan)
+    logger.info("Preflight for %s: %s (%s)", parts['objectName'], plan['strategy'], plan['reason'])
+    return plan
+
+def choose_strategy(parts, plan, max_rows=None):
+    # Returns (strategy, reason); a strategy of None means the query is rejected for that reason.
+    rows = plan['estimatedRows']
+    if max_rows is not None and rows > max_rows:
+        return None, f"it would return about {rows} rows, more than the allowed {max_rows}"
+    # Small objects are scanned quickly whatever the plan.
+    slow_scan = not plan['selective'] and plan['objectRows'] > NON_SELECTIVE_ROW_LIMIT
+    if slow_scan:
+        if parts['isAggregate']:
+            return None, (f"the aggregate is non-selective ({plan['leadingOperationType']}, relative cost {plan['relativeCost']}) over "
+                          f"{plan['objectRows']} {parts['objectName']} rows and would time out; filter on an indexed field")
+        if not parts['isBulkSupported']:
+            return None, (f"it is non-selective ({plan['leadingOperationType']}) over {plan['objectRows']} rows and uses "
+                          f"clauses the Bulk API doesn't support, so it can only run through REST, where it would time out")
+    if parts['isAggregate'] or rows <= REST_PAGE_SIZE and not slow_scan:
+        return REST_STRATEGY, f"about {rows} rows in one page"
+    if rows > CHUNKED_THRESHOLD and parts['isChunkable']:
+        return CHUNKED_STRATEGY, f"about {rows} rows, more than {CHUNKED_THRESHOLD}, split into parallel Id ranges"
+    if parts['isBulkSupported'] and (rows > bulk.BULK_THRESHOLD or slow_scan):
+        return BULK_STRATEGY, f"about {rows} rows" + (' from a non-selective plan' if slow_scan else '')
+    return REST_PAGED_STRATEGY, f"about {rows} rows over {max(1, -(-rows // REST_PAGE_SIZE))} pages"
+
+def run_query(query_string, output_path=None, max_rows=None, workers=chunked_extract.DEFAULT_WORKERS):
+    # Plans and runs the query. REST strategies return the records; bulk returns DataFrame chunks or,
+    # with output_path, writes one CSV; chunked writes one CSV per chunk into output_path, a directory.
+    plan = plan_query(query_string, max_rows=max_rows)
+    strategy = plan['strategy']
+    if strategy in (REST_STRATEGY, REST_PAGED_STRATEGY):
+        return list(query.iter_query(query_string))
+    if strategy == BULK_STRATEGY:
+        return bulk.run_bulk_query(query_string, path=output_path)
+    if output_path is None:
+        raise ValueError(f"The query returns about {plan['estimatedRows']} rows and is extracted in chunks; pass an output directory")
+    parts = parse_query(query_string)
+    return chunked_extract.extract_object(parts['objectName'], parts['fieldNames'], output_path, workers=workers, where_clause=parts['whereClause'])
+
+def run_bulk_query_dto(query_string, plan):
+    # For run_query_using_requests, which returns every record in memory: chunked plans run as one
+    # bulk job here, since chunking only pays off when writing files (see run_query). Bulk results
+    # are CSV, so relationship fields come back flattened ('Owner.Name') and every value is a string.
+    records = [record for frame in bulk.run_bulk_query(query_string) for record in frame.to_dict('records')]
+    logger.info("Fetched %s records of %s through a bulk job (%s)", len(records), plan['objectName'], plan['reason'])
+    return query.create_records_dto(query_string, records, strategy=plan['strategy'])
+
+def parse_query(query_string):
+    # Splits a SOQL query at its top-level FROM, ignoring any FROM inside parenthesised subqueries.
+    query_string = query_string.strip()
+    match = re.match(r'SELECT\s+', query_string, re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Not a SELECT query: {query_string}")
+    depth = 0
+    from_index = None
+    for index in range(match.end(), len(query_string)):
+        character = query_string[index]
+        if character == '(':
+            depth += 1
+        elif character == ')':
+            depth -= 1
+        elif depth == 0 and re.match(r'\sFROM\s', query_string[index - 1:index + 5], re.IGNORECASE):
+            from_index = index
+            break
+    if from_index is None:
+        raise ValueError(f"No FROM clause in query: {query_string}")
+
+    select_list = query_string[match.end():from_index].strip()
+    object_name, *rest = query_string[from_index + 4:].split(None, 1)
+    rest = rest[0].strip() if rest else ''
+    # Keywords inside string literals or parentheses don't start a clause.
+    masked_rest = mask_nested(rest)
+    limit = LIMIT_PATTERN.search(masked_rest)
+    has_subquery = '(' in select_list and 'SELECT' in select_list.upper()
+    is_aggregate = bool(AGGREGATE_PATTERN.search(select_list)) or bool(re.search(r'\bGROUP\s+BY\b', masked_rest, re.IGNORECASE))
+    unsupported_by_bulk = is_aggregate or has_subquery or bool(re.search(r'\bOFFSET\b', masked_rest, re.IGNORECASE)) or 'TYPEOF' in select_list.upper()
+    where_clause = None
+    if re.match(r'WHERE\s', masked_rest, re.IGNORECASE):
+        clause = CLAUSE_KEYWORD_PATTERN.search(masked_rest, 5)
+        where_clause = rest[5:clause.start() if clause else len(rest)].strip()
+    # A chunk appends 'AND Id > ...' to the where clause, so anything after it would be cut off.
+    has_other_clauses = bool(CLAUSE_KEYWORD_PATTERN.search(masked_rest)) or bool(masked_rest) and where_clause is None
+    return {
+        'objectName': object_name,
+        'fieldNames': [field_name.strip() for field_name in select_list.split(',')] if not has_subquery else None,
+        'rest': rest,
+        'whereClause': where_clause,
+        'limit': int(limit.group(1)) if limit else None,
+        'isAggregate': is_aggregate,
+        'isBulkSupported': not unsupported_by_bulk,
+        'isChunkable': not unsupported_by_bulk and not has_other_clauses
+    }
+
+def mask_nested(text):
+    # Blanks out string literals and parenthesised text, keeping every other character in place.
+    text = STRING_LITERAL_PATTERN.sub(lambda literal: ' ' * len(literal.group()), text)
+    masked = []
+    depth = 0
+    for character in text:
+        if character == '(':
+            depth += 1
+        masked.append(character if depth == 0 else ' ')
+        if character == ')':
+            depth = max(depth - 1, 0)
+    return ''.join(masked)
+
+def get_count_query(parts):
+    rest = parts['rest']
+    while True:
+        stripped = TRAILING_CLAUSE_PATTERN.sub('', rest)
+        if stripped == rest:
+            break
+        rest = stripped
+    return f"SELECT COUNT() FROM {parts['objectName']}{' ' + rest if rest else ''}"
+
+def get_query_shape(query_string):
+    # The query with literals replaced, so 'WHERE Name = 'A'' and 'WHERE Name = 'B'' share a plan.
+    shape = STRING_LITERAL_PATTERN.sub('?', result_cache.normalize_soql(query_string))
+    return NUMBER_LITERAL_PATTERN.sub('?', shape)
+
+def get_best_plan(explain):
+    return min(explain.get('plans', []), key=lambda plan: plan.get('relativeCost', 0), default={})
+
+def make_key(kind, text):
+    return hashlib.sha256(f'{kind}\n{text}'.encode('utf-8')).hexdigest()
+
+def fetch_explain(query_string):
+    response = query.get_with_session(query.QUERY_PATH, params={'explain': query_string})
+    response.raise_for_status()
+    return response.json()
+
+def fetch_count(count_query):
+    return query.fetch_query_page(query.QUERY_PATH, params=query.prepare_payload(count_query))['totalSize']
+
+def get_plan_cache():
+    global _plan_cache
+    if _plan_cache is None:
+        _plan_cache = result_cache.ResultCache(max_entries=1024, default_ttl=DEFAULT_PLAN_TTL)
+    return _plan_cache
@@ -0,0 +1,340 @@
+import json
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+import salesforce.api.approximate_profile as approximate_profile
+import salesforce.api.async_query as async_query
+import salesforce.api.limits as limits
+import salesforce.api.metadata_cache as metadata_cache
+import salesforce.api.query as query
+import salesforce.api.query_repair as query_repair
+import salesforce.log_config as log_config
+import salesforce.soql.soql as soql
+import utilities.format as format
+
+logger = log_config.get_logger(__name__)
+
+DEFAULT_STORE_PATH = 'salesforce_profile.sqlite'
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TOP_VALUES = 3
+COUNT_UNIT = 'count'
+TOP_VALUES_UNIT = 'top_values'
+LAST_POPULATED_UNIT = 'last_populated'
+APPROXIMATE_UNIT = 'approximate'
+DONE = 'done'
+PENDING = 'pending'
+FAILED = 'failed'
+DEFAULT_SETTINGS = {
+    'objectNames': None,
+    'topValues': DEFAULT_TOP_VALUES,
+    'lastPopulated': True,
+    'approximate': False,
+    'exactThreshold': approximate_profile.DEFAULT_EXACT_THRESHOLD
+}
+
+
+class ProfileStore:
+    # The plan (objects, fields and units of work) and every finished unit's result live in one
+    # SQLite file. A unit's result is committed as soon as it finishes, so a restart only runs the
+    # units that are still pending or failed.
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("""CREATE TABLE IF NOT EXISTS profile_fields (
+                                        object_name TEXT NOT NULL,
+                                        field_name TEXT NOT NULL,
+                                        field_type TEXT,
+                                        PRIMARY KEY (object_name, field_name))""")
+        self._connection.execute("""CREATE TABLE IF NOT EXISTS profile_units (
+                                        unit_id TEXT PRIMARY KEY,
+                                        object_name TEXT NOT NULL,
+                                        field_name TEXT,
+                                        kind TEXT NOT NULL,
+                                        status TEXT NOT NULL,
+                                        result TEXT,
+                                        error TEXT,
+                                        finished_at REAL)""")
+        self._connection.execute("""CREATE TABLE IF NOT EXISTS profile_settings (
+                                        name TEXT PRIMARY KEY,
+                                        value TEXT)""")
+        self._connection.commit()
+
+    def has_plan(self):
+        return self._connection.execute("SELECT COUNT(*) FROM profile_units").fetchone()[0] > 0
+
+    def save_plan(self, fields, units, settings=None):
+        with self._connection:
+            self._connection.execute("DELETE FROM profile_fields")
+            self._connection.execute("DELETE FROM profile_units")
+            self._connection.execute("DELETE FROM profile_settings")
+            self._connection.executemany("INSERT INTO profile_settings (name, value) VALUES (?, ?)",
+                                         [(name, json.dumps(value)) for name, value in (settings or {}).items()])
+            self._connection.executemany("INSERT INTO profile_fields (object_name, field_name, field_type) VALUES (?, ?, ?)", fields)
+            self._connection.executemany("INSERT INTO profile_units (unit_id, object_name, field_name, kind, status) VALUES (?, ?, ?, ?, ?)",
+                                         [(unit['unitId'], unit['objectName'], unit['fieldName'], unit['kind'], PENDING) for unit in units])
+
+    def get_settings(self):
+        return {name: json.loads(value) for name, value in self._connection.execute("SELECT name, value FROM profile_settings")}
+
+    def get_unfinished_units(self):
+        cursor = self._connection.execute("SELECT unit_id, object_name, field_name, kind FROM profile_units WHERE status != ? ORDER BY rowid", (DONE,))
+        return [create_unit(object_name, field_name, kind) for _, object_name, field_name, kind in cursor.fetchall()]
+
+    def finish_unit(self, unit, result=None, error=None):
+        with self._connection:
+            self._connection.execute("UPDATE profile_units SET status = ?, result = ?, error = ?, finished_at = ? WHERE unit_id = ?",
+                                     (FAILED if error else DONE, json.dumps(result), error, time.time(), unit['unitId']))
+
+    def get_fields(self):
+        return self._connection.execute("SELECT object_name, field_name, field_type FROM profile_fields ORDER BY rowid").fetchall()
+
+    def get_results(self):
+        cursor = self._connection.execute("SELECT object_name, field_name, kind, status, result, error FROM profile_units")
+        return [{
+            'objectName': object_name,
+            'fieldName': field_name,
+            'kind': kind,
+            'status': status,
+            'result': json.loads(result) if result else None,
+            'error': error
+        } for object_name, field_name, kind, status, result, error in cursor.fetchall()]
+
+    def get_progress(self):
+        cursor = self._connection.execute("SELECT status, COUNT(*) FROM profile_units GROUP BY status")
+        return dict(cursor.fetchall())
+
+    def close(self):
+        self._connection.close()
+
+
+def run_profile(object_names=None, store_path=DEFAULT_STORE_PATH, output_path=None, concurrency=DEFAULT_CONCURRENCY,
+                top_values=None, last_populated=None, replan=False, approximate=None, exact_threshold=None):
+    # Profiles every field of the given objects (all custom objects by default): non-null counts,
+    # the most common values and when each field was last populated. Returns the progress counts.
+    # With approximate, counts and top values are estimated from samples for objects larger than
+    # exact_threshold rows, and distinct counts and confidence bounds are added.
+    # Settings left as None take the stored plan's values when resuming, else the defaults; a
+    # setting that differs from the stored plan raises ValueError unless replan is set.
+    check_output_path(output_path)
+    requested = {
+        'objectNames': sorted(object_names) if object_names else None,
+        'topValues': top_values,
+        'lastPopulated': last_populated,
+        'approximate': approximate,
+        'exactThreshold': exact_threshold
+    }
+    store = ProfileStore(store_path)
+    try:
+        if replan or not store.has_plan():
+            settings = {**DEFAULT_SETTINGS, **{name: value for name, value in requested.items() if value is not None}}
+            settings['objectNames'] = settings['objectNames'] or sorted(get_custom_object_api_names())
+            fields, units = plan_profile(settings['objectNames'], top_values=settings['topValues'], last_populated=settings['lastPopulated'],
+                                         concurrency=concurrency, approximate=settings['approximate'])
+            store.save_plan(fields, units, settings)
+            logger.info("Planned %s units of work over %s objects", len(units), len(settings['objectNames']))
+        else:
+            settings = {**DEFAULT_SETTINGS, **store.get_settings()}
+            conflicts = [name for name, value in requested.items() if value is not None and value != settings[name]]
+            if conflicts:
+                raise ValueError(f"{store_path} holds a profile planned with other settings ({', '.join(conflicts)}); "
+                                 "replan to discard it or use another store")
+            logger.info("Resuming profile from %s: %s", store_path, store.get_progress())
+
+        run_units(store, store.get_unfinished_units(), concurrency=concurrency, top_values=settings['topValues'], exact_threshold=settings['exactThreshold'])
+        progress = store.get_progress()
+        if output_path:
+            write_results(build_result_rows(store), output_path)
+            logger.info("Wrote profile of %s fields to %s", len(store.get_fields()), output_path)
+        return progress
+    finally:
+        store.close()
+
+def get_custom_object_api_names():
+    # Tooling records from the metadata cache, named the same way as query.get_custom_object_names.
+    import pandas as pd
+
+    records = metadata_cache.get_metadata_cache().get_custom_objects()
+    if not records:
+        return []
+    objects = format.format_api_names_from_tooling_api(pd.DataFrame(records))
+    return objects['DeveloperName'].tolist()
+
+def plan_profile(object_names, top_values=DEFAULT_TOP_VALUES, last_populated=True, concurrency=DEFAULT_CONCURRENCY, approximate=False):
+    # Describes run concurrently so the composite batcher can bundle them. Objects that can't be
+    # described or queried are logged and left out of the plan.
+    cache = metadata_cache.get_metadata_cache()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        describes = list(executor.map(lambda object_name: try_describe(cache, object_name), object_names))
+
+    fields = []
+    units = []
+    for object_name, describe in zip(object_names, describes):
+        if describe is None or not describe.get('queryable', True):
+            logger.warning("Skipping %s: it can't be described or queried", object_name)
+            continue
+        object_fields = describe['fields']
+        fields.extend((object_name, field['name'], field.get('type')) for field in object_fields)
+        units.append(create_unit(object_name, None, APPROXIMATE_UNIT if approximate else COUNT_UNIT))
+        for field in object_fields:
+            if top_values and not approximate and field.get('groupable', True):
+                units.append(create_unit(object_name, field['name'], TOP_VALUES_UNIT))
+            if last_populated and field.get('filterable', True) and field['name'] != 'CreatedDate':
+                units.append(create_unit(object_name, field['name'], LAST_POPULATED_UNIT))
+    return fields, units
+
+def try_describe(cache, object_name):
+    try:
+        return cache.get_describe(object_name)
+    except Exception as e:
+        logger.error("Error describing %s: %s", object_name, e)
+        return None
+
+def create_unit(object_name, field_name, kind):
+    return {
+        'unitId': f"{object_name}.{field_name or '*'}.{kind}",
+        'objectName': object_name,
+        'fieldName': field_name,
+        'kind': kind
+    }
+
+def run_units(store, units, concurrency=DEFAULT_CONCURRENCY, top_values=DEFAULT_TOP_VALUES, exact_threshold=approximate_profile.DEFAULT_EXACT_THRESHOLD):
+    # Workers only query; results are written from this thread, one commit per finished unit.
+    # Running out of API budget stops new units from starting and leaves them pending for the next run.
+    pending = iter(units)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        running = {}
+        stopped = False
+        while True:
+            while not stopped and len(running) < concurrency * 2:
+                unit = next(pending, None)
+                if unit is None:
+                    break
+                running[executor.submit(run_unit, unit, top_values, exact_threshold)] = unit
+            if not running:
+                return
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                unit = running.pop(future)
+                try:
+                    store.finish_unit(unit, result=future.result())
+                except limits.ApiLimitError as e:
+                    logger.error("Stopping the profile run: %s", e)
+                    stopped = True
+                except requests.exceptions.RequestException as e:
+                    error_message, error_code = async_query.get_error_details(e)
+                    logger.error("Unit %s failed: %s %s", unit['unitId'], error_code, error_message)
+                    store.finish_unit(unit, error=f"{error_code}: {error_message}" if error_code else error_message)
+                except Exception as e:
+                    # Anything else is recorded against the unit too, so one bad object can't end the run.
+                    logger.error("Unit %s failed: %s", unit['unitId'], e)
+                    store.finish_unit(unit, error=str(e))
+
+def run_unit(unit, top_values=DEFAULT_TOP_VALUES, exact_threshold=approximate_profile.DEFAULT_EXACT_THRESHOLD):
+    object_name, field_name = unit['objectName'], unit['fieldName']
+    if unit['kind'] == APPROXIMATE_UNIT:
+        return approximate_profile.profile_object(object_name, top_values=top_values, exact_threshold=exact_threshold)
+    if unit['kind'] == COUNT_UNIT:
+        field_names = [field['name'] for field in metadata_cache.get_metadata_cache().get_describe(object_name)['fields']]
+        return query_repair.get_count_of_fields_values_repaired(object_name, field_names)
+    if unit['kind'] == TOP_VALUES_UNIT:
+        records = fetch_records(soql.get_most_common_values(object_name, field_name, groups_to_count=top_values))
+        return [{'value': record.get(field_name), 'count': record.get('expr0')} for record in records]
+    records = fetch_records(soql.get_last_created_with_field(object_name, field_name))
+    return {'createdDate': records[0].get('CreatedDate'), 'value': records[0].get(field_name)} if records else None
+
+def fetch_records(query_string):
+    return query.fetch_query_page(query.QUERY_PATH, params=query.prepare_payload(query_string)).get('records', [])
+
+def build_result_rows(store):
+    # One row per field, combining the count, top values and last populated units.
+    rows = {}
+    rows_by_object = {}
+    for object_name, field_name, field_type in store.get_fields():
+        row = rows[(object_name, field_name)] = {
+            'objectName': object_name,
+            'fieldName': field_name,
+            'fieldType': field_type,
+            'nonNullCount': None,
+            'topValues': None,
+            'lastPopulatedDate': None,
+            'nonNullCountLower': None,
+            'nonNullCountUpper': None,
+            'distinctCount': None,
+            'distinctCountLower': None,
+            'distinctCountUpper': None,
+            'isApproximate': False,
+            'errors': None
+        }
+        rows_by_object.setdefault(object_name, []).append(row)
+    for unit in store.get_results():
+        if unit['kind'] == APPROXIMATE_UNIT:
+            if unit['error']:
+                for row in rows_by_object.get(unit['objectName'], []):
+                    add_error(row, unit['error'])
+            elif unit['result']:
+                add_approximate_result(rows, unit['result'])
+            continue
+        if unit['kind'] == COUNT_UNIT:
+            result = unit['result'] or {}
+            for row in rows_by_object.get(unit['objectName'], []):
+                if row['fieldName'] in result.get('counts', {}):
+                    row['nonNullCount'] = result['counts'][row['fieldName']]
+                elif row['fieldName'] in result.get('rejected', {}):
+                    add_error(row, result['rejected'][row['fieldName']])
+                elif unit['error']:
+                    add_error(row, unit['error'])
+            continue
+        row = rows.get((unit['objectName'], unit['fieldName']))
+        if row is None:
+            continue
+        if unit['error']:
+            add_error(row, unit['error'])
+        elif unit['kind'] == TOP_VALUES_UNIT and unit['result'] is not None:
+            row['topValues'] = json.dumps(unit['result'])
+        elif unit['kind'] == LAST_POPULATED_UNIT and unit['result'] is not None:
+            row['lastPopulatedDate'] = unit['result']['createdDate']
+    return list(rows.values())
+
+def add_approximate_result(rows, result):
+    for field in result['fields']:
+        row = rows.get((result['objectName'], field['fieldName']))
+        if row is None:
+            continue
+        row['nonNullCount'] = field['nonNullCount']['estimate']
+        row['nonNullCountLower'] = field['nonNullCount']['lower']
+        row['nonNullCountUpper'] = field['nonNullCount']['upper']
+        row['distinctCount'] = field['distinctCount']['estimate']
+        row['distinctCountLower'] = field['distinctCount']['lower']
+        row['distinctCountUpper'] = field['distinctCount']['upper']
+        row['topValues'] = json.dumps([{'value': value['value'], 'count': value['estimate'], 'lower': value['lower'], 'upper': value['upper']}
+                                       for value in field['topValues']])
+        row['isApproximate'] = not result['exact']
+
+def add_error(row, error):
+    row['errors'] = f"{row['errors']}; {error}" if row['errors'] else error
+
+def get_default_output_path():
+    import salesforce.api.columnar as columnar
+    return 'salesforce_profile.parquet' if columnar.pyarrow is not None else 'salesforce_profile.csv'
+
+def check_output_path(output_path):
+    # Called before any querying, so a run can't finish every unit and then fail to write.
+    import salesforce.api.columnar as columnar
+    if output_path and output_path.endswith('.parquet') and columnar.pyarrow is None:
+        raise ValueError(f"Writing {output_path} needs pyarrow; install it or use a .csv output")
+
+def write_results(rows, output_path):
+    import pandas as pd
+
+    dataframe = pd.DataFrame(rows, columns=['objectName', 'fieldName', 'fieldType', 'nonNullCount', 'topValues', 'lastPopulatedDate',
+                                            'nonNullCountLower', 'nonNullCountUpper', 'distinctCount', 'distinctCountLower', 'distinctCountUpper',
+                                            'isApproximate', 'errors'])
+    for column in ('nonNullCount', 'nonNullCountLower', 'nonNullCountUpper', 'distinctCount', 'distinctCountLower', 'distinctCountUpper'):
+        dataframe[column] = dataframe[column].astype('Int64')
+    if output_path.endswith('.parquet'):
+        dataframe.to_parquet(output_path, index=False)
+    else:
+        dataframe.to_csv(output_path, index=False)
+    return dataframe
@@ -1,47 +1,134 @@
+import contextvars
 import os
 import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
-import pandas as pd
 import requests
-from simple_salesforce import Salesforce
-from simple_salesforce.exceptions import SalesforceMalformedRequest
 
-import analysis.dataframe as dataframe
 import salesforce.api.authenticate as authenticate
-from salesforce.api.request_response import ParsedResponse
+import salesforce.api.metadata_cache as metadata_cache
+import salesforce.api.tracing as tracing
+import salesforce.api.transport as transport
+from salesforce.api.request_response import ParsedResponse, decode_json, summarize_response_dto
 import salesforce.log_config as log_config
 import utilities.environment as environment
 import utilities.format as format
 
+# pandas, simple_salesforce, analysis.dataframe and the DataFrame conversion in
+# salesforce.api.columnar are imported inside the functions that use them, and the environment is
+# loaded on first use, so importing this module stays cheap for scripts that only send queries.
+
 # Configure logging
 logger = log_config.get_logger(__name__)
 
 # Add the project root directory to the sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-environment.load_environment_variables()
+_environment_loaded = False
+_session_manager = None
 
-def run_query_using_requests(query_string):
-    session_id, server_url = authenticate_and_get_session()
-    headers = create_headers(session_id)
+QUERY_PATH = '/services/data/v58.0/query'
+TOOLING_QUERY_PATH = '/services/data/v58.0/tooling/query'
+QUERY_ALL_PATH = '/services/data/v58.0/queryAll'
+
+def run_query_using_requests(query_string, preflight=False, max_rows=None, cached=False):
     payload = prepare_payload(query_string)
     try:
-        raw_response = requests.get(server_url.split('/services')[0] + '/services/data/v57.0/query', headers=headers, params=payload)
+        if preflight:
+            # Raises QueryRejectedError before any records are fetched; large results come from a bulk job.
+            import salesforce.api.preflight as preflight_check
+            plan = preflight_check.plan_query(query_string, max_rows=max_rows)
+            if plan['strategy'] in (preflight_check.BULK_STRATEGY, preflight_check.CHUNKED_STRATEGY):
+                return preflight_check.run_bulk_query_dto(query_string, plan)
+        if cached:
+            return create_records_dto(query_string, list(iter_query(query_string, cached=True)))
+        raw_response = get_with_session('/services/data/v57.0/query', params=payload)
         parsed_response_dto = handle_response(raw_response, query_string)
-        logger.info("Response.text = %s", parsed_response_dto['responseText'])
+        logger.info("Query response: %s", summarize_response_dto(parsed_response_dto))
+        log_config.log_payload(logger, "Query response records", parsed_response_dto['records'])
+        collect_remaining_pages(parsed_response_dto)
+    except requests.exceptions.HTTPError as e:
+        # A page fetched through fetch_query_page failed; report it like a failed first response.
+        if e.response is None:
+            logger.error("Error occurred while querying Salesforce API: %s", e)
+            return {}
+        parsed_response_dto = handle_response(e.response, query_string)
+        logger.info("Query response: %s", summarize_response_dto(parsed_response_dto))
     except requests.exceptions.RequestException as e:
         logger.error("Error occurred while querying Salesforce API: %s", e)
         parsed_response_dto = {}
 
     return parsed_response_dto
 
+def create_records_dto(query_string, records, **fields):
+    # The dto of a successful query whose records were fetched some other way (cache, bulk job).
+    return {
+        'records': {'totalSize': len(records), 'done': True, 'records': records},
+        'statusCode': 200,
+        'errorMessage': '',
+        'errorCode': '',
+        'responseText': '',
+        'responseSize': 0,
+        'queryString': query_string,
+        'errors': [{'error_message': '', 'error_code': ''}],
+        'hasError': False,
+        **fields
+    }
+
+def load_environment():
+    global _environment_loaded
+    if not _environment_loaded:
+        environment.load_environment_variables()
+        _environment_loaded = True
+
+def set_session_manager(manager):
+    # Overrides the environment credentials, e.g. to run against a stub org; None restores them.
+    global _session_manager
+    previous, _session_manager = _session_manager, manager
+    return previous
+
+def get_session_manager():
+    if _session_manager is not None:
+        return _session_manager
+    load_environment()
+    return authenticate.get_session_manager(environment.get_salesforce_username(),
+                                            environment.get_salesforce_password(),
+                                            environment.get_salesforce_access_token(),
+                                            sandbox=True)
+
 def authenticate_and_get_session():
-    session_id, server_url = authenticate.authenticate_api(environment.get_salesforce_username(),
-                                                           environment.get_salesforce_password(),
-                                                           environment.get_salesforce_access_token(),
-                                                           sandbox=True)
-    return session_id, server_url
+    return get_session_manager().get_session()
+
+def get_instance_url(server_url):
+    return server_url.split('/services')[0]
+
+def is_invalid_session(response):
+    return response.status_code == 401
+
+def get_with_session(path, params=None, **kwargs):
+    return send_with_session(transport.get, path, params=params, **kwargs)
+
+def post_with_session(path, json=None):
+    return send_with_session(transport.post, path, json=json)
+
+def patch_with_session(path, json=None):
+    return send_with_session(transport.patch, path, json=json)
+
+def send_with_session(send, path, **kwargs):
+    # Sends an authenticated request and, if the session was rejected, logs in again once and retries.
+    extra_headers = kwargs.pop('headers', {})
+    with tracing.span('request', path=path.split('?')[0]) as span:
+        manager = get_session_manager()
+        session_id, server_url = manager.get_session()
+        response = send(get_instance_url(server_url) + path, headers={**create_headers(session_id), **extra_headers}, **kwargs)
+        if is_invalid_session(response):
+            logger.info("Session rejected with status %s, logging in again", response.status_code)
+            span.set(sessionRetries=1)
+            session_id, server_url = manager.refresh(session_id)
+            response = send(get_instance_url(server_url) + path, headers={**create_headers(session_id), **extra_headers}, **kwargs)
+        span.set(statusCode=response.status_code)
+        return response
 
 def create_headers(session_id):
     headers = {
@@ -61,94 +148,164 @@ def handle_response(response, query_string):
     responseDto = ParsedResponse(response, query_string)
     return responseDto.export_dto()
 
+def get_query_path(tooling=False, query_all=False):
+    if tooling:
+        return TOOLING_QUERY_PATH
+    return QUERY_ALL_PATH if query_all else QUERY_PATH
+
+def fetch_query_page(path, params=None):
+    with tracing.span('query_page', path=path.split('?')[0]) as span:
+        response = get_with_session(path, params=params)
+        response.raise_for_status()
+        with tracing.span('decode_json', bytes=tracing.get_content_length(response)):
+            page = decode_json(response.content)
+        span.set(records=len(page.get('records', ())))
+        return page
+
+def iter_pages(page, prefetch=True):
+    # Yields the records of each page, following nextRecordsUrl. With prefetch the next page
+    # is downloaded on a background thread while the caller works on the current one, so at
+    # most two pages are held in memory at any time. Prefetches run in a copy of the caller's
+    # context, so their query_page spans keep the caller's span as parent.
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        while True:
+            next_records_url = page.get('nextRecordsUrl')
+            next_page = None
+            if next_records_url and prefetch:
+                next_page = executor.submit(contextvars.copy_context().run, fetch_query_page, next_records_url)
+            yield page.get('records', [])
+            if not next_records_url:
+                return
+            page = next_page.result() if next_page else fetch_query_page(next_records_url)
+
+def iter_query_pages(query_string, tooling=False, prefetch=True):
+    page = fetch_query_page(get_query_path(tooling), params=prepare_payload(query_string))
+    yield from iter_pages(page, prefetch=prefetch)
+
+def iter_query(query_string, tooling=False, batched=False, prefetch=True, cached=False):
+    if cached:
+        # The whole result comes from (or goes into) the shared result cache as one batch.
+        import salesforce.api.result_cache as result_cache
+        records = result_cache.cached_query(query_string, tooling=tooling)
+        if batched:
+            yield records
+        else:
+            yield from records
+        return
+    for records in iter_query_pages(query_string, tooling=tooling, prefetch=prefetch):
+        if batched:
+            yield records
+        else:
+            yield from records
+
+def collect_remaining_pages(parsed_response_dto):
+    body = parsed_response_dto.get('records')
+    if parsed_response_dto.get('hasError') or not isinstance(body, dict) or not body.get('nextRecordsUrl'):
+        return parsed_response_dto
+    body['records'] = [record for records in iter_pages(body) for record in records]
+    body['done'] = True
+    del body['nextRecordsUrl']
+    return parsed_response_dto
+
+FIELD_ERROR_PATTERNS = {
+        'is_invalid': 'Invalid field: \'(.*?)\'',
+        'is_aggregate': 'field (.*?) does not support aggregate operator',
+        }
+
+def get_field_from_error_message(error_message):
+    return next((re.search(pattern, error_message).group(1) for pattern in FIELD_ERROR_PATTERNS.values() if re.search(pattern, error_message)), '')
+
 def modify_query_string(query_string, error_message, error_type):
-    error_patterns = {
-            'is_invalid': 'Invalid field: \'(.*?)\'',
-            'is_aggregate': 'field (.*?) does not support aggregate operator',
-            }
-    field = next((re.search(pattern, error_message).group(1) for pattern in error_patterns.values() if re.search(pattern, error_message)), '')
-    try:
-        logger.info("Query string before modification: %s", query_string)
-        logger.info("Field causing the issue: %s", field)
-        query_string = re.sub('\s*COUNT\(' + re.escape(field) + '\)?\,?\s*', ' ', query_string)
-    except TypeError as e:
-        logger.error("Error occurred while modifying query string: %s", e)
-    except AttributeError as e:
-        logger.error("Error occurred while modifying query string: %s", e)
-    return query_string
+    with tracing.span('repair_query', errorType=error_type):
+        field = get_field_from_error_message(error_message)
+        try:
+            logger.info("Query string before modification: %s", query_string)
+            logger.info("Field causing the issue: %s", field)
+            query_string = re.sub('\s*COUNT\(' + re.escape(field) + '\)?\,?\s*', ' ', query_string)
+        except TypeError as e:
+            logger.error("Error occurred while modifying query string: %s", e)
+        except AttributeError as e:
+            logger.error("Error occurred while modifying query string: %s", e)
+        return query_string
 
 def query_custom_objects_names():
-    query_string = "SELECT Id, DeveloperName, NamespacePrefix FROM CustomObject"
-    records = query_tooling_api(query_string)
-
-    if records is not None:
-        df = dataframe.convert_records_to_dataframe(records)
-        return df
-    else:
+    try:
+        records = metadata_cache.get_metadata_cache().get_custom_objects()
+    except requests.exceptions.RequestException as e:
+        logger.error("Error occurred while querying Salesforce API: %s", e)
         return None
+    import salesforce.api.columnar as columnar
+    return columnar.records_to_dataframe(records)
 
 def query_custom_field_names():
-    query_string = "SELECT TableEnumOrId, DeveloperName, NamespacePrefix FROM CustomField"
-    records = query_tooling_api(query_string)
+    try:
+        records = metadata_cache.get_metadata_cache().get_custom_fields()
+    except requests.exceptions.RequestException as e:
+        logger.error("Error occurred while querying Salesforce API: %s", e)
+        return None
+    import salesforce.api.columnar as columnar
+    return columnar.records_to_dataframe(records)
 
-    if records is not None:
-        df = dataframe.convert_records_to_dataframe(records)
-        return df
-    else:
+def query_tooling_dataframe(query, is_tooling=True):
+    import salesforce.api.columnar as columnar
+    try:
+        return columnar.query_to_dataframe(query, tooling=is_tooling)
+    except requests.exceptions.RequestException as e:
+        logger.error("Error occurred while querying Salesforce API: %s", e)
         return None
 
 def query_tooling_api(query, sandbox=False, is_tooling=True):
-    session_id, server_url = authenticate.authenticate_api(environment.get_salesforce_username(),
-                                                           environment.get_salesforce_password(),
-                                                           environment.get_salesforce_access_token(),
-                                                           sandbox=True)
-
-    if is_tooling:
-        api_endpoint = server_url.split('/services')[0] + '/services/data/v58.0/tooling/query'
-    else:
-        api_endpoint = server_url.split('/services')[0] + '/services/data/v58.0/query'
-
-    headers = {
-            'Authorization': 'Bearer ' + session_id,
-            'Content-Type': 'application/json'
-            }
-
-    payload = {
-            'q': query
-            }
-
     try:
-        response = requests.get(api_endpoint, headers=headers, params=payload)
-        response.raise_for_status()  # Raise an exception if the response status code is an error code
-        data = response.json()
-        return data['records']
+        return list(iter_query(query, tooling=is_tooling))
     except requests.exceptions.RequestException as e:
         logger.error("Error occurred while querying Salesforce API: %s", e)
         return None
 
 
 def get_salesforce_interface():
-    sf = Salesforce(username=environment.get_salesforce_username(),
-                    password=environment.get_salesforce_password(),
-                    security_token=environment.get_salesforce_access_token(),
-                    domain='test')
+    # Reuses the shared login and connection pool instead of letting simple_salesforce open its own.
+    from simple_salesforce import Salesforce
+
+    session_id, server_url = authenticate_and_get_session()
+    sf = Salesforce(session_id=session_id, instance_url=get_instance_url(server_url), session=transport.get_transport().session)
     return sf
 
+def refresh_salesforce_interface(sf):
+    get_session_manager().invalidate(sf.session_id)
+    return get_salesforce_interface()
+
 
 def query_field_descriptions_by_object(object_name, sf=None):
+    # Without an explicit client the describe comes from the metadata cache, which fetches misses
+    # through the shared composite batcher.
     if not sf:
-        sf = get_salesforce_interface()
+        return metadata_cache.get_metadata_cache().get_describe(object_name)['fields']
+
+    from simple_salesforce.exceptions import SalesforceExpiredSession
 
-    fields = getattr(sf, object_name).describe()['fields']
+    try:
+        fields = getattr(sf, object_name).describe()['fields']
+    except SalesforceExpiredSession:
+        sf = refresh_salesforce_interface(sf)
+        fields = getattr(sf, object_name).describe()['fields']
     return fields
 
 def run_query_using_simple_salesforce(query):
+    import pandas as pd
+    from simple_salesforce.exceptions import SalesforceExpiredSession, SalesforceMalformedRequest
+
+    import salesforce.api.columnar as columnar
+
     sf = get_salesforce_interface()
 
     try:
-        records = sf.query(query)
-        df = dataframe.convert_records_to_dataframe(records['records'])
-        if sum(df.values[0][1:]) == 0:
+        try:
+            records = sf.query(query)
+        except SalesforceExpiredSession:
+            sf = refresh_salesforce_interface(sf)
+            records = sf.query(query)
+        df = columnar.records_to_dataframe(records['records'])
+        if sum(df.values[0]) == 0:
             return pd.DataFrame()
 
         for record in records['records']:
@@ -179,6 +336,8 @@ def get_custom_field_names():
     return df['DeveloperName'].tolist()
 
 def match_custom_object_ids_to_field_names():
+    import analysis.dataframe as dataframe
+
     fields = query_custom_field_names()
     fields = dataframe.format_api_names_from_tooling_api(fields)
     object_ids_to_field_names = fields.groupby('TableEnumOrId')['DeveloperName'].apply(list).to_dict()
@@ -190,9 +349,43 @@ def match_custom_object_ids_to_object_names():
     object_ids_to_object_names = objects.set_index('Id')['DeveloperName'].to_dict()
     return object_ids_to_object_names
 
-def main():
-    # Add your main logic here if needed.
-    pass
+def parse_arguments(arguments=None):
+    import argparse
+    import salesforce.api.approximate_profile as approximate_profile
+    import salesforce.api.profiling as profiling
+
+    parser = argparse.ArgumentParser(description='Profile the fields of Salesforce objects. Re-running with the same store resumes where it stopped.')
+    parser.add_argument('objects', nargs='*', help='object API names; defaults to every custom object')
+    parser.add_argument('--store', default=profiling.DEFAULT_STORE_PATH, help='SQLite file holding the plan and finished results')
+    parser.add_argument('--output', help='final .parquet or .csv file')
+    parser.add_argument('--concurrency', type=int, default=profiling.DEFAULT_CONCURRENCY)
+    parser.add_argument('--top-values', type=int, help=f'most common values per field; 0 to skip (default {profiling.DEFAULT_TOP_VALUES})')
+    parser.add_argument('--no-last-populated', action='store_const', const=False, dest='last_populated', help='skip the last populated date queries')
+    parser.add_argument('--replan', action='store_true', help='discard the stored plan and results and start over')
+    parser.add_argument('--approximate', action='store_const', const=True, help='estimate from samples on objects above --exact-threshold rows')
+    parser.add_argument('--exact-threshold', type=int, help=f'default {approximate_profile.DEFAULT_EXACT_THRESHOLD}')
+    return parser.parse_args(arguments)
+
+def main(arguments=None):
+    import salesforce.api.profiling as profiling
+
+    # Settings not given on the command line come from the stored plan when resuming.
+    arguments = parse_arguments(arguments)
+    try:
+        progress = profiling.run_profile(object_names=arguments.objects,
+                                         store_path=arguments.store,
+                                         output_path=arguments.output or profiling.get_default_output_path(),
+                                         concurrency=arguments.concurrency,
+                                         top_values=arguments.top_values,
+                                         last_populated=arguments.last_populated,
+                                         replan=arguments.replan,
+                                         approximate=arguments.approximate,
+                                         exact_threshold=arguments.exact_threshold)
+    except ValueError as e:
+        logger.error("%s", e)
+        return 2
+    logger.info("Profile finished: %s", progress)
+    return 0 if set(progress) <= {profiling.DONE} else 1
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,97 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import salesforce.api.metadata_cache as metadata_cache
+import salesforce.api.query as query
+import salesforce.log_config as log_config
+import salesforce.soql.soql as soql
+
+logger = log_config.get_logger(__name__)
+
+DEFAULT_CONCURRENCY = 4
+FIELD_ERROR_CODES = ('INVALID_FIELD', 'MALFORMED_QUERY')
+
+
+class QueryRepairError(Exception):
+    def __init__(self, query_string, error_code, error_message):
+        super().__init__(f"{error_code}: {error_message}")
+        self.query_string = query_string
+        self.error_code = error_code
+        self.error_message = error_message
+
+
+def get_count_of_fields_values_repaired(object_name, field_names, concurrency=DEFAULT_CONCURRENCY, use_metadata=True,
+                                        max_query_length=soql.MAX_QUERY_LENGTH, max_aggregate_functions=soql.MAX_AGGREGATE_FUNCTIONS):
+    # Counts non-null values for every field that can be counted and reports the rest.
+    # Fields the describe marks as missing or non-aggregatable are dropped before the first call,
+    # and the rest start out in chunks that respect the SOQL length and aggregate caps;
+    # any group that still fails loses the field named in the error, or is split in halves when
+    # the error doesn't name one. All groups of a round run concurrently.
+    if use_metadata:
+        field_names, rejected = prefilter_fields(object_name, field_names)
+    else:
+        rejected = {}
+
+    counts = {}
+    groups = [chunk for chunk, _ in soql.plan_count_of_fields_values(object_name, field_names, max_query_length=max_query_length,
+                                                                     max_aggregate_functions=max_aggregate_functions)]
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while groups:
+            next_groups = []
+            for group, (record, error_code, error_message) in zip(groups, executor.map(lambda group: run_count_query(object_name, group), groups)):
+                if record is not None:
+                    counts.update(get_counts_from_record(record, group))
+                    continue
+                if error_code not in FIELD_ERROR_CODES:
+                    raise QueryRepairError(soql.get_count_of_fields_values(object_name, group), error_code, error_message)
+                next_groups.extend(split_failed_group(group, error_message, rejected))
+            groups = next_groups
+
+    logger.info("Counted %s fields on %s, rejected %s", len(counts), object_name, len(rejected))
+    return {'counts': counts, 'rejected': rejected}
+
+def prefilter_fields(object_name, field_names):
+    fields = {field['name']: field for field in metadata_cache.get_metadata_cache().get_describe(object_name)['fields']}
+    valid = []
+    rejected = {}
+    for field_name in field_names:
+        field = fields.get(field_name)
+        if field is None:
+            rejected[field_name] = 'Field not found in describe'
+        elif not field.get('aggregatable', True):
+            rejected[field_name] = f"Field of type {field.get('type')} is not aggregatable"
+        else:
+            valid.append(field_name)
+    return valid, rejected
+
+def split_failed_group(group, error_message, rejected):
+    if len(group) == 1:
+        rejected[group[0]] = error_message
+        return []
+
+    named_field = query.get_field_from_error_message(error_message)
+    if named_field in group:
+        rejected[named_field] = error_message
+        return [[field_name for field_name in group if field_name != named_field]]
+
+    middle = len(group) // 2
+    return [group[:middle], group[middle:]]
+
+def run_count_query(object_name, field_names):
+    # Returns (record, '', '') on success or (None, error_code, error_message) on failure.
+    query_string = soql.get_count_of_fields_values(object_name, field_names)
+    response = query.get_with_session(query.QUERY_PATH, params=query.prepare_payload(query_string))
+    try:
+        body = response.json()
+    except ValueError:
+        # An HTML or gateway error page; the status code is not a field error, so it isn't repaired.
+        return None, str(response.status_code), response.text
+    if response.status_code == 200:
+        return body['records'][0], '', ''
+    try:
+        return None, body[0]['errorCode'], body[0]['message']
+    except (KeyError, IndexError, TypeError):
+        return None, str(response.status_code), response.text
+
+def get_counts_from_record(record, field_names):
+    # Aggregate columns come back as expr0, expr1, ... in SELECT order.
+    return {field_name: record[f'expr{index}'] for index, field_name in enumerate(field_names)}
@@ -0,0 +1,29 @@
+import pandas as pd
+
+import analysis.dataframe as dataframe
+import salesforce.api.query_repair as query_repair
+import salesforce.log_config as log_config
+import salesforce.soql.soql as soql
+
+logger = log_config.get_logger(__name__)
+
+DEFAULT_CONCURRENCY = query_repair.DEFAULT_CONCURRENCY
+
+def run_count_of_fields_values(object_name, field_names, concurrency=DEFAULT_CONCURRENCY,
+                               max_query_length=soql.MAX_QUERY_LENGTH, max_aggregate_functions=soql.MAX_AGGREGATE_FUNCTIONS):
+    # Runs get_count_of_fields_values as several right-sized queries through query_repair and returns
+    # one row with expr0, expr1, ... in field order, as one query over every field would. Raises
+    # QueryRepairError if any chunk fails or any field can't be counted.
+    if not field_names:
+        return pd.DataFrame()
+    result = query_repair.get_count_of_fields_values_repaired(object_name, field_names, concurrency=concurrency, use_metadata=False,
+                                                              max_query_length=max_query_length,
+                                                              max_aggregate_functions=max_aggregate_functions)
+    if result['rejected']:
+        field_name, error_message = next(iter(result['rejected'].items()))
+        logger.error("Could not count %s fields on %s: %s", len(result['rejected']), object_name, ', '.join(result['rejected']))
+        raise query_repair.QueryRepairError(soql.get_count_of_fields_values(object_name, field_names), 'INVALID_FIELD',
+                                            f"{field_name}: {error_message}")
+
+    record = {f'expr{index}': result['counts'][field_name] for index, field_name in enumerate(field_names)}
+    return dataframe.convert_records_to_dataframe([record])
@@ -1,64 +1,107 @@
+import json
+
 import requests
 
+import salesforce.api.tracing as tracing
 import salesforce.log_config as log_config
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = log_config.get_logger(__name__)
 
+_NOT_DECODED = object()
+
+
+def decode_json(content):
+    # orjson is several times faster on large record pages; the standard library is the fallback.
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
 
 
 class ParsedResponse:
-    def __init__(self, response: requests.Response, query_string: str):
+    # Decodes the body at most once, on first access, and keeps the raw text only when asked to.
+    def __init__(self, response: requests.Response, query_string: str, keep_text: bool = False):
         self._response = response
         self._query_string = query_string
-        self._errors = [{'error_message': '', 'error_code': ''}]
+        self._keep_text = keep_text
+        self._body = _NOT_DECODED
 
     def __str__(self):
         return f"status_code: {self.status_code}\nerror_message: {self.error_message}\nerror_code: {self.error_code}\nresponse_text: {self.response_text}"
 
     def export_dto(self):
         return {
-            'records': self._response.json(),
-            'statusCode': self.get_status_code(self._response),
-            'errorMessage': self.get_error_message(self._response),
-            'errorCode': self.get_error_code(self._response),
-            'responseText': self.get_response_text(self._response),
+            'records': self.records,
+            'statusCode': self.status_code,
+            'errorMessage': self.error_message,
+            'errorCode': self.error_code,
+            'responseText': self.response_text,
+            'responseSize': self.response_size,
             'queryString': self._query_string,
-            'errors': self._errors,
+            'errors': self.errors,
             'hasError': self.has_errors()
         }
 
-    def get_status_code(self):
-        try:
-            return self._response.statusCode
-        except AttributeError as e:
-            logger.error("AttributeError occurred: %s", e)
-            return '' 
+    @property
+    def body(self):
+        if self._body is _NOT_DECODED:
+            with tracing.span('decode_json', bytes=tracing.get_content_length(self._response)) as span:
+                try:
+                    self._body = decode_json(self._response.content)
+                except (AttributeError, TypeError, ValueError) as e:
+                    logger.error("Error decoding response body: %s", e)
+                    self._body = None
+                span.set(records=len(self._body.get('records', ())) if isinstance(self._body, dict) else 0)
+        return self._body
 
+    @property
+    def records(self):
+        return self.body
 
-    def get_error_message(self):
-        message = ''
+    @property
+    def status_code(self):
         try:
-            message = self._response.json()[0]['message']
-        except (AttributeError, KeyError, IndexError, TypeError) as e:
-            logger.error("Error parsing message from self, response: %s", e)
-        return message
+            return self._response.status_code
+        except AttributeError as e:
+            logger.error("AttributeError occurred: %s", e)
+            return ''
 
+    @property
+    def errors(self):
+        # Salesforce reports errors as a list of {message, errorCode}; anything else is a success body.
+        body = self.body
+        if isinstance(body, list) and body and isinstance(body[0], dict) and 'errorCode' in body[0]:
+            return [{'error_message': error.get('message', ''), 'error_code': error.get('errorCode', '')} for error in body]
+        return [{'error_message': '', 'error_code': ''}]
 
-    def get_error_code(self):
-        code = ''
-        try:
-            code = self._response.json()[0]['errorCode']
-        except (AttributeError, KeyError, IndexError, TypeError) as e:
-            logger.error("Error parsing errorCode from self, response: %s", e)
-        return code
+    @property
+    def error_message(self):
+        return self.errors[0]['error_message']
 
+    @property
+    def error_code(self):
+        return self.errors[0]['error_code']
 
-    def get_response_text(self):
+    @property
+    def response_text(self):
+        if not self._keep_text:
+            return ''
         try:
             return self._response.text
         except Exception as e:
             logger.error("Error getting response text: %s", e)
-            return '' 
+            return ''
+
+    @property
+    def response_size(self):
+        try:
+            return len(self._response.content)
+        except (AttributeError, TypeError):
+            return 0
 
     def has_errors(self):
         is_error = False
@@ -69,3 +112,12 @@ class ParsedResponse:
         else:
             pass
         return is_error
+
+
+def summarize_response_dto(dto):
+    records = dto.get('records')
+    record_count = len(records.get('records', [])) if isinstance(records, dict) else 0
+    summary = f"status={dto.get('statusCode')} records={record_count} bytes={dto.get('responseSize', 0)}"
+    if dto.get('hasError'):
+        summary += f" error={dto.get('errorCode')}: {dto.get('errorMessage')}"
+    return summary
@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import salesforce.api.query as query
+import salesforce.api.tracing as tracing
+import salesforce.log_config as log_config
+import utilities.environment as environment
+
+logger = log_config.get_logger(__name__)
+
+RESULT_CACHE_DIR_VARIABLE = 'SALESFORCE_RESULT_CACHE_DIR'
+API_VERSION = 'v58.0'
+DEFAULT_TTL = 5 * 60
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_MEMORY_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_DISK_BYTES = 1024 * 1024 * 1024
+STRING_LITERAL_PATTERN = re.compile(r"('(?:[^'\\]|\\.)*')")
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+class ResultCache:
+    # Two tiers: an in-memory LRU bounded by entry count and bytes, and an optional directory of
+    # JSON files bounded by total bytes. Concurrent misses for the same key are coalesced, so only
+    # the first caller fetches and the others wait for its result.
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_memory_bytes=DEFAULT_MAX_MEMORY_BYTES,
+                 cache_dir=None, max_disk_bytes=DEFAULT_MAX_DISK_BYTES, default_ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._memory_bytes = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        # Sizes of the files on disk, oldest write first; the directory is scanned once here and
+        # the index is kept up to date on every write and removal after that.
+        self._disk_entries = OrderedDict()
+        self._disk_bytes = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._load_disk_entries()
+
+    def get_or_fetch(self, key, fetch, ttl=None):
+        with tracing.span('result_cache') as span:
+            value, source = self._get_or_fetch(key, fetch, ttl)
+            span.set(cacheHit=source != 'fetch', source=source)
+            return value
+
+    def _get_or_fetch(self, key, fetch, ttl):
+        with self._lock:
+            value, found = self._get_from_memory(key)
+            if found:
+                self._hits += 1
+                return value, 'memory'
+            waiting_for = self._in_flight.get(key)
+            if waiting_for is None:
+                in_flight = self._in_flight[key] = Future()
+            else:
+                self._coalesced += 1
+        if waiting_for is not None:
+            return waiting_for.result(), 'coalesced'
+
+        try:
+            value, found = self._get_from_disk(key)
+            if found:
+                with self._lock:
+                    self._hits += 1
+            else:
+                with self._lock:
+                    self._misses += 1
+                value = fetch()
+                self.put(key, value, ttl=ttl)
+            in_flight.set_result(value)
+            return value, 'disk' if found else 'fetch'
+        except BaseException as e:
+            in_flight.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def put(self, key, value, ttl=None):
+        expires_at = time.time() + (self.default_ttl if ttl is None else ttl)
+        serialized = json.dumps(value)
+        with self._lock:
+            self._put_in_memory(key, value, expires_at, len(serialized))
+        self._put_on_disk(key, serialized, expires_at)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            keys = list(self._entries) if key is None else [key]
+            for entry_key in keys:
+                entry = self._entries.pop(entry_key, None)
+                if entry is not None:
+                    self._memory_bytes -= entry[2]
+        if self.cache_dir:
+            with self._lock:
+                keys = list(self._disk_entries) if key is None else [key]
+            for entry_key in keys:
+                self._remove_from_disk(entry_key)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'memoryBytes': self._memory_bytes,
+                'diskBytes': self._disk_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'coalesced': self._coalesced
+            }
+
+    def _get_from_memory(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, False
+        value, expires_at, size = entry
+        if time.time() >= expires_at:
+            del self._entries[key]
+            self._memory_bytes -= size
+            return None, False
+        self._entries.move_to_end(key)
+        return value, True
+
+    def _put_in_memory(self, key, value, expires_at, size):
+        if size > self.max_memory_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= previous[2]
+        self._entries[key] = (value, expires_at, size)
+        self._memory_bytes += size
+        while len(self._entries) > self.max_entries or self._memory_bytes > self.max_memory_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._memory_bytes -= evicted_size
+
+    def _get_from_disk(self, key):
+        if not self.cache_dir:
+            return None, False
+        path = self._get_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as cache_file:
+                content = cache_file.read()
+            entry = json.loads(content)
+        except (OSError, ValueError):
+            return None, False
+        if time.time() >= entry['expires_at']:
+            self._remove_from_disk(key)
+            return None, False
+        with self._lock:
+            self._put_in_memory(key, entry['value'], entry['expires_at'], len(content))
+        return entry['value'], True
+
+    def _put_on_disk(self, key, serialized, expires_at):
+        if not self.cache_dir:
+            return
+        path = self._get_path(key)
+        temporary_path = f'{path}.{threading.get_ident()}.tmp'
+        content = f'{{"expires_at": {expires_at}, "value": {serialized}}}'.encode('utf-8')
+        if len(content) > self.max_disk_bytes:
+            return
+        try:
+            with open(temporary_path, 'wb') as cache_file:
+                cache_file.write(content)
+            os.replace(temporary_path, path)
+        except OSError as e:
+            logger.error("Error writing query result cache entry: %s", e)
+            remove_file(temporary_path)
+            return
+        evicted = []
+        with self._lock:
+            self._disk_bytes += len(content) - self._disk_entries.pop(key, 0)
+            self._disk_entries[key] = len(content)
+            # Drops the least recently written files until the directory fits in max_disk_bytes.
+            while self._disk_bytes > self.max_disk_bytes:
+                evicted_key, evicted_size = self._disk_entries.popitem(last=False)
+                self._disk_bytes -= evicted_size
+                evicted.append(evicted_key)
+        for evicted_key in evicted:
+            remove_file(self._get_path(evicted_key))
+
+    def _remove_from_disk(self, key):
+        with self._lock:
+            self._disk_bytes -= self._disk_entries.pop(key, 0)
+        remove_file(self._get_path(key))
+
+    def _load_disk_entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.json'):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    entries.append((os.path.getmtime(path), name[:-len('.json')], os.path.getsize(path)))
+                except OSError:
+                    continue
+        for _, key, size in sorted(entries):
+            self._disk_entries[key] = size
+            self._disk_bytes += size
+
+    def _get_path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+
+def normalize_soql(query_string):
+    # Collapses whitespace outside string literals so formatting differences share one entry.
+    parts = STRING_LITERAL_PATTERN.split(query_string.strip())
+    return ''.join(part if index % 2 else re.sub(r'\s+', ' ', part) for index, part in enumerate(parts))
+
+def make_cache_key(query_string, tooling=False, api_version=API_VERSION, user=None):
+    if user is None:
+        query.load_environment()
+        user = environment.get_salesforce_username()
+    endpoint = 'tooling' if tooling else 'rest'
+    identity = '\n'.join([normalize_soql(query_string), api_version, endpoint, user])
+    return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def get_result_cache():
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache(cache_dir=os.environ.get(RESULT_CACHE_DIR_VARIABLE))
+        return _result_cache
+
+def set_result_cache(cache):
+    global _result_cache
+    with _result_cache_lock:
+        previous, _result_cache = _result_cache, cache
+    return previous
+
+def cached_query(query_string, tooling=False, ttl=None, cache=None):
+    # Returns every record of the query; callers share the returned list, so treat it as read-only.
+    cache = cache or get_result_cache()
+    key = make_cache_key(query_string, tooling=tooling)
+    return cache.get_or_fetch(key, lambda: list(query.iter_query(query_string, tooling=tooling)), ttl=ttl)
@@ -0,0 +1,143 @@
+import hashlib
+import heapq
+import math
+
+DEFAULT_HLL_PRECISION = 12
+DEFAULT_CMS_EPSILON = 0.001
+DEFAULT_CMS_DELTA = 0.01
+DEFAULT_DISTINCT_SAMPLE_SIZE = 1024
+Z_95 = 1.96
+
+
+def hash_value(value):
+    # Two independent 64 bit hashes of the value's repr; repr keeps 1 and '1' apart.
+    digest = hashlib.blake2b(repr(value).encode('utf-8'), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+
+
+class HyperLogLog:
+    # Distinct count estimate in 2**precision registers; relative standard error 1.04 / sqrt(registers).
+    def __init__(self, precision=DEFAULT_HLL_PRECISION):
+        self.precision = precision
+        self.register_count = 1 << precision
+        self.registers = bytearray(self.register_count)
+
+    def add(self, value, hashes=None):
+        hash_64 = (hashes or hash_value(value))[0]
+        index = hash_64 >> (64 - self.precision)
+        remaining = hash_64 & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        self.registers = bytearray(max(mine, theirs) for mine, theirs in zip(self.registers, other.registers))
+        return self
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.register_count)
+        estimate = alpha * self.register_count ** 2 / sum(2.0 ** -register for register in self.registers)
+        empty = self.registers.count(0)
+        if estimate <= 2.5 * self.register_count and empty:
+            # Linear counting is more accurate while many registers are still empty.
+            estimate = self.register_count * math.log(self.register_count / empty)
+        return estimate
+
+    def relative_error(self):
+        return 1.04 / math.sqrt(self.register_count)
+
+
+class CountMinSketch:
+    # Frequency estimates that never undercount and overcount by at most epsilon * total with
+    # probability 1 - delta. The most frequent values are tracked alongside in a bounded candidate set.
+    def __init__(self, epsilon=DEFAULT_CMS_EPSILON, delta=DEFAULT_CMS_DELTA, top_k=10):
+        self.width = math.ceil(math.e / epsilon)
+        self.depth = math.ceil(math.log(1 / delta))
+        self.epsilon = epsilon
+        self.rows = [[0] * self.width for _ in range(self.depth)]
+        self.total = 0
+        self.top_k = top_k
+        self._candidates = {}
+
+    def add(self, value, hashes=None):
+        first, second = hashes or hash_value(value)
+        estimate = None
+        for depth, row in enumerate(self.rows):
+            index = (first + depth * second) % self.width
+            row[index] += 1
+            estimate = row[index] if estimate is None else min(estimate, row[index])
+        self.total += 1
+        self._track_candidate(value, estimate)
+
+    def estimate(self, value, hashes=None):
+        first, second = hashes or hash_value(value)
+        return min(row[(first + depth * second) % self.width] for depth, row in enumerate(self.rows))
+
+    def get_top(self, count=None):
+        return heapq.nlargest(count or self.top_k, self._candidates.items(), key=lambda item: item[1])
+
+    def error_bound(self):
+        return self.epsilon * self.total
+
+    def _track_candidate(self, value, estimate):
+        # Keeps a few times top_k candidates so late heavy hitters can still displace early ones.
+        capacity = self.top_k * 4
+        if value in self._candidates or len(self._candidates) < capacity:
+            self._candidates[value] = estimate
+            return
+        smallest = min(self._candidates, key=self._candidates.get)
+        if estimate > self._candidates[smallest]:
+            del self._candidates[smallest]
+            self._candidates[value] = estimate
+
+
+class DistinctSample:
+    # Exact occurrence counts for the distinct values with the smallest hashes (a uniform sample of
+    # the distinct values, whatever their frequency). A value is either counted from its first
+    # occurrence on or never, so the share seen exactly once is unbiased for the whole stream.
+    def __init__(self, size=DEFAULT_DISTINCT_SAMPLE_SIZE):
+        self.size = size
+        self.counts = {}
+        self._heap = []
+
+    def add(self, value, hashes=None):
+        hash_64 = (hashes or hash_value(value))[0]
+        if hash_64 in self.counts:
+            self.counts[hash_64] += 1
+        elif len(self.counts) < self.size:
+            self.counts[hash_64] = 1
+            heapq.heappush(self._heap, -hash_64)
+        elif hash_64 < -self._heap[0]:
+            del self.counts[-heapq.heappushpop(self._heap, -hash_64)]
+            self.counts[hash_64] = 1
+
+    def singleton_share(self):
+        if not self.counts:
+            return 0.0
+        return sum(1 for count in self.counts.values() if count == 1) / len(self.counts)
+
+
+def wilson_interval(successes, trials, z=Z_95):
+    if trials == 0:
+        return 0.0, 0.0, 1.0
+    share = successes / trials
+    denominator = 1 + z ** 2 / trials
+    centre = (share + z ** 2 / (2 * trials)) / denominator
+    margin = z * math.sqrt(share * (1 - share) / trials + z ** 2 / (4 * trials ** 2)) / denominator
+    return share, max(0.0, centre - margin), min(1.0, centre + margin)
+
+def cluster_ratio_interval(successes_by_block, sizes_by_block, z=Z_95):
+    # Ratio estimate over blocks of consecutive rows. Rows in a block tend to resemble each other,
+    # so the spread between blocks, not the row count, sets the interval width.
+    trials = sum(sizes_by_block)
+    if trials == 0:
+        return 0.0, 0.0, 1.0
+    share = sum(successes_by_block) / trials
+    blocks = len(sizes_by_block)
+    if blocks < 2:
+        return wilson_interval(sum(successes_by_block), trials, z)
+    residuals = sum((successes - share * size) ** 2 for successes, size in zip(successes_by_block, sizes_by_block))
+    standard_error = math.sqrt(blocks / (blocks - 1) * residuals) / trials
+    _, wilson_lower, wilson_upper = wilson_interval(sum(successes_by_block), trials, z)
+    # Never narrower than the simple binomial interval.
+    return share, max(0.0, min(share - z * standard_error, wilson_lower)), min(1.0, max(share + z * standard_error, wilson_upper))
@@ -0,0 +1,173 @@
+import json
+import sqlite3
+from datetime import datetime, timezone
+
+import requests
+
+import salesforce.api.query as query
+import salesforce.log_config as log_config
+import salesforce.soql.soql as soql
+
+logger = log_config.get_logger(__name__)
+
+DEFAULT_WATERMARK_FIELD = 'SystemModstamp'
+SALESFORCE_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f%z'
+INVALID_LOCATOR_ERROR_CODES = ('INVALID_QUERY_LOCATOR', 'QUERY_TIMEOUT')
+
+
+class SyncStore:
+    # One SQLite file holding a table per synced object plus the sync_state bookkeeping table.
+    # Each page of records and its checkpoint are committed in the same transaction, so a crash
+    # never leaves rows written without the state that says where to resume.
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("""CREATE TABLE IF NOT EXISTS sync_state (
+                                        object_name TEXT PRIMARY KEY,
+                                        field_names TEXT NOT NULL,
+                                        watermark_field TEXT NOT NULL,
+                                        high_water_mark TEXT,
+                                        pending_high_water_mark TEXT,
+                                        next_records_url TEXT,
+                                        mode TEXT)""")
+        self._connection.commit()
+
+    def get_state(self, object_name):
+        cursor = self._connection.execute("""SELECT field_names, watermark_field, high_water_mark, pending_high_water_mark, next_records_url, mode
+                                             FROM sync_state WHERE object_name = ?""", (object_name,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return {
+            'fieldNames': json.loads(row[0]),
+            'watermarkField': row[1],
+            'highWaterMark': row[2],
+            'pendingHighWaterMark': row[3],
+            'nextRecordsUrl': row[4],
+            'mode': row[5]
+        }
+
+    def start_run(self, object_name, field_names, watermark_field, mode, high_water_mark):
+        with self._connection:
+            if mode == 'full':
+                self._connection.execute(f'DROP TABLE IF EXISTS "{object_name}"')
+            self._create_table(object_name, field_names)
+            self._connection.execute("""INSERT OR REPLACE INTO sync_state
+                                        (object_name, field_names, watermark_field, high_water_mark, pending_high_water_mark, next_records_url, mode)
+                                        VALUES (?, ?, ?, ?, ?, NULL, ?)""",
+                                     (object_name, json.dumps(field_names), watermark_field, high_water_mark, high_water_mark, mode))
+
+    def commit_page(self, object_name, field_names, records, pending_high_water_mark, next_records_url):
+        upserts = [record for record in records if not record.get('IsDeleted')]
+        deletes = [(record['Id'],) for record in records if record.get('IsDeleted')]
+        columns = ', '.join(f'"{field_name}"' for field_name in field_names)
+        placeholders = ', '.join('?' for _ in field_names)
+        with self._connection:
+            self._connection.executemany(f'INSERT OR REPLACE INTO "{object_name}" ({columns}) VALUES ({placeholders})',
+                                         [[to_column_value(record.get(field_name)) for field_name in field_names] for record in upserts])
+            self._connection.executemany(f'DELETE FROM "{object_name}" WHERE Id = ?', deletes)
+            self._connection.execute("UPDATE sync_state SET pending_high_water_mark = ?, next_records_url = ? WHERE object_name = ?",
+                                     (pending_high_water_mark, next_records_url, object_name))
+        return len(upserts), len(deletes)
+
+    def finish_run(self, object_name):
+        with self._connection:
+            self._connection.execute("""UPDATE sync_state SET high_water_mark = pending_high_water_mark, next_records_url = NULL, mode = NULL
+                                        WHERE object_name = ?""", (object_name,))
+
+    def count_rows(self, object_name):
+        return self._connection.execute(f'SELECT COUNT(*) FROM "{object_name}"').fetchone()[0]
+
+    def close(self):
+        self._connection.close()
+
+    def _create_table(self, object_name, field_names):
+        columns = ', '.join(f'"{field_name}"' + (' PRIMARY KEY' if field_name == 'Id' else '') for field_name in field_names)
+        self._connection.execute(f'CREATE TABLE IF NOT EXISTS "{object_name}" ({columns})')
+
+
+def sync_object(object_name, field_names, store_path, watermark_field=DEFAULT_WATERMARK_FIELD, full_refresh=False):
+    # Pulls only rows changed since the last committed high-water mark, using queryAll so that
+    # deleted rows come back with IsDeleted and can be removed locally. A full refresh happens on
+    # the first run, when the field list changes, or when asked for.
+    field_names = get_sync_field_names(field_names, watermark_field)
+    store = SyncStore(store_path)
+    try:
+        state = store.get_state(object_name)
+        next_records_url = None
+        if state and state['nextRecordsUrl'] and state['fieldNames'] == field_names and not full_refresh:
+            mode = state['mode']
+            since = state['pendingHighWaterMark']
+            next_records_url = state['nextRecordsUrl']
+            logger.info("Resuming %s sync of %s from the last committed page", mode, object_name)
+        elif full_refresh or state is None or state['fieldNames'] != field_names or not state['highWaterMark']:
+            mode = 'full'
+            since = None
+            store.start_run(object_name, field_names, watermark_field, mode, None)
+        else:
+            mode = 'incremental'
+            since = state['highWaterMark']
+            store.start_run(object_name, field_names, watermark_field, mode, since)
+
+        upserted, deleted = run_sync_pages(store, object_name, field_names, watermark_field, mode, since, next_records_url)
+        store.finish_run(object_name)
+        state = store.get_state(object_name)
+        logger.info("Synced %s (%s): %s upserted, %s deleted, high-water mark %s", object_name, mode, upserted, deleted, state['highWaterMark'])
+        return {
+            'objectName': object_name,
+            'mode': mode,
+            'upserted': upserted,
+            'deleted': deleted,
+            'highWaterMark': state['highWaterMark']
+        }
+    finally:
+        store.close()
+
+def run_sync_pages(store, object_name, field_names, watermark_field, mode, since, next_records_url=None):
+    if next_records_url:
+        try:
+            page = query.fetch_query_page(next_records_url)
+        except requests.exceptions.HTTPError as e:
+            if not is_expired_locator(e):
+                raise
+            # Query locators expire; restart from the last committed watermark instead.
+            logger.info("Query locator for %s expired, restarting from %s", object_name, since)
+            page = fetch_first_page(object_name, field_names, watermark_field, mode, since)
+    else:
+        page = fetch_first_page(object_name, field_names, watermark_field, mode, since)
+
+    upserted = deleted = 0
+    high_water_mark = since
+    while True:
+        records = page.get('records', [])
+        if records:
+            high_water_mark = max(high_water_mark or '', to_soql_datetime(records[-1][watermark_field]))
+        page_upserted, page_deleted = store.commit_page(object_name, field_names, records, high_water_mark, page.get('nextRecordsUrl'))
+        upserted += page_upserted
+        deleted += page_deleted
+        if not page.get('nextRecordsUrl'):
+            return upserted, deleted
+        page = query.fetch_query_page(page['nextRecordsUrl'])
+
+def fetch_first_page(object_name, field_names, watermark_field, mode, since):
+    # A full refresh doesn't need deleted rows, so only incremental runs go through queryAll.
+    query_string = soql.get_changed_since(object_name, field_names, watermark_field=watermark_field, since=since)
+    return query.fetch_query_page(query.get_query_path(query_all=mode == 'incremental'), params=query.prepare_payload(query_string))
+
+def get_sync_field_names(field_names, watermark_field):
+    sync_field_names = ['Id', watermark_field, 'IsDeleted']
+    return sync_field_names + [field_name for field_name in field_names if field_name not in sync_field_names]
+
+def is_expired_locator(error):
+    try:
+        return error.response.json()[0]['errorCode'] in INVALID_LOCATOR_ERROR_CODES
+    except (AttributeError, KeyError, IndexError, TypeError, ValueError):
+        return False
+
+def to_soql_datetime(value):
+    parsed = datetime.strptime(value, SALESFORCE_DATETIME_FORMAT)
+    return parsed.astimezone(timezone.utc).strftime(soql.SOQL_DATETIME_FORMAT)
+
+def to_column_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
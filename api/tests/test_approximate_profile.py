@@ -0,0 +1,85 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import bisect
+import re
+import pytest
+from unittest.mock import patch
+import salesforce.api.approximate_profile as approximate_profile
+import salesforce.api.chunked_extract as chunked_extract
+
+TOTAL_RECORDS = 100000
+FIRST_ID = chunked_extract.id_to_number('001000000000000')
+# Half the rows right after FIRST_ID, half after a gap of about 2**70 Id numbers, as with two pods.
+ID_NUMBERS = [FIRST_ID + index if index < TOTAL_RECORDS // 2 else FIRST_ID + 2 ** 70 + index for index in range(TOTAL_RECORDS)]
+
+def create_record(index):
+    # Status is 'Open' on half the rows, Name is unique, Notes__c is null on a quarter.
+    return {'attributes': {}, 'Id': chunked_extract.number_to_id(ID_NUMBERS[index]), 'Name': f'Account {index}',
+            'Status__c': 'Open' if index % 2 else f'Other {index % 7}', 'Notes__c': None if index % 4 == 0 else 'x'}
+
+def get_id_bound(query_string, operator):
+    match = re.search(rf"Id {operator} '(\w+)'", query_string)
+    return chunked_extract.id_to_number(match.group(1)) if match else None
+
+def get_index_range(query_string):
+    # Indexes of the rows with lower < Id <= upper (or Id >= lower).
+    lower, upper, start = get_id_bound(query_string, '>'), get_id_bound(query_string, '<='), get_id_bound(query_string, '>=')
+    first = bisect.bisect_right(ID_NUMBERS, lower) if lower is not None else bisect.bisect_left(ID_NUMBERS, start or 0)
+    last = bisect.bisect_right(ID_NUMBERS, upper) if upper is not None else TOTAL_RECORDS
+    return first, last
+
+def fetch_query_page(path, params):
+    query_string = params['q']
+    first, last = get_index_range(query_string)
+    if query_string.startswith('SELECT COUNT()'):
+        return {'totalSize': last - first, 'records': []}
+    offset = re.search(r'OFFSET (\d+)', query_string)
+    if offset:
+        return {'records': [create_record(first + int(offset.group(1)))]}
+    descending = 'DESC' in query_string
+    return {'records': [create_record(TOTAL_RECORDS - 1 if descending else 0)]}
+
+def iter_query(query_string, prefetch=True):
+    start, _ = get_index_range(query_string)
+    limit = int(re.search(r'LIMIT (\d+)', query_string).group(1))
+    return (create_record(index) for index in range(start, min(start + limit, TOTAL_RECORDS)))
+
+def test_sampled_estimates_have_bounds_around_the_truth():
+    with patch.object(approximate_profile.query, 'fetch_query_page', side_effect=fetch_query_page), \
+            patch.object(approximate_profile.query, 'iter_query', side_effect=iter_query):
+        result = approximate_profile.profile_object('Account', ['Id', 'Name', 'Status__c', 'Notes__c'], exact_threshold=1000, seed=7)
+    assert not result['exact']
+    assert 0 < result['sampledRows'] <= 20 * 500
+    fields = {field['fieldName']: field for field in result['fields']}
+
+    notes = fields['Notes__c']['nullRate']
+    assert notes['lower'] <= 0.25 <= notes['upper']
+    status_top = fields['Status__c']['topValues'][0]
+    assert status_top['value'] == 'Open'
+    assert status_top['lower'] <= TOTAL_RECORDS / 2 <= status_top['upper']
+    name_distinct = fields['Name']['distinctCount']
+    assert name_distinct['lower'] <= TOTAL_RECORDS <= name_distinct['upper']
+    assert fields['Status__c']['distinctCount']['estimate'] < 20
+
+def test_starts_follow_the_rows_across_id_gaps():
+    with patch.object(approximate_profile.query, 'fetch_query_page', side_effect=fetch_query_page) as fetch:
+        starts = approximate_profile.get_random_starts('Account', 'Id', 40, approximate_profile.random.Random(3), TOTAL_RECORDS)
+    indexes = [get_index_range(f"Id >= {start}")[0] for start in starts]
+    assert len(set(indexes)) == 40
+    assert 10 <= sum(index < TOTAL_RECORDS // 2 for index in indexes) <= 30
+    assert fetch.call_count < 40 * 10
+
+def test_small_objects_are_profiled_exactly():
+    records = [create_record(index) for index in range(8)]
+    with patch.object(approximate_profile.query, 'fetch_query_page', return_value={'totalSize': 8, 'records': []}), \
+            patch.object(approximate_profile.query, 'iter_query', return_value=records) as iter_query:
+        result = approximate_profile.profile_object('Account', ['Id', 'Status__c', 'Notes__c'])
+    assert result['exact'] and result['sampledRows'] == 8
+    assert iter_query.call_args.args[0] == 'SELECT Id, Status__c, Notes__c FROM Account'
+    fields = {field['fieldName']: field for field in result['fields']}
+    assert fields['Notes__c']['nullRate'] == {'estimate': 0.25, 'lower': 0.25, 'upper': 0.25}
+    assert fields['Status__c']['topValues'][0] == {'value': 'Open', 'estimate': 4, 'lower': 4, 'upper': 4}
+
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
@@ -0,0 +1,65 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+import time
+import requests
+import pytest
+from unittest.mock import patch, Mock
+import salesforce.api.async_query as async_query
+import salesforce.api.limits as limits
+
+AUTHENTICATE_AND_GET_SESSION_FUNCTION = 'salesforce.api.query.authenticate_and_get_session'
+FETCH_ALL_RECORDS_FUNCTION = 'salesforce.api.async_query.fetch_all_records'
+
+def test_results_keep_input_order_with_per_query_errors():
+    def fetch(query_string, tooling=False):
+        if 'Bad' in query_string:
+            response = Mock(json=Mock(return_value=[{'message': 'sObject type not supported', 'errorCode': 'INVALID_TYPE'}]))
+            raise requests.exceptions.HTTPError(response=response)
+        time.sleep(0.01 if query_string.endswith('A') else 0)
+        return [{'Id': query_string}]
+
+    with patch(AUTHENTICATE_AND_GET_SESSION_FUNCTION), patch(FETCH_ALL_RECORDS_FUNCTION, side_effect=fetch):
+        results = async_query.run_queries(['SELECT Id FROM A', 'SELECT Id FROM Bad', 'SELECT Id FROM C'], concurrency=3)
+        assert [result['queryString'] for result in results] == ['SELECT Id FROM A', 'SELECT Id FROM Bad', 'SELECT Id FROM C']
+        assert results[0]['records'] == [{'Id': 'SELECT Id FROM A'}]
+        assert results[1]['hasError'] and results[1]['errorCode'] == 'INVALID_TYPE'
+        assert not results[2]['hasError']
+
+def test_other_errors_fail_only_their_query():
+    errors = {'SELECT Id FROM Limited': limits.ApiLimitError(95, 100, 0.9), 'SELECT Id FROM Html': ValueError('Expecting value')}
+
+    def fetch(query_string, tooling=False):
+        if query_string in errors:
+            raise errors[query_string]
+        return [{'Id': '001'}]
+
+    with patch(AUTHENTICATE_AND_GET_SESSION_FUNCTION), patch(FETCH_ALL_RECORDS_FUNCTION, side_effect=fetch):
+        results = async_query.run_queries(['SELECT Id FROM Limited', 'SELECT Id FROM Html', 'SELECT Id FROM A'])
+    assert [result['hasError'] for result in results] == [True, True, False]
+    assert results[1]['errorMessage'] == 'Expecting value'
+    assert results[2]['records'] == [{'Id': '001'}]
+
+def test_concurrency_cap_is_respected():
+    in_flight = []
+    peak = []
+    lock = threading.Lock()
+
+    def fetch(query_string, tooling=False):
+        with lock:
+            in_flight.append(query_string)
+            peak.append(len(in_flight))
+        time.sleep(0.02)
+        with lock:
+            in_flight.remove(query_string)
+        return []
+
+    with patch(AUTHENTICATE_AND_GET_SESSION_FUNCTION), patch(FETCH_ALL_RECORDS_FUNCTION, side_effect=fetch):
+        async_query.run_queries([f'SELECT Id FROM Object{index}' for index in range(12)], concurrency=4)
+        assert max(peak) <= 4
+
+
+# Run the tests
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
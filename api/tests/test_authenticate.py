@@ -0,0 +1,65 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+import pytest
+from unittest.mock import patch
+import salesforce.api.authenticate as authenticate
+
+AUTHENTICATE_API_FUNCTION = 'salesforce.api.authenticate.authenticate_api'
+
+def test_logs_in_once_and_reuses_session():
+    with patch(AUTHENTICATE_API_FUNCTION) as mock_authenticate_api:
+        mock_authenticate_api.return_value = ('session_id', 'https://server_url/services/Soap/u/58.0')
+        manager = authenticate.SessionManager('user', 'password', 'token', sandbox=True)
+        assert manager.get_session() == ('session_id', 'https://server_url/services/Soap/u/58.0')
+        assert manager.get_session() == ('session_id', 'https://server_url/services/Soap/u/58.0')
+        assert mock_authenticate_api.call_count == 1
+
+def test_concurrent_callers_share_one_login():
+    with patch(AUTHENTICATE_API_FUNCTION) as mock_authenticate_api:
+        mock_authenticate_api.return_value = ('session_id', 'https://server_url/services/Soap/u/58.0')
+        manager = authenticate.SessionManager('user', 'password', 'token')
+        threads = [threading.Thread(target=manager.get_session) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert mock_authenticate_api.call_count == 1
+
+def test_refresh_only_replaces_the_rejected_session():
+    with patch(AUTHENTICATE_API_FUNCTION) as mock_authenticate_api:
+        mock_authenticate_api.side_effect = [('first', 'https://server_url'), ('second', 'https://server_url')]
+        manager = authenticate.SessionManager('user', 'password', 'token')
+        manager.get_session()
+        assert manager.refresh('first') == ('second', 'https://server_url')
+        # A late caller reporting the old session must not force another login.
+        assert manager.refresh('first') == ('second', 'https://server_url')
+        assert mock_authenticate_api.call_count == 2
+
+def test_expired_session_logs_in_again():
+    with patch(AUTHENTICATE_API_FUNCTION) as mock_authenticate_api:
+        mock_authenticate_api.side_effect = [('first', 'https://server_url'), ('second', 'https://server_url')]
+        manager = authenticate.SessionManager('user', 'password', 'token', session_seconds=0)
+        assert manager.get_session()[0] == 'first'
+        assert manager.get_session()[0] == 'second'
+
+def test_disk_cache_is_shared_between_managers(tmp_path):
+    with patch(AUTHENTICATE_API_FUNCTION) as mock_authenticate_api:
+        mock_authenticate_api.return_value = ('session_id', 'https://server_url')
+        authenticate.SessionManager('user', 'password', 'token', cache_dir=str(tmp_path)).get_session()
+        other_manager = authenticate.SessionManager('user', 'password', 'token', cache_dir=str(tmp_path))
+        assert other_manager.get_session() == ('session_id', 'https://server_url')
+        assert mock_authenticate_api.call_count == 1
+
+def test_get_session_manager_is_keyed_by_user_and_sandbox():
+    authenticate.clear_session_managers()
+    manager = authenticate.get_session_manager('user', 'password', 'token', sandbox=True)
+    assert authenticate.get_session_manager('user', 'password', 'token', sandbox=True) is manager
+    assert authenticate.get_session_manager('user', 'password', 'token', sandbox=False) is not manager
+    authenticate.clear_session_managers()
+
+
+# Run the tests
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
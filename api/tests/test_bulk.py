@@ -0,0 +1,102 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import pytest
+from unittest.mock import patch, Mock
+import salesforce.api.bulk as bulk
+
+GET_SESSION_MANAGER_FUNCTION = 'salesforce.api.query.get_session_manager'
+RESULT_CHUNKS = [
+        ('2', 'Id,Name\n001A,"Acme, Inc"\n001B,Globex\n'),
+        ('null', 'Id,Name\n001C,Initech\n'),
+        ]
+
+
+class StubBulkHandler(BaseHTTPRequestHandler):
+    polls = 0
+    patches = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body, content_type='application/json', headers=None):
+        encoded = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(encoded)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.send_body(json.dumps({'id': '750JOB', 'state': 'UploadComplete'}))
+
+    def do_PATCH(self):
+        StubBulkHandler.patches.append((self.path, json.loads(self.rfile.read(int(self.headers['Content-Length'])))))
+        self.send_body(json.dumps({'id': '750JOB', 'state': 'Aborted'}))
+
+    def do_GET(self):
+        if self.path.endswith('/750JOB'):
+            StubBulkHandler.polls += 1
+            state = 'JobComplete' if StubBulkHandler.polls > 1 else 'InProgress'
+            self.send_body(json.dumps({'id': '750JOB', 'state': state}))
+            return
+        index = 1 if 'locator=2' in self.path else 0
+        locator, body = RESULT_CHUNKS[index]
+        self.send_body(body, content_type='text/csv', headers={'Sforce-Locator': locator, 'Sforce-NumberOfRecords': str(body.count('\n') - 1)})
+
+
+@pytest.fixture
+def stub_server():
+    StubBulkHandler.polls = 0
+    StubBulkHandler.patches = []
+    server = HTTPServer(('127.0.0.1', 0), StubBulkHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    manager = Mock()
+    manager.get_session.return_value = ('session_id', f'http://127.0.0.1:{server.server_port}/services/Soap/u/58.0')
+    with patch(GET_SESSION_MANAGER_FUNCTION, return_value=manager):
+        yield server
+    server.shutdown()
+
+def test_bulk_query_streams_all_chunks_to_one_file(stub_server, tmp_path):
+    path = tmp_path / 'extract.csv'
+    with patch('salesforce.api.bulk.time.sleep'):
+        record_count = bulk.run_bulk_query('SELECT Id, Name FROM Account', path=str(path))
+    assert record_count == 3
+    assert path.read_text() == 'Id,Name\n001A,"Acme, Inc"\n001B,Globex\n001C,Initech\n'
+
+def test_bulk_query_yields_dataframe_per_chunk(stub_server):
+    with patch('salesforce.api.bulk.time.sleep'):
+        frames = list(bulk.run_bulk_query('SELECT Id, Name FROM Account'))
+    assert [len(frame) for frame in frames] == [2, 1]
+    assert frames[0]['Name'].tolist() == ['Acme, Inc', 'Globex']
+
+def test_failed_job_raises(stub_server):
+    with patch('salesforce.api.bulk.get_job_info', return_value={'state': 'Failed', 'errorMessage': 'INVALID_FIELD'}):
+        with pytest.raises(bulk.BulkJobError):
+            bulk.wait_for_job('750JOB')
+
+def test_timed_out_job_is_aborted(stub_server):
+    with patch('salesforce.api.bulk.get_job_info', return_value={'state': 'InProgress'}), patch('salesforce.api.bulk.time.sleep'):
+        with pytest.raises(TimeoutError):
+            bulk.run_bulk_query('SELECT Id FROM Account', timeout=0)
+    assert StubBulkHandler.patches == [('/services/data/v58.0/jobs/query/750JOB', {'state': 'Aborted'})]
+
+def test_empty_chunks_are_empty_frames():
+    responses = [Mock(raw=io.BytesIO(b'')), Mock(raw=io.BytesIO(b'Id,Name\n'))]
+    with patch('salesforce.api.bulk.iter_result_responses', return_value=iter(responses)):
+        frames = list(bulk.iter_result_dataframes('750JOB'))
+    assert [len(frame) for frame in frames] == [0, 0]
+    assert list(frames[1].columns) == ['Id', 'Name']
+
+
+# Run the tests
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
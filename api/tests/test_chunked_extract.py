@@ -0,0 +1,102 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import csv
+import pytest
+import requests
+from unittest.mock import patch
+import salesforce.api.chunked_extract as chunked_extract
+
+def test_id_numbers_round_trip_and_keep_order():
+    record_id = '001Dn00000AbCdE'
+    assert chunked_extract.number_to_id(chunked_extract.id_to_number(record_id)) == record_id
+    assert chunked_extract.id_to_number('001Dn00000AbCdZ') < chunked_extract.id_to_number('001Dn00000AbCda')
+
+def test_boundaries_split_the_range_evenly():
+    boundaries = chunked_extract.compute_id_boundaries('001000000000000', '0010000000000z0', 4)
+    assert len(boundaries) == 3
+    assert boundaries == sorted(boundaries)
+    assert '001000000000000' < boundaries[0] and boundaries[-1] < '0010000000000z0'
+
+def test_boundaries_are_exact_for_large_ids():
+    low, high = chunked_extract.id_to_number('a0B000000000001'), chunked_extract.id_to_number('a0Bzzzzzzzzzzzz')
+    boundaries = chunked_extract.compute_id_boundaries('a0B000000000001', 'a0Bzzzzzzzzzzzz', 7)
+    assert [chunked_extract.id_to_number(boundary) for boundary in boundaries] == [low + (high - low) * index // 7 for index in range(1, 7)]
+
+def test_plan_id_ranges_leaves_outer_ranges_open():
+    pages = {
+        'SELECT COUNT() FROM Account': {'totalSize': 250, 'records': []},
+        'SELECT Id FROM Account ORDER BY Id ASC LIMIT 1': {'records': [{'Id': '001000000000000AAA'}]},
+        'SELECT Id FROM Account ORDER BY Id DESC LIMIT 1': {'records': [{'Id': '00100000000zzzzAAA'}]},
+    }
+    with patch.object(chunked_extract.query, 'fetch_query_page', side_effect=lambda path, params: pages[params['q']]):
+        ranges = chunked_extract.plan_id_ranges('Account', chunk_size=100)
+    assert len(ranges) == 3
+    assert ranges[0][0] is None and ranges[-1][1] is None
+    assert ranges[0][1] == ranges[1][0] and ranges[1][1] == ranges[2][0]
+
+def test_extract_writes_one_file_per_chunk(tmp_path):
+    records_by_query = {}
+
+    def iter_query(query_string, batched, prefetch):
+        records_by_query[query_string] = [{'attributes': {}, 'Id': f'00{len(records_by_query)}', 'Name': 'A'}]
+        yield records_by_query[query_string]
+
+    with patch.object(chunked_extract, 'plan_id_ranges', return_value=[(None, 'B'), ('B', None)]), \
+            patch.object(chunked_extract.query, 'iter_query', side_effect=iter_query):
+        chunks = chunked_extract.extract_object('Account', ['Id', 'Name'], str(tmp_path), workers=2)
+    assert sorted(records_by_query) == ["SELECT Id, Name FROM Account WHERE Id <= 'B'", "SELECT Id, Name FROM Account WHERE Id > 'B'"]
+    assert [chunk['records'] for chunk in chunks] == [1, 1]
+    with open(chunks[0]['path'], newline='') as chunk_file:
+        assert list(csv.DictReader(chunk_file))[0]['Name'] == 'A'
+
+def test_failed_chunk_is_retried_alone_and_resumed(tmp_path):
+    calls = []
+
+    def extract_chunk(query_string, field_names, path, use_bulk):
+        calls.append(query_string)
+        if 'Id > ' in query_string and calls.count(query_string) < 3:
+            raise requests.exceptions.ConnectionError('reset')
+        open(path, 'w').close()
+        return 5
+
+    with patch.object(chunked_extract, 'plan_id_ranges', return_value=[(None, 'B'), ('B', None)]), \
+            patch.object(chunked_extract, 'extract_chunk', side_effect=extract_chunk), \
+            patch.object(chunked_extract, 'RETRY_BACKOFF_SECONDS', 0):
+        with pytest.raises(chunked_extract.ChunkExtractError) as error:
+            chunked_extract.extract_object('Account', ['Id'], str(tmp_path), max_retries=1)
+        assert [chunk['index'] for chunk in error.value.failed_chunks] == [1]
+
+        chunks = chunked_extract.extract_object('Account', ['Id'], str(tmp_path), max_retries=1)
+    assert [chunk['skipped'] for chunk in chunks] == [True, False]
+    assert len(calls) == 4
+
+def test_resume_reuses_saved_ranges(tmp_path):
+    queries = []
+
+    def extract_chunk(query_string, field_names, path, use_bulk):
+        queries.append(query_string)
+        if "Id > 'B'" in query_string and len(queries) < 3:
+            raise ValueError('bad JSON')
+        open(path, 'w').close()
+        return 1
+
+    with patch.object(chunked_extract, 'plan_id_ranges', side_effect=[[(None, 'B'), ('B', None)], [(None, 'C'), ('C', None)]]) as plan, \
+            patch.object(chunked_extract, 'extract_chunk', side_effect=extract_chunk):
+        with pytest.raises(chunked_extract.ChunkExtractError) as error:
+            chunked_extract.extract_object('Account', ['Id'], str(tmp_path), workers=1)
+        assert error.value.failed_chunks[0]['error'] == 'ValueError: bad JSON'
+        assert os.path.exists(tmp_path / 'Account_00000.csv')
+
+        chunked_extract.extract_object('Account', ['Id'], str(tmp_path), workers=1)
+        assert plan.call_count == 1
+        assert queries[-1] == "SELECT Id FROM Account WHERE Id > 'B'"
+
+        with pytest.raises(ValueError):
+            chunked_extract.extract_object('Account', ['Id', 'Name'], str(tmp_path))
+        chunked_extract.extract_object('Account', ['Id'], str(tmp_path), skip_existing=False)
+    assert plan.call_count == 2
+    assert queries[-2:] == ["SELECT Id FROM Account WHERE Id <= 'C'", "SELECT Id FROM Account WHERE Id > 'C'"]
+
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
@@ -0,0 +1,42 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pandas as pd
+import pytest
+import salesforce.api.columnar as columnar
+
+RECORDS = [
+        {'attributes': {'type': 'Account'}, 'Id': '001A', 'Rating': 'Hot', 'NumberOfEmployees': 10, 'CreatedDate': '2024-01-01T10:00:00.000+0000',
+         'Owner': {'attributes': {'type': 'User'}, 'Name': 'Ada', 'Manager': {'attributes': {'type': 'User'}, 'Name': 'Grace'}}},
+        {'attributes': {'type': 'Account'}, 'Id': '001B', 'Rating': None, 'NumberOfEmployees': None, 'CreatedDate': None, 'Owner': None, 'IsPartner': True},
+        ]
+FIELD_TYPES = {'Rating': 'picklist', 'NumberOfEmployees': 'int', 'CreatedDate': 'datetime', 'IsPartner': 'boolean'}
+
+def test_relationships_are_flattened_and_attributes_dropped():
+    df = columnar.records_to_dataframe(RECORDS)
+    assert list(df.columns) == ['Id', 'Rating', 'NumberOfEmployees', 'CreatedDate', 'Owner.Name', 'Owner.Manager.Name', 'IsPartner']
+    assert pd.isna(df['Owner.Name'][1])
+    assert df['Owner.Manager.Name'][0] == 'Grace' and pd.isna(df['Owner.Manager.Name'][1])
+    assert pd.isna(df['IsPartner'][0]) and df['IsPartner'][1]
+
+def test_null_relationship_before_its_columns_leaves_no_stray_column():
+    df = columnar.records_to_dataframe(list(reversed(RECORDS)))
+    assert 'Owner' not in df.columns
+    assert pd.isna(df['Owner.Name'][0]) and df['Owner.Name'][1] == 'Ada'
+
+def test_describe_types_are_applied():
+    df = columnar.records_to_dataframe(RECORDS, field_types=FIELD_TYPES)
+    assert str(df['Rating'].dtype) == 'category'
+    assert str(df['NumberOfEmployees'].dtype) == 'Int64'
+    assert str(df['IsPartner'].dtype) == 'boolean'
+    assert df['CreatedDate'].dt.year.tolist()[0] == 2024
+
+def test_columns_can_be_added_page_by_page():
+    builder = columnar.ColumnBuilder()
+    builder.add_records(RECORDS[:1]).add_records(RECORDS[1:])
+    assert len(builder.to_dataframe()) == 2
+
+
+# Run the tests
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
@@ -0,0 +1,62 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from unittest.mock import patch, Mock
+import salesforce.api.composite as composite
+
+POST_WITH_SESSION_FUNCTION = 'salesforce.api.query.post_with_session'
+
+def mock_composite_response(json=None):
+    batch_requests = json['batchRequests']
+    results = []
+    for sub_request in batch_requests:
+        if 'Missing__c' in sub_request['url']:
+            results.append({'statusCode': 404, 'result': [{'errorCode': 'NOT_FOUND', 'message': 'The requested resource does not exist'}]})
+        else:
+            results.append({'statusCode': 200, 'result': {'url': sub_request['url'], 'fields': []}})
+    return Mock(json=Mock(return_value={'hasErrors': False, 'results': results}))
+
+def test_sub_requests_are_grouped_in_batches_of_25():
+    with patch(POST_WITH_SESSION_FUNCTION, side_effect=lambda path, json=None: mock_composite_response(json)) as mock_post:
+        requester = composite.BatchRequester(auto_flush=False)
+        descriptions = composite.describe_objects([f'Object{index}__c' for index in range(30)], requester=requester)
+        assert mock_post.call_count == 2
+        assert [len(call.kwargs['json']['batchRequests']) for call in mock_post.call_args_list] == [25, 5]
+        assert descriptions['Object29__c']['url'] == 'v58.0/sobjects/Object29__c/describe'
+
+def test_failed_sub_request_only_fails_its_caller():
+    with patch(POST_WITH_SESSION_FUNCTION, side_effect=lambda path, json=None: mock_composite_response(json)):
+        requester = composite.BatchRequester(auto_flush=False)
+        found = requester.describe('Account')
+        missing = requester.describe('Missing__c')
+        requester.flush()
+        assert found.result()['url'] == 'v58.0/sobjects/Account/describe'
+        with pytest.raises(composite.CompositeRequestError):
+            missing.result()
+
+def test_auto_flush_sends_partial_batch_after_interval():
+    with patch(POST_WITH_SESSION_FUNCTION, side_effect=lambda path, json=None: mock_composite_response(json)) as mock_post:
+        requester = composite.BatchRequester(flush_interval=0.01)
+        future = requester.limits()
+        assert future.result(timeout=1)['url'] == 'v58.0/limits'
+        assert mock_post.call_count == 1
+
+def test_truncated_or_failed_batch_fails_every_waiting_caller():
+    truncated = Mock(json=Mock(return_value={'hasErrors': False, 'results': [{'statusCode': 200, 'result': {}}]}))
+    with patch(POST_WITH_SESSION_FUNCTION, side_effect=[truncated, ConnectionError('reset')]):
+        requester = composite.BatchRequester(auto_flush=False)
+        first, second = requester.describe('Account'), requester.describe('Contact')
+        requester.flush()
+        assert first.result(timeout=1) == {}
+        with pytest.raises(composite.CompositeBatchError):
+            second.result(timeout=1)
+
+        third = requester.limits()
+        requester.flush()
+        with pytest.raises(ConnectionError):
+            third.result(timeout=1)
+
+# Run the tests
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
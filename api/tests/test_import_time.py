@@ -0,0 +1,34 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import subprocess
+import pytest
+
+HEAVY_MODULES = ['pandas', 'numpy', 'simple_salesforce', 'analysis.dataframe']
+MAX_IMPORT_SECONDS = 1.5
+
+def import_in_fresh_interpreter(module_names):
+    # A fresh interpreter, so modules already imported by other tests don't hide the cost.
+    script = f"""
+import json, sys, threading, time
+started_at = time.perf_counter()
+for module_name in {module_names!r}:
+    __import__(module_name)
+print(json.dumps({{'seconds': time.perf_counter() - started_at, 'modules': sorted(sys.modules), 'threads': threading.active_count()}}))
+"""
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path))
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True, env=environment, cwd=os.path.dirname(__file__))
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+@pytest.mark.parametrize('module_names', [['salesforce.api.authenticate'], ['salesforce.soql.soql'], ['salesforce.api.query']])
+def test_import_is_light_and_side_effect_free(module_names):
+    result = import_in_fresh_interpreter(module_names)
+    assert [module for module in HEAVY_MODULES if module in result['modules']] == []
+    assert result['threads'] == 1
+    assert result['seconds'] < MAX_IMPORT_SECONDS
+
+
+# Run the tests
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
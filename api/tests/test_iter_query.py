@@ -0,0 +1,45 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import pytest
+from unittest.mock import patch, Mock
+import salesforce.api.query as query
+
+GET_WITH_SESSION_FUNCTION = 'salesforce.api.query.get_with_session'
+
+def mock_pages(pages):
+    responses = {}
+    for index, records in enumerate(pages):
+        body = {'totalSize': sum(len(page) for page in pages), 'done': index == len(pages) - 1, 'records': records}
+        if index < len(pages) - 1:
+            body['nextRecordsUrl'] = f'/services/data/v58.0/query/01g-{index + 1}'
+        responses[query.QUERY_PATH if index == 0 else f'/services/data/v58.0/query/01g-{index}'] = Mock(content=json.dumps(body).encode('utf-8'))
+    return lambda path, params=None: responses[path]
+
+@pytest.mark.parametrize('prefetch', [True, False])
+def test_iter_query_follows_next_records_url(prefetch):
+    with patch(GET_WITH_SESSION_FUNCTION) as mock_get_with_session:
+        mock_get_with_session.side_effect = mock_pages([[{'Id': '1'}, {'Id': '2'}], [{'Id': '3'}], [{'Id': '4'}]])
+        records = list(query.iter_query('SELECT Id FROM Account', prefetch=prefetch))
+        assert [record['Id'] for record in records] == ['1', '2', '3', '4']
+        assert mock_get_with_session.call_count == 3
+
+def test_iter_query_batched_yields_pages():
+    with patch(GET_WITH_SESSION_FUNCTION) as mock_get_with_session:
+        mock_get_with_session.side_effect = mock_pages([[{'Id': '1'}, {'Id': '2'}], [{'Id': '3'}]])
+        pages = list(query.iter_query('SELECT Id FROM Account', batched=True))
+        assert [len(page) for page in pages] == [2, 1]
+
+def test_collect_remaining_pages_merges_records():
+    with patch(GET_WITH_SESSION_FUNCTION) as mock_get_with_session:
+        mock_get_with_session.side_effect = mock_pages([[{'Id': '1'}], [{'Id': '2'}]])
+        first_page = query.fetch_query_page(query.QUERY_PATH)
+        dto = query.collect_remaining_pages({'records': first_page, 'hasError': False})
+        assert [record['Id'] for record in dto['records']['records']] == ['1', '2']
+        assert 'nextRecordsUrl' not in dto['records']
+
+
+# Run the tests
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
@@ -0,0 +1,86 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from unittest.mock import patch, Mock
+import salesforce.api.limits as limits
+import salesforce.api.transport as transport
+
+def mock_response(status_code=200, limit_info='api-usage=10/15000', content=b'{}', retry_after=None):
+    headers = {'Sforce-Limit-Info': limit_info}
+    if retry_after is not None:
+        headers['Retry-After'] = retry_after
+    return Mock(status_code=status_code, headers=headers, content=content)
+
+def test_usage_is_read_from_limit_info_header():
+    governor = limits.LimitGovernor()
+    governor.acquire()
+    governor.release(mock_response(limit_info='api-usage=25/15000'))
+    usage = governor.get_usage()
+    assert (usage['dailyUsed'], usage['dailyMax'], usage['requestsSent'], usage['inFlight']) == (25, 15000, 1, 0)
+
+def test_requests_stop_at_daily_share():
+    governor = limits.LimitGovernor(daily_share=0.5)
+    governor.update_from_limits({'DailyApiRequests': {'Max': 100, 'Remaining': 40}})
+    with pytest.raises(limits.ApiLimitError):
+        governor.acquire()
+
+def test_usage_is_polled_again_before_refusing():
+    usage = iter([{'DailyApiRequests': {'Max': 100, 'Remaining': 90}}, {'DailyApiRequests': {'Max': 100, 'Remaining': 10}}])
+
+    def poller(governor):
+        # The /limits request goes through the governor too and must not be refused or re-poll.
+        governor.acquire()
+        governor.release()
+        governor.update_from_limits(next(usage))
+
+    governor = limits.LimitGovernor(daily_share=0.5, poller=Mock(side_effect=poller))
+    governor.update_from_limits({'DailyApiRequests': {'Max': 100, 'Remaining': 10}})
+    governor.acquire()
+    governor.release()
+    assert governor.get_usage()['dailyUsed'] == 10
+
+    governor.update_from_limits({'DailyApiRequests': {'Max': 100, 'Remaining': 10}})
+    with patch.object(limits, 'REPOLL_INTERVAL', 0):
+        with pytest.raises(limits.ApiLimitError):
+            governor.acquire()
+    assert governor.poller.call_count == 2
+    with pytest.raises(limits.ApiLimitError):
+        governor.acquire()
+    assert governor.poller.call_count == 2
+
+def test_concurrency_shrinks_with_headroom():
+    governor = limits.LimitGovernor(daily_share=0.5, max_concurrent=10)
+    governor.update_from_limits({'DailyApiRequests': {'Max': 1000, 'Remaining': 1000}})
+    assert governor.get_usage()['concurrencyLimit'] == 10
+    governor.acquire()
+    governor.release(mock_response(limit_info='api-usage=470/1000'))
+    assert governor.get_usage()['concurrencyLimit'] == 3
+    governor.update_from_limits({'DailyApiRequests': {'Max': 1000, 'Remaining': 501}})
+    assert governor.get_usage()['concurrencyLimit'] == 1
+
+def test_shared_governor_polls_limits():
+    previous = limits.set_governor(None)
+    try:
+        governor = limits.get_governor()
+        assert governor.poll_interval == limits.DEFAULT_POLL_INTERVAL and governor.poller is limits.poll_limits
+    finally:
+        limits.set_governor(previous)
+
+def test_throttled_requests_are_retried_with_backoff():
+    session = Mock()
+    session.request.side_effect = [mock_response(status_code=403, content=b'[{"errorCode":"REQUEST_LIMIT_EXCEEDED"}]'),
+                                   mock_response(status_code=429, retry_after='0'),
+                                   mock_response()]
+    governor = limits.LimitGovernor()
+    with patch('salesforce.api.limits.time.sleep') as mock_sleep:
+        response = transport.Transport(session=session, governor=governor).get('https://example.my.salesforce.com')
+    assert response.status_code == 200
+    assert session.request.call_count == 3
+    assert mock_sleep.call_count == 2
+    assert governor.get_usage()['throttled'] == 2
+
+
+# Run the tests
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
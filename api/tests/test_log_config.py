@@ -0,0 +1,69 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import logging
+import logging.handlers
+import pytest
+from unittest.mock import Mock
+import salesforce.log_config as log_config
+
+class UnrenderableList(list):
+    def __repr__(self):
+        raise AssertionError('rendered the whole payload')
+
+@pytest.fixture
+def fresh_logging(monkeypatch):
+    # Sets up log_config from scratch and puts the module's own handler back afterwards.
+    root = logging.getLogger()
+    previous_handlers = list(root.handlers)
+    for name in ('_queue_handler', '_queue_listener'):
+        monkeypatch.setattr(log_config, name, None)
+    monkeypatch.setattr(log_config, '_listener_started', False)
+    monkeypatch.setattr(log_config, '_listener_stopped', False)
+    root.handlers[:] = [handler for handler in previous_handlers if not isinstance(handler, log_config.StartingQueueHandler)]
+    yield
+    log_config.stop_logging()
+    root.handlers[:] = previous_handlers
+
+def test_repeated_calls_share_one_root_queue_handler(fresh_logging, tmp_path):
+    handler = log_config.configure_logging(file_name=str(tmp_path / 'run.log'))
+    loggers = [log_config.get_logger(name) for name in ('salesforce', 'salesforce.api', 'salesforce.api.query', 'salesforce.api')]
+    assert log_config.configure_logging() is handler
+    queue_handlers = [handler for handler in logging.getLogger().handlers if isinstance(handler, logging.handlers.QueueHandler)]
+    assert queue_handlers == [handler]
+    assert all(not logger.handlers for logger in loggers)
+
+def test_records_reach_the_file_through_the_listener(fresh_logging, tmp_path):
+    log_file = tmp_path / 'run.log'
+    log_config.configure_logging(file_name=str(log_file), level='DEBUG')
+    assert not log_file.exists()
+    log_config.get_logger('salesforce.api.query').debug('Fetched %s records', 3)
+    log_config.stop_logging()
+    file_handler, = [handler for handler in log_config._queue_listener.handlers if isinstance(handler, logging.handlers.RotatingFileHandler)]
+    file_handler.close()
+    lines = log_file.read_text(encoding='utf-8').splitlines()
+    assert len(lines) == 1 and lines[0].endswith(' - DEBUG - Fetched 3 records')
+
+def test_bad_sample_rate_falls_back_on_first_use(monkeypatch):
+    monkeypatch.setattr(log_config, '_payload_sampler', None)
+    monkeypatch.setenv(log_config.PAYLOAD_SAMPLE_RATE_VARIABLE, 'often')
+    assert log_config.get_payload_sampler().sample_rate == 1.0
+
+def test_log_levels_are_read_by_name():
+    assert log_config.get_log_level('debug') == logging.DEBUG
+    assert log_config.get_log_level('verbose') == logging.INFO
+    assert log_config.get_log_level(5) == 5
+
+def test_large_payloads_are_cut_before_they_are_rendered():
+    records = UnrenderableList({'Id': f'001{index:012d}', 'Name': 'x' * 100} for index in range(100000))
+    logger = Mock(isEnabledFor=Mock(return_value=True))
+    log_config.log_payload(logger, 'Records', records, sampler=Mock(should_log=Mock(return_value=True)))
+    text = logger.debug.call_args.args[2]
+    assert text.startswith(repr(list(records[:2]))[:-1]) and text.endswith('... (truncated)')
+    assert len(text) == log_config.MAX_PAYLOAD_CHARS + len('... (truncated)')
+    assert log_config.truncate_payload({'a': [1, 'b', None]}) == repr({'a': [1, 'b', None]})
+
+
+# Run the tests
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
@@ -0,0 +1,80 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import pytest
+from unittest.mock import patch, Mock
+import salesforce.api.metadata_cache as metadata_cache
+
+ITER_QUERY_FUNCTION = 'salesforce.api.query.iter_query'
+GET_WITH_SESSION_FUNCTION = 'salesforce.api.query.get_with_session'
+GET_BATCH_REQUESTER_FUNCTION = 'salesforce.api.composite.get_batch_requester'
+
+CUSTOM_OBJECTS = [{'attributes': {'type': 'CustomObject'}, 'Id': '01I1', 'DeveloperName': 'Course', 'NamespacePrefix': 'hed'}]
+DESCRIBE = {'name': 'Account', 'fields': [{'name': 'Name', 'type': 'string', 'aggregatable': True}]}
+
+def mock_batch_requester(describe):
+    future = Future()
+    future.set_result(describe)
+    return Mock(describe=Mock(return_value=future))
+
+def test_tooling_records_are_downloaded_once():
+    with patch(ITER_QUERY_FUNCTION, return_value=iter(CUSTOM_OBJECTS)) as mock_iter_query:
+        cache = metadata_cache.MetadataCache()
+        assert cache.get_object_name('01I1') == 'Course'
+        assert cache.get_custom_objects() == [{'Id': '01I1', 'DeveloperName': 'Course', 'NamespacePrefix': 'hed'}]
+        assert mock_iter_query.call_count == 1
+
+def test_cache_survives_restart_on_disk(tmp_path):
+    path = str(tmp_path / 'metadata.sqlite')
+    with patch(GET_BATCH_REQUESTER_FUNCTION, return_value=mock_batch_requester(DESCRIBE)) as mock_get_batch_requester:
+        metadata_cache.MetadataCache(path).get_describe('Account')
+        assert metadata_cache.MetadataCache(path).get_field_type('Account', 'Name') == 'string'
+        assert mock_get_batch_requester.call_count == 1
+
+def test_expired_describe_is_revalidated(tmp_path):
+    path = str(tmp_path / 'metadata.sqlite')
+    with patch(GET_BATCH_REQUESTER_FUNCTION, return_value=mock_batch_requester(DESCRIBE)), patch(GET_WITH_SESSION_FUNCTION) as mock_get_with_session:
+        mock_get_with_session.return_value = Mock(status_code=304)
+        cache = metadata_cache.MetadataCache(path, ttl=0)
+        cache.get_describe('Account')
+        assert cache.get_describe('Account') == DESCRIBE
+        assert 'If-Modified-Since' in mock_get_with_session.call_args.kwargs['headers']
+
+def test_concurrent_describes_are_fetched_together_and_coalesced():
+    # Both objects must be requested before either describe returns, as a shared batch would be.
+    requested = []
+    both_requested = threading.Barrier(2, timeout=5)
+
+    def describe(object_name):
+        requested.append(object_name)
+        future = Future()
+        both_requested.wait()
+        future.set_result({'name': object_name, 'fields': []})
+        return future
+
+    with patch(GET_BATCH_REQUESTER_FUNCTION, return_value=Mock(describe=Mock(side_effect=describe))):
+        cache = metadata_cache.MetadataCache()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(cache.get_describe, ['Account', 'Contact', 'Account', 'Contact']))
+    assert [result['name'] for result in results] == ['Account', 'Contact', 'Account', 'Contact']
+    assert sorted(requested) == ['Account', 'Contact']
+
+def test_shared_cache_is_a_file_under_the_user_cache_dir(monkeypatch, tmp_path):
+    monkeypatch.delenv(metadata_cache.METADATA_CACHE_PATH_VARIABLE, raising=False)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    previous = metadata_cache.set_metadata_cache(None)
+    try:
+        cache = metadata_cache.get_metadata_cache()
+    finally:
+        metadata_cache.set_metadata_cache(previous)
+    path, = (tmp_path / 'salesforce').glob('metadata_*.sqlite')
+    assert path.name == os.path.basename(metadata_cache.get_default_cache_path())
+    with patch(GET_BATCH_REQUESTER_FUNCTION, return_value=mock_batch_requester(DESCRIBE)):
+        cache.get_describe('Account')
+    assert metadata_cache.MetadataCache(str(path)).get_describe('Account') == DESCRIBE
+
+# Run the tests
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
@@ -0,0 +1,143 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pandas as pd
+import pytest
+from unittest.mock import Mock, patch
+import salesforce.api.preflight as preflight
+import salesforce.api.query as query
+import salesforce.api.result_cache as result_cache
+
+def create_explain(cardinality, object_rows, relative_cost, operation='Index'):
+    return {'plans': [
+        {'cardinality': object_rows, 'sobjectCardinality': object_rows, 'relativeCost': relative_cost + 1, 'leadingOperationType': 'TableScan', 'notes': []},
+        {'cardinality': cardinality, 'sobjectCardinality': object_rows, 'relativeCost': relative_cost, 'leadingOperationType': operation,
+         'notes': [{'description': 'Not considering filter for optimization because unindexed'}]}
+    ]}
+
+@pytest.fixture
+def org():
+    org = Mock()
+    org.fetch_explain.return_value = create_explain(100, 1000, 0.1)
+    org.fetch_count.return_value = 100
+    with patch.object(preflight, 'fetch_explain', org.fetch_explain), patch.object(preflight, 'fetch_count', org.fetch_count):
+        yield org
+
+def plan(query_string, **kwargs):
+    return preflight.plan_query(query_string, cache=result_cache.ResultCache(), **kwargs)
+
+def test_parse_query_finds_top_level_from():
+    parts = preflight.parse_query("SELECT Id, (SELECT Id FROM Contacts) FROM Account WHERE Name IN (SELECT Name FROM Lead) LIMIT 10")
+    assert parts['objectName'] == 'Account'
+    assert parts['limit'] == 10
+    assert not parts['isBulkSupported'] and not parts['isChunkable']
+    parts = preflight.parse_query("SELECT Id, Name\nFROM Account\nWHERE Name = 'From here'")
+    assert (parts['objectName'], parts['fieldNames'], parts['whereClause']) == ('Account', ['Id', 'Name'], "Name = 'From here'")
+    assert parts['isChunkable']
+
+def test_where_clause_stops_at_the_next_clause():
+    parts = preflight.parse_query("SELECT Id FROM Account WHERE Name = 'With (LIMIT)' WITH SECURITY_ENFORCED")
+    assert parts['whereClause'] == "Name = 'With (LIMIT)'"
+    assert parts['limit'] is None and not parts['isChunkable'] and parts['isBulkSupported']
+    parts = preflight.parse_query("SELECT Id FROM Account WHERE Id IN (SELECT AccountId FROM Contact LIMIT 5) FOR VIEW")
+    assert parts['whereClause'] == "Id IN (SELECT AccountId FROM Contact LIMIT 5)"
+    assert parts['limit'] is None and not parts['isChunkable']
+    assert not preflight.parse_query("SELECT Id FROM Account USING SCOPE mine")['isChunkable']
+
+def test_count_query_drops_order_and_limit():
+    parts = preflight.parse_query("SELECT Id FROM Account WHERE Name != null ORDER BY Name DESC LIMIT 5 OFFSET 10")
+    assert preflight.get_count_query(parts) == "SELECT COUNT() FROM Account WHERE Name != null"
+
+def test_query_shape_ignores_literals():
+    first = preflight.get_query_shape("SELECT Id FROM Account WHERE Name = 'A' AND  NumberOfEmployees > 10")
+    second = preflight.get_query_shape("SELECT Id FROM Account WHERE Name = 'It\\'s' AND NumberOfEmployees > 2.5")
+    assert first == second == "SELECT Id FROM Account WHERE Name = ? AND NumberOfEmployees > ?"
+
+@pytest.mark.parametrize('rows, strategy', [(100, 'rest'), (10000, 'rest_paged'), (200000, 'bulk'), (6000000, 'chunked')])
+def test_strategy_follows_counted_rows(org, rows, strategy):
+    org.fetch_count.return_value = rows
+    result = plan("SELECT Id, Name FROM Account WHERE Type = 'Customer'")
+    assert (result['strategy'], result['estimatedRows'], result['counted']) == (strategy, rows, True)
+    assert result['leadingOperationType'] == 'Index' and result['relativeCost'] == 0.1
+
+def test_ordered_queries_are_not_chunked(org):
+    org.fetch_count.return_value = 6000000
+    assert plan("SELECT Id FROM Account ORDER BY Name")['strategy'] == 'bulk'
+
+def test_non_selective_scan_of_large_object_skips_count_and_uses_bulk(org):
+    org.fetch_explain.return_value = create_explain(3000, 2000000, 2.5, operation='TableScan')
+    result = plan("SELECT Id FROM Account WHERE Description LIKE '%x%'")
+    assert org.fetch_count.call_count == 0
+    assert (result['strategy'], result['estimatedRows'], result['counted']) == ('bulk', 3000, False)
+    assert result['notes'] == ['Not considering filter for optimization because unindexed']
+
+def test_non_selective_aggregate_is_rejected(org):
+    org.fetch_explain.return_value = create_explain(3000, 2000000, 2.5, operation='TableScan')
+    with pytest.raises(preflight.QueryRejectedError) as error:
+        plan("SELECT Type, COUNT(Id) FROM Account GROUP BY Type")
+    assert 'non-selective' in error.value.reason and error.value.plan['objectRows'] == 2000000
+
+def test_max_rows_rejects_before_fetching(org):
+    org.fetch_count.return_value = 500
+    with pytest.raises(preflight.QueryRejectedError, match='more than the allowed 100'):
+        plan("SELECT Id FROM Account", max_rows=100)
+
+def test_limit_caps_estimate(org):
+    org.fetch_count.return_value = 500000
+    assert plan("SELECT Id FROM Account LIMIT 50")['strategy'] == 'rest'
+
+def test_plans_are_cached_per_shape(org):
+    cache = result_cache.ResultCache()
+    preflight.plan_query("SELECT Id FROM Account WHERE Name = 'A'", cache=cache)
+    preflight.plan_query("SELECT Id FROM Account WHERE Name = 'B'", cache=cache)
+    preflight.plan_query("SELECT Id FROM Account WHERE Name = 'A'", cache=cache)
+    assert org.fetch_explain.call_count == 1
+    assert org.fetch_count.call_count == 2
+
+def test_shape_plan_does_not_lend_its_row_estimate(org):
+    cache = result_cache.ResultCache()
+    org.fetch_explain.side_effect = [create_explain(3000, 2000000, 2.5, operation='TableScan'),
+                                     create_explain(900000, 2000000, 2.5, operation='TableScan')]
+    first = preflight.plan_query("SELECT Id FROM Case WHERE Status = 'Open'", cache=cache)
+    second = preflight.plan_query("SELECT Id FROM Case WHERE Status = 'Closed'", cache=cache)
+    assert (first['estimatedRows'], second['estimatedRows']) == (3000, 900000)
+    assert org.fetch_explain.call_args.args == ("SELECT Id FROM Case WHERE Status = 'Closed'",)
+    assert org.fetch_count.call_count == 0
+
+def test_run_query_dispatches_to_strategy(org, tmp_path):
+    org.fetch_count.return_value = 6000000
+    with patch.object(preflight, 'get_plan_cache', return_value=result_cache.ResultCache()), \
+            patch.object(preflight.chunked_extract, 'extract_object', return_value=['chunk.csv']) as extract_object:
+        assert preflight.run_query("SELECT Id, Name FROM Account WHERE Type = 'Customer'", output_path=str(tmp_path)) == ['chunk.csv']
+    assert extract_object.call_args.args == ('Account', ['Id', 'Name'], str(tmp_path))
+    assert extract_object.call_args.kwargs['where_clause'] == "Type = 'Customer'"
+
+def test_run_query_using_requests_rejects_before_querying(org):
+    org.fetch_count.return_value = 500
+    with patch.object(preflight, 'get_plan_cache', return_value=result_cache.ResultCache()), \
+            patch.object(query, 'get_with_session') as get_with_session:
+        with pytest.raises(preflight.QueryRejectedError):
+            query.run_query_using_requests("SELECT Id FROM Account", preflight=True, max_rows=100)
+    assert get_with_session.call_count == 0
+
+def test_cached_queries_are_still_preflighted(org):
+    org.fetch_count.return_value = 500
+    with patch.object(preflight, 'get_plan_cache', return_value=result_cache.ResultCache()), \
+            patch.object(query, 'get_with_session') as get_with_session:
+        with pytest.raises(preflight.QueryRejectedError):
+            query.run_query_using_requests("SELECT Id FROM Account", preflight=True, max_rows=100, cached=True)
+    assert get_with_session.call_count == 0
+
+def test_run_query_using_requests_uses_bulk_for_large_results(org):
+    org.fetch_count.return_value = 200000
+    frames = iter([pd.DataFrame({'Id': ['001A', '001B']})])
+    with patch.object(preflight, 'get_plan_cache', return_value=result_cache.ResultCache()), \
+            patch.object(preflight.bulk, 'run_bulk_query', return_value=frames), \
+            patch.object(query, 'get_with_session') as get_with_session:
+        dto = query.run_query_using_requests("SELECT Id FROM Account", preflight=True)
+    assert get_with_session.call_count == 0
+    assert dto['strategy'] == 'bulk' and not dto['hasError']
+    assert dto['records'] == {'totalSize': 2, 'done': True, 'records': [{'Id': '001A'}, {'Id': '001B'}]}
+
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
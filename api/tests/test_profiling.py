@@ -0,0 +1,109 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pandas as pd
+import pytest
+import requests
+from unittest.mock import Mock, patch
+import salesforce.api.limits as limits
+import salesforce.api.profiling as profiling
+import salesforce.api.query as query
+
+DESCRIBE = {'queryable': True, 'fields': [
+    {'name': 'Id', 'type': 'id', 'groupable': True, 'filterable': True},
+    {'name': 'Notes__c', 'type': 'textarea', 'groupable': False, 'filterable': False},
+]}
+
+@pytest.fixture
+def cache():
+    cache = Mock()
+    cache.get_describe.return_value = DESCRIBE
+    with patch.object(profiling.metadata_cache, 'get_metadata_cache', return_value=cache):
+        yield cache
+
+def fetch_query_page(path, params):
+    if 'GROUP BY' in params['q']:
+        return {'records': [{'Id': '001A', 'expr0': 1}]}
+    return {'records': [{'CreatedDate': '2024-01-01T00:00:00.000+0000', 'Id': '001A'}]}
+
+def test_custom_object_names_come_from_the_tooling_name_helper(cache):
+    cache.get_custom_objects.return_value = [{'Id': '01I1', 'DeveloperName': 'Rule', 'NamespacePrefix': 'hed'}]
+    formatted = pd.DataFrame({'Id': ['01I1'], 'DeveloperName': ['hed__Rule__mdt']})
+    with patch.object(profiling.format, 'format_api_names_from_tooling_api', return_value=formatted) as format_names:
+        assert profiling.get_custom_object_api_names() == ['hed__Rule__mdt']
+    assert format_names.call_args.args[0].to_dict('records') == cache.get_custom_objects.return_value
+
+def test_plan_skips_fields_that_cannot_be_grouped_or_filtered(cache):
+    fields, units = profiling.plan_profile(['Widget__c'])
+    assert fields == [('Widget__c', 'Id', 'id'), ('Widget__c', 'Notes__c', 'textarea')]
+    assert [unit['unitId'] for unit in units] == ['Widget__c.*.count', 'Widget__c.Id.top_values', 'Widget__c.Id.last_populated']
+
+def test_approximate_plan_profiles_each_object_in_one_unit(cache, tmp_path):
+    result = {'objectName': 'Widget__c', 'exact': False, 'fields': [
+        {'fieldName': 'Id', 'nonNullCount': {'estimate': 100, 'lower': 90, 'upper': 100},
+         'distinctCount': {'estimate': 100, 'lower': 40, 'upper': 100}, 'topValues': []}]}
+    with patch.object(profiling.approximate_profile, 'profile_object', return_value=result) as profile_object, \
+            patch.object(profiling.query, 'fetch_query_page', side_effect=fetch_query_page):
+        progress = profiling.run_profile(['Widget__c'], store_path=str(tmp_path / 'profile.sqlite'), output_path=str(tmp_path / 'profile.csv'),
+                                         approximate=True, exact_threshold=10)
+    assert progress == {'done': 2}
+    assert profile_object.call_args.kwargs['exact_threshold'] == 10
+    row = pd.read_csv(tmp_path / 'profile.csv').set_index('fieldName').loc['Id']
+    assert (row['nonNullCount'], row['nonNullCountLower'], row['distinctCountLower'], row['isApproximate']) == (100, 90, 40, True)
+
+def test_profile_writes_one_row_per_field(cache, tmp_path):
+    counts = {'counts': {'Id': 10}, 'rejected': {'Notes__c': 'Field of type textarea is not aggregatable'}}
+    with patch.object(profiling.query_repair, 'get_count_of_fields_values_repaired', return_value=counts), \
+            patch.object(profiling.query, 'fetch_query_page', side_effect=fetch_query_page):
+        progress = profiling.run_profile(['Widget__c'], store_path=str(tmp_path / 'profile.sqlite'), output_path=str(tmp_path / 'profile.csv'))
+    assert progress == {'done': 3}
+    rows = pd.read_csv(tmp_path / 'profile.csv').set_index('fieldName')
+    assert rows.loc['Id', 'nonNullCount'] == 10
+    assert rows.loc['Id', 'topValues'] == '[{"value": "001A", "count": 1}]'
+    assert rows.loc['Id', 'lastPopulatedDate'] == '2024-01-01T00:00:00.000+0000'
+    assert rows.loc['Notes__c', 'errors'] == 'Field of type textarea is not aggregatable'
+
+def test_restart_only_runs_unfinished_units(cache, tmp_path):
+    store_path = str(tmp_path / 'profile.sqlite')
+    failing_fetch = Mock(side_effect=[requests.exceptions.HTTPError(response=Mock(json=Mock(return_value=[{'message': 'timeout', 'errorCode': 'QUERY_TIMEOUT'}]))),
+                                      limits.ApiLimitError(90, 100, 0.8)])
+    with patch.object(profiling.query_repair, 'get_count_of_fields_values_repaired', return_value={'counts': {}, 'rejected': {}}), \
+            patch.object(profiling.query, 'fetch_query_page', failing_fetch):
+        progress = profiling.run_profile(['Widget__c'], store_path=store_path, concurrency=1)
+    assert progress == {'done': 1, 'failed': 1, 'pending': 1}
+
+    fetch = Mock(side_effect=fetch_query_page)
+    with patch.object(profiling.query_repair, 'get_count_of_fields_values_repaired') as count, \
+            patch.object(profiling.query, 'fetch_query_page', fetch):
+        progress = profiling.run_profile(store_path=store_path)
+    assert progress == {'done': 3}
+    assert count.call_count == 0 and fetch.call_count == 2
+
+def test_resume_with_other_settings_is_refused(cache, tmp_path):
+    store_path = str(tmp_path / 'profile.sqlite')
+    with patch.object(profiling.query_repair, 'get_count_of_fields_values_repaired', return_value={'counts': {}, 'rejected': {}}), \
+            patch.object(profiling.query, 'fetch_query_page', side_effect=fetch_query_page):
+        profiling.run_profile(['Widget__c'], store_path=store_path, top_values=0)
+        assert profiling.run_profile(['Widget__c'], store_path=store_path, top_values=0, last_populated=True) == {'done': 2}
+        with pytest.raises(ValueError, match='objectNames, approximate'):
+            profiling.run_profile(['Gadget__c'], store_path=store_path, approximate=True)
+        assert query.main(['--store', store_path, '--top-values', '3']) == 2
+        with patch.object(profiling.approximate_profile, 'profile_object', return_value={'objectName': 'Gadget__c', 'exact': True, 'fields': []}):
+            assert profiling.run_profile(['Gadget__c'], store_path=store_path, approximate=True, replan=True) == {'done': 2}
+
+def test_main_parses_arguments(tmp_path):
+    with patch('salesforce.api.profiling.run_profile', return_value={'done': 2}) as run_profile:
+        assert query.main(['Account', '--store', str(tmp_path / 's.sqlite'), '--output', 'out.csv', '--concurrency', '2']) == 0
+    assert run_profile.call_args.kwargs['object_names'] == ['Account']
+    assert run_profile.call_args.kwargs['concurrency'] == 2
+    assert run_profile.call_args.kwargs['approximate'] is None and run_profile.call_args.kwargs['last_populated'] is None
+
+def test_parquet_output_without_pyarrow_fails_before_querying(tmp_path):
+    with patch('salesforce.api.columnar.pyarrow', None), \
+            patch('salesforce.api.profiling.get_custom_object_api_names') as get_custom_object_api_names:
+        assert query.main(['--store', str(tmp_path / 's.sqlite'), '--output', str(tmp_path / 'out.parquet')]) == 2
+    assert get_custom_object_api_names.call_count == 0
+    assert not (tmp_path / 's.sqlite').exists()
+
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
@@ -0,0 +1,53 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import re
+import pytest
+from unittest.mock import patch, Mock
+import salesforce.api.query_repair as query_repair
+
+GET_WITH_SESSION_FUNCTION = 'salesforce.api.query.get_with_session'
+PREFILTER_FIELDS_FUNCTION = 'salesforce.api.query_repair.prefilter_fields'
+
+def mock_count_response(bad_fields, named=True):
+    def respond(path, params=None):
+        fields = re.findall(r'COUNT\((.*?)\)', params['q'])
+        bad = [field for field in fields if field in bad_fields]
+        if bad:
+            message = f"field {bad[0]} does not support aggregate operator COUNT" if named else 'Invalid aggregate'
+            return Mock(status_code=400, json=Mock(return_value=[{'errorCode': 'MALFORMED_QUERY', 'message': message}]))
+        record = {f'expr{index}': len(field) for index, field in enumerate(fields)}
+        return Mock(status_code=200, json=Mock(return_value={'records': [record]}))
+    return respond
+
+@pytest.mark.parametrize('named', [True, False])
+def test_bad_fields_are_rejected_and_the_rest_counted(named):
+    fields = [f'Field{index}__c' for index in range(16)]
+    with patch(GET_WITH_SESSION_FUNCTION, side_effect=mock_count_response({'Field3__c', 'Field12__c'}, named=named)):
+        result = query_repair.get_count_of_fields_values_repaired('Account', fields, use_metadata=False)
+    assert set(result['rejected']) == {'Field3__c', 'Field12__c'}
+    assert result['counts'] == {field: len(field) for field in fields if field not in result['rejected']}
+
+def test_metadata_prefilter_skips_known_bad_fields():
+    with patch(PREFILTER_FIELDS_FUNCTION, return_value=(['Name'], {'Description': 'Field of type textarea is not aggregatable'})), patch(GET_WITH_SESSION_FUNCTION, side_effect=mock_count_response(set())) as mock_get_with_session:
+        result = query_repair.get_count_of_fields_values_repaired('Account', ['Name', 'Description'])
+    assert result == {'counts': {'Name': 4}, 'rejected': {'Description': 'Field of type textarea is not aggregatable'}}
+    assert mock_get_with_session.call_count == 1
+
+def test_non_field_errors_are_raised():
+    response = Mock(status_code=400, json=Mock(return_value=[{'errorCode': 'INVALID_TYPE', 'message': 'sObject type not supported'}]))
+    with patch(GET_WITH_SESSION_FUNCTION, return_value=response):
+        with pytest.raises(query_repair.QueryRepairError):
+            query_repair.get_count_of_fields_values_repaired('Missing__c', ['Name'], use_metadata=False)
+
+def test_non_json_error_pages_are_raised():
+    response = Mock(status_code=502, text='<html>Bad Gateway</html>', json=Mock(side_effect=ValueError('Expecting value')))
+    with patch(GET_WITH_SESSION_FUNCTION, return_value=response):
+        with pytest.raises(query_repair.QueryRepairError) as error:
+            query_repair.get_count_of_fields_values_repaired('Account', ['Name'], use_metadata=False)
+    assert (error.value.error_code, error.value.error_message) == ('502', '<html>Bad Gateway</html>')
+
+
+# Run the tests
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
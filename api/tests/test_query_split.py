@@ -0,0 +1,40 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import re
+import pytest
+from unittest.mock import patch, Mock
+import salesforce.api.query_repair as query_repair
+import salesforce.api.query_split as query_split
+
+GET_WITH_SESSION_FUNCTION = 'salesforce.api.query.get_with_session'
+FIELDS = [f'Field{index}__c' for index in range(7)]
+
+def respond(path, params=None):
+    # Counts each field as its index, so renumbered columns can be checked against the field order.
+    fields = re.findall(r'COUNT\((.*?)\)', params['q'])
+    if 'Bad__c' in fields:
+        return Mock(status_code=400, json=Mock(return_value=[{'errorCode': 'INVALID_FIELD', 'message': "No such column 'Bad__c'"}]))
+    if 'Locked__c' in fields:
+        return Mock(status_code=500, json=Mock(return_value=[{'errorCode': 'UNKNOWN_EXCEPTION', 'message': 'Server error'}]))
+    record = {f'expr{index}': int(field[len('Field'):-len('__c')]) for index, field in enumerate(fields)}
+    return Mock(status_code=200, json=Mock(return_value={'records': [record]}))
+
+def test_chunks_are_merged_in_field_order():
+    with patch(GET_WITH_SESSION_FUNCTION, side_effect=respond) as get_with_session:
+        frame = query_split.run_count_of_fields_values('Account', FIELDS, max_aggregate_functions=3)
+    assert get_with_session.call_count == 3
+    assert list(frame.columns) == [f'expr{index}' for index in range(7)]
+    assert frame.iloc[0].tolist() == list(range(7))
+
+@pytest.mark.parametrize('bad_field, error_code', [('Bad__c', 'INVALID_FIELD'), ('Locked__c', 'UNKNOWN_EXCEPTION')])
+def test_failed_chunks_are_raised(bad_field, error_code):
+    with patch(GET_WITH_SESSION_FUNCTION, side_effect=respond):
+        with pytest.raises(query_repair.QueryRepairError) as error:
+            query_split.run_count_of_fields_values('Account', FIELDS[:4] + [bad_field] + FIELDS[4:], max_aggregate_functions=3)
+    assert error.value.error_code == error_code
+
+
+# Run the tests
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
@@ -0,0 +1,43 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import pytest
+from unittest.mock import patch, Mock
+import salesforce.api.request_response as request_response
+from salesforce.api.request_response import ParsedResponse
+
+DECODE_JSON_FUNCTION = 'salesforce.api.request_response.decode_json'
+
+def mock_response(status_code, body):
+    content = json.dumps(body).encode('utf-8')
+    return Mock(status_code=status_code, content=content, text=content.decode('utf-8'))
+
+def test_body_is_decoded_once():
+    response = mock_response(200, {'totalSize': 1, 'done': True, 'records': [{'Id': '001A'}]})
+    with patch(DECODE_JSON_FUNCTION, wraps=request_response.decode_json) as mock_decode_json:
+        dto = ParsedResponse(response, 'SELECT Id FROM Account').export_dto()
+        assert mock_decode_json.call_count == 1
+    assert dto['records']['records'] == [{'Id': '001A'}]
+    assert dto['statusCode'] == 200
+    assert dto['hasError'] is False
+    assert dto['responseText'] == ''
+
+def test_error_body_is_exposed():
+    response = mock_response(400, [{'message': "No such column 'Foo'", 'errorCode': 'INVALID_FIELD'}])
+    parsed = ParsedResponse(response, 'SELECT Foo FROM Account', keep_text=True)
+    assert parsed.error_code == 'INVALID_FIELD'
+    assert parsed.error_message == "No such column 'Foo'"
+    assert parsed.has_errors()
+    assert 'INVALID_FIELD' in parsed.response_text
+
+def test_summary_does_not_include_payload():
+    response = mock_response(200, {'totalSize': 2, 'done': True, 'records': [{'Id': '001A', 'Name': 'Acme'}, {'Id': '001B', 'Name': 'Globex'}]})
+    summary = request_response.summarize_response_dto(ParsedResponse(response, 'SELECT Id, Name FROM Account').export_dto())
+    assert summary.startswith('status=200 records=2 bytes=')
+    assert 'Acme' not in summary
+
+
+# Run the tests
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
@@ -0,0 +1,95 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+import time
+import pytest
+import requests
+from unittest.mock import Mock, patch
+import salesforce.api.result_cache as result_cache
+
+def test_key_ignores_whitespace_but_not_literals():
+    key = result_cache.make_cache_key('SELECT Id\n  FROM Account', user='user')
+    assert key == result_cache.make_cache_key(' SELECT Id FROM Account ', user='user')
+    assert key != result_cache.make_cache_key('SELECT Id FROM Account', tooling=True, user='user')
+    assert result_cache.normalize_soql("SELECT Id  FROM Account WHERE Name = 'A  B'") == "SELECT Id FROM Account WHERE Name = 'A  B'"
+
+def test_concurrent_misses_share_one_fetch():
+    cache = result_cache.ResultCache()
+    release = threading.Event()
+    fetch = Mock(side_effect=lambda: release.wait() and [{'Id': '001A'}])
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_fetch('key', fetch))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert fetch.call_count == 1
+    assert results == [[{'Id': '001A'}]] * 5
+
+def test_expired_entries_are_fetched_again():
+    cache = result_cache.ResultCache()
+    fetch = Mock(return_value=[])
+    cache.get_or_fetch('key', fetch, ttl=0)
+    cache.get_or_fetch('key', fetch, ttl=0)
+    assert fetch.call_count == 2
+
+def test_lru_and_disk_tiers(tmp_path):
+    cache = result_cache.ResultCache(max_entries=1, cache_dir=str(tmp_path))
+    cache.put('first', [1])
+    cache.put('second', [2])
+    assert cache.get_stats()['entries'] == 1
+    assert cache.get_or_fetch('first', Mock(side_effect=AssertionError)) == [1]
+
+def test_disk_tier_is_size_bounded(tmp_path):
+    cache = result_cache.ResultCache(cache_dir=str(tmp_path), max_disk_bytes=150)
+    for index in range(5):
+        cache.put(f'key{index}', ['x' * 50])
+        time.sleep(0.01)
+    assert len(os.listdir(tmp_path)) < 5
+    assert os.path.exists(tmp_path / 'key4.json')
+
+def test_disk_size_is_tracked_without_listing_the_directory(tmp_path):
+    cache = result_cache.ResultCache(cache_dir=str(tmp_path), max_disk_bytes=250)
+    cache.put('old', ['x' * 50])
+    reopened = result_cache.ResultCache(cache_dir=str(tmp_path), max_disk_bytes=250)
+    assert reopened.get_stats()['diskBytes'] == os.path.getsize(tmp_path / 'old.json')
+    with patch.object(result_cache.os, 'listdir', side_effect=AssertionError):
+        reopened.put('new', ['y' * 50])
+        reopened.put('newer', ['z' * 50])
+        reopened.invalidate('newer')
+    assert sorted(os.listdir(tmp_path)) == ['new.json']
+    assert reopened.get_stats()['diskBytes'] == os.path.getsize(tmp_path / 'new.json')
+
+def test_cached_queries_go_through_the_shared_cache():
+    previous = result_cache.set_result_cache(result_cache.ResultCache())
+    try:
+        with patch.object(result_cache, 'make_cache_key', return_value='key'), \
+                patch.object(result_cache.query, 'iter_query_pages', return_value=iter([[{'Id': '001A'}]])) as iter_query_pages:
+            first = result_cache.query.run_query_using_requests('SELECT Id FROM Account', cached=True)
+            second = list(result_cache.query.iter_query('SELECT Id FROM Account', cached=True))
+    finally:
+        result_cache.set_result_cache(previous)
+    assert iter_query_pages.call_count == 1
+    assert first['records']['records'] == second == [{'Id': '001A'}]
+
+def test_cached_query_errors_come_back_as_error_dtos():
+    response = requests.Response()
+    response.status_code = 400
+    response._content = b'[{"message": "unexpected token: FORM", "errorCode": "MALFORMED_QUERY"}]'
+    previous = result_cache.set_result_cache(result_cache.ResultCache())
+    try:
+        with patch.object(result_cache, 'make_cache_key', return_value='key'), \
+                patch.object(result_cache.query, 'get_with_session', return_value=response):
+            dto = result_cache.query.run_query_using_requests('SELECT Id FORM Account', cached=True)
+    finally:
+        result_cache.set_result_cache(previous)
+    assert dto['hasError'] and (dto['statusCode'], dto['errorCode']) == (400, 'MALFORMED_QUERY')
+    assert dto['queryString'] == 'SELECT Id FORM Account'
+
+
+# Run the tests
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
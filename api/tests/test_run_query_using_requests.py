@@ -9,7 +9,7 @@ import salesforce.api.query as query
 
 AUTHENTICATE_API_FUNCTION = 'query.authenticate.authenticate_api'
 EXTRACT_FIELDS_FUNCTION = 'query.format.extract_fields_from_query_string' 
-REQUESTS_GET_FUNCTION = 'salesforce.api.query.requests.get'
+TRANSPORT_GET_FUNCTION = 'salesforce.api.query.transport.get'
 PARSEDRESPONSE_EXPORT_DTO = 'query.ParsedResponse.export_dto'
 
 def mock_setup(mock_authenticate_api, mock_extract_fields, mock_get, mock_parsedresponse, return_value, hasErrors=True):
@@ -27,7 +27,7 @@ def mock_setup(mock_authenticate_api, mock_extract_fields, mock_get, mock_parsed
             }
 
 def test_invalid_type_response():
-    with  patch(AUTHENTICATE_API_FUNCTION) as mock_authenticate_api, patch(EXTRACT_FIELDS_FUNCTION) as mock_extract_fields, patch(REQUESTS_GET_FUNCTION) as mock_get, patch(PARSEDRESPONSE_EXPORT_DTO) as mock_parsedresponse:
+    with  patch(AUTHENTICATE_API_FUNCTION) as mock_authenticate_api, patch(EXTRACT_FIELDS_FUNCTION) as mock_extract_fields, patch(TRANSPORT_GET_FUNCTION) as mock_get, patch(PARSEDRESPONSE_EXPORT_DTO) as mock_parsedresponse:
         records = {}
         status_code = 400
         error_type = 'INVALID_TYPE'
@@ -40,7 +40,7 @@ def test_invalid_type_response():
 
 # Test for Invalid field
 def test_invalid_field_response():
-    with  patch(AUTHENTICATE_API_FUNCTION) as mock_authenticate_api, patch(EXTRACT_FIELDS_FUNCTION) as mock_extract_fields, patch(REQUESTS_GET_FUNCTION) as mock_get, patch(PARSEDRESPONSE_EXPORT_DTO) as mock_parsedresponse:
+    with  patch(AUTHENTICATE_API_FUNCTION) as mock_authenticate_api, patch(EXTRACT_FIELDS_FUNCTION) as mock_extract_fields, patch(TRANSPORT_GET_FUNCTION) as mock_get, patch(PARSEDRESPONSE_EXPORT_DTO) as mock_parsedresponse:
         records = {}
         status_code = 400
         error_type = 'INVALID_FIELD'
@@ -53,7 +53,7 @@ def test_invalid_field_response():
 
 # Test for Malformed query
 def test_malformed_query_response():
-    with  patch(AUTHENTICATE_API_FUNCTION) as mock_authenticate_api, patch(EXTRACT_FIELDS_FUNCTION) as mock_extract_fields, patch(REQUESTS_GET_FUNCTION) as mock_get, patch(PARSEDRESPONSE_EXPORT_DTO) as mock_parsedresponse:
+    with  patch(AUTHENTICATE_API_FUNCTION) as mock_authenticate_api, patch(EXTRACT_FIELDS_FUNCTION) as mock_extract_fields, patch(TRANSPORT_GET_FUNCTION) as mock_get, patch(PARSEDRESPONSE_EXPORT_DTO) as mock_parsedresponse:
         records = {}
         status_code = 400
         error_type = 'MALFORMED_QUERY'
@@ -66,7 +66,7 @@ def test_malformed_query_response():
 
 # Test for none of the above
 def test_unhandled_response_error():
-    with  patch(AUTHENTICATE_API_FUNCTION) as mock_authenticate_api, patch(EXTRACT_FIELDS_FUNCTION) as mock_extract_fields, patch(REQUESTS_GET_FUNCTION) as mock_get, patch(PARSEDRESPONSE_EXPORT_DTO) as mock_parsedresponse:
+    with  patch(AUTHENTICATE_API_FUNCTION) as mock_authenticate_api, patch(EXTRACT_FIELDS_FUNCTION) as mock_extract_fields, patch(TRANSPORT_GET_FUNCTION) as mock_get, patch(PARSEDRESPONSE_EXPORT_DTO) as mock_parsedresponse:
         records = {}
         status_code = 400
         error_type = ''
@@ -79,7 +79,7 @@ def test_unhandled_response_error():
 
 # Test for Success
 def test_success_response():
-    with  patch(AUTHENTICATE_API_FUNCTION) as mock_authenticate_api, patch(EXTRACT_FIELDS_FUNCTION) as mock_extract_fields, patch(REQUESTS_GET_FUNCTION) as mock_get, patch(PARSEDRESPONSE_EXPORT_DTO) as mock_parsedresponse:
+    with  patch(AUTHENTICATE_API_FUNCTION) as mock_authenticate_api, patch(EXTRACT_FIELDS_FUNCTION) as mock_extract_fields, patch(TRANSPORT_GET_FUNCTION) as mock_get, patch(PARSEDRESPONSE_EXPORT_DTO) as mock_parsedresponse:
         records = {'records': [{'id': '1', 'field1': 'value1', 'field2': 'value2'}]}
         status_code = 200
         error_type = ''
@@ -0,0 +1,39 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import random
+import pytest
+import salesforce.api.sketches as sketches
+
+def test_hyperloglog_is_within_its_error():
+    hll = sketches.HyperLogLog()
+    for value in range(50000):
+        hll.add(f'value-{value}')
+        hll.add(f'value-{value}')
+    assert abs(hll.count() - 50000) / 50000 < 3 * hll.relative_error()
+
+def test_hyperloglog_is_exact_enough_for_few_values():
+    hll = sketches.HyperLogLog()
+    for value in ['a', 'b', 'c', 'a']:
+        hll.add(value)
+    assert round(hll.count()) == 3
+
+def test_count_min_never_undercounts_and_finds_heavy_hitters():
+    sketch = sketches.CountMinSketch(top_k=2)
+    rng = random.Random(1)
+    values = ['common'] * 3000 + ['second'] * 1000 + [f'rare-{rng.random()}' for _ in range(6000)]
+    rng.shuffle(values)
+    for value in values:
+        sketch.add(value)
+    assert [value for value, _ in sketch.get_top()] == ['common', 'second']
+    assert 3000 <= sketch.estimate('common') <= 3000 + sketch.error_bound()
+
+def test_intervals_contain_the_estimate():
+    share, lower, upper = sketches.wilson_interval(30, 100)
+    assert lower < share == 0.3 < upper
+    share, lower, upper = sketches.cluster_ratio_interval([0, 10, 0, 10], [10, 10, 10, 10])
+    assert share == 0.5
+    assert upper - lower > sketches.wilson_interval(20, 40)[2] - sketches.wilson_interval(20, 40)[1]
+
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
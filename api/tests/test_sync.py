@@ -0,0 +1,70 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from unittest.mock import patch
+import salesforce.api.sync as sync
+
+FETCH_QUERY_PAGE_FUNCTION = 'salesforce.api.query.fetch_query_page'
+
+def record(record_id, modstamp, name, is_deleted=False):
+    return {'attributes': {'type': 'Account'}, 'Id': record_id, 'SystemModstamp': modstamp, 'IsDeleted': is_deleted, 'Name': name}
+
+FULL_PAGES = {
+        None: {'records': [record('001A', '2024-01-01T00:00:00.000+0000', 'Acme')], 'nextRecordsUrl': '/next/1'},
+        '/next/1': {'records': [record('001B', '2024-01-02T00:00:00.000+0000', 'Globex')]},
+        }
+
+def fetch_from(pages, calls):
+    def fetch(path, params=None):
+        calls.append((path, params))
+        return pages[None if params else path]
+    return fetch
+
+def test_full_then_incremental_sync(tmp_path):
+    store_path = str(tmp_path / 'store.sqlite')
+    calls = []
+    with patch(FETCH_QUERY_PAGE_FUNCTION, side_effect=fetch_from(FULL_PAGES, calls)):
+        result = sync.sync_object('Account', ['Name'], store_path)
+    assert result['mode'] == 'full' and result['upserted'] == 2
+    assert result['highWaterMark'] == '2024-01-02T00:00:00Z'
+
+    incremental_pages = {None: {'records': [record('001A', '2024-01-03T00:00:00.000+0000', '', is_deleted=True),
+                                            record('001C', '2024-01-03T00:00:00.000+0000', 'Initech')]}}
+    calls = []
+    with patch(FETCH_QUERY_PAGE_FUNCTION, side_effect=fetch_from(incremental_pages, calls)):
+        result = sync.sync_object('Account', ['Name'], store_path)
+    assert result == {'objectName': 'Account', 'mode': 'incremental', 'upserted': 1, 'deleted': 1, 'highWaterMark': '2024-01-03T00:00:00Z'}
+    assert calls[0][0].endswith('/queryAll')
+    assert 'SystemModstamp >= 2024-01-02T00:00:00Z' in calls[0][1]['q']
+
+    store = sync.SyncStore(store_path)
+    assert store.count_rows('Account') == 2
+    store.close()
+
+def test_crashed_sync_resumes_from_last_committed_page(tmp_path):
+    store_path = str(tmp_path / 'store.sqlite')
+    calls = []
+
+    def crash_on_second_page(path, params=None):
+        if path == '/next/1':
+            raise ConnectionError('network dropped')
+        return fetch_from(FULL_PAGES, calls)(path, params)
+
+    with patch(FETCH_QUERY_PAGE_FUNCTION, side_effect=crash_on_second_page):
+        with pytest.raises(ConnectionError):
+            sync.sync_object('Account', ['Name'], store_path)
+
+    with patch(FETCH_QUERY_PAGE_FUNCTION, side_effect=fetch_from(FULL_PAGES, calls)):
+        result = sync.sync_object('Account', ['Name'], store_path)
+    assert calls[-1] == ('/next/1', None)
+    assert result['mode'] == 'full' and result['upserted'] == 1
+
+    store = sync.SyncStore(store_path)
+    assert store.count_rows('Account') == 2
+    store.close()
+
+
+# Run the tests
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
@@ -0,0 +1,88 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import pytest
+from unittest.mock import Mock, patch
+import salesforce.api.query as query
+import salesforce.api.tracing as tracing
+from salesforce.api.request_response import ParsedResponse
+
+@pytest.fixture
+def collector():
+    collector = tracing.add_hook(tracing.SpanCollector())
+    yield collector
+    tracing.remove_hook(collector)
+
+def test_spans_are_free_without_hooks():
+    tracing.clear_hooks()
+    with tracing.span('request', path='/x') as span:
+        span.set(records=1)
+    assert span is tracing.NULL_SPAN
+
+def test_nested_spans_record_parent_and_error(collector):
+    with pytest.raises(ValueError):
+        with tracing.span('outer') as outer:
+            with tracing.span('inner', records=3):
+                pass
+            raise ValueError('boom')
+    inner, = collector.get_spans('inner')
+    outer_span, = collector.get_spans('outer')
+    assert inner['parentId'] == outer.span_id
+    assert inner['traceId'] == outer_span['traceId']
+    assert outer_span['error'] == 'ValueError: boom'
+    assert collector.summarize()['inner']['records'] == 3
+
+def test_query_page_spans(collector):
+    response = Mock(status_code=200, content=b'{"records": [{"Id": "1"}, {"Id": "2"}], "done": true}', headers={'Content-Length': '52'})
+    with patch.object(query, 'get_session_manager') as get_session_manager, \
+            patch('salesforce.api.query.transport.get', return_value=response):
+        get_session_manager.return_value.get_session.return_value = ('session', 'https://example.my.salesforce.com/services/Soap')
+        records = list(query.iter_query('SELECT Id FROM Account'))
+    assert len(records) == 2
+    page, = collector.get_spans('query_page')
+    decode, = collector.get_spans('decode_json')
+    request, = collector.get_spans('request')
+    assert page['attributes']['records'] == 2
+    assert decode['attributes']['bytes'] == 52
+    assert request['parentId'] == page['spanId'] and decode['parentId'] == page['spanId']
+    assert request['attributes']['statusCode'] == 200
+
+def test_prefetched_pages_keep_the_caller_span(collector):
+    pages = {'/next': {'records': [{'Id': '2'}]}}
+    first_page = {'records': [{'Id': '1'}], 'nextRecordsUrl': '/next'}
+    with patch.object(query, 'get_with_session', side_effect=lambda path, params=None: Mock(content=json.dumps(pages[path]).encode(), headers={})):
+        with tracing.span('export') as export:
+            records = [record for records in query.iter_pages(first_page) for record in records]
+    assert records == [{'Id': '1'}, {'Id': '2'}]
+    page, = collector.get_spans('query_page')
+    assert page['parentId'] == export.span_id and page['traceId'] == export.trace_id
+
+def test_parsed_response_decode_span(collector):
+    response = Mock(status_code=200, content=b'{"records": [{"Id": "1"}]}', headers={})
+    ParsedResponse(response, 'SELECT Id FROM Account').export_dto()
+    decode, = collector.get_spans('decode_json')
+    assert decode['attributes']['records'] == 1
+
+def test_json_lines_exporter(tmp_path):
+    exporter = tracing.add_hook(tracing.JsonLinesExporter(str(tmp_path / 'trace.jsonl')))
+    try:
+        with tracing.span('repair_query', errorType='is_invalid'):
+            pass
+    finally:
+        tracing.remove_hook(exporter)
+        exporter.close()
+    span, = [json.loads(line) for line in (tmp_path / 'trace.jsonl').read_text().splitlines()]
+    assert span['name'] == 'repair_query' and span['attributes'] == {'errorType': 'is_invalid'}
+
+def test_failing_hook_does_not_break_callers(collector):
+    broken = tracing.add_hook(Mock(side_effect=RuntimeError('exporter down')))
+    try:
+        with tracing.span('login'):
+            pass
+    finally:
+        tracing.remove_hook(broken)
+    assert len(collector.get_spans('login')) == 1
+
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
@@ -0,0 +1,33 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from unittest.mock import Mock
+import salesforce.api.transport as transport
+
+def test_http_session_requests_gzip_and_pools_connections():
+    session = transport.create_http_session(pool_size=4, retries=2)
+    adapter = session.get_adapter('https://example.my.salesforce.com')
+    assert session.headers['Accept-Encoding'] == 'gzip'
+    assert adapter._pool_maxsize == 4
+    assert adapter.max_retries.total == 2
+
+def test_default_timeout_is_applied():
+    session = Mock()
+    stub = transport.Transport(connect_timeout=1, read_timeout=2, session=session)
+    stub.get('https://example.my.salesforce.com', params={'q': 'SELECT Id FROM Account'})
+    session.request.assert_called_once_with('GET', 'https://example.my.salesforce.com', params={'q': 'SELECT Id FROM Account'}, timeout=(1, 2))
+
+def test_set_transport_swaps_shared_instance():
+    stub = transport.Transport(session=Mock())
+    previous = transport.set_transport(stub)
+    try:
+        transport.post('https://login.salesforce.com', data='')
+        stub.session.request.assert_called_once()
+    finally:
+        transport.set_transport(previous)
+
+
+# Run the tests
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
@@ -0,0 +1,224 @@
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+
+TRACE_FILE_VARIABLE = 'SALESFORCE_TRACE_FILE'
+
+_hooks = []
+_hooks_lock = threading.Lock()
+_environment_checked = False
+_span_ids = itertools.count(1)
+_current_span = contextvars.ContextVar('salesforce_current_span', default=None)
+
+
+class Span:
+    # One timed phase (login, request, decode, ...). Spans opened inside another span on the same
+    # thread or task record it as their parent, and every span carries the id of its root span.
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.span_id = next(_span_ids)
+        self.parent_id = None
+        self.trace_id = self.span_id
+        self.start_time = None
+        self.duration = None
+        self.error = None
+        self._start = None
+        self._token = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    def increment(self, name, amount=1):
+        self.attributes[name] = self.attributes.get(name, 0) + amount
+        return self
+
+    def __enter__(self):
+        parent = _current_span.get()
+        if parent is not None:
+            self.parent_id = parent.span_id
+            self.trace_id = parent.trace_id
+        self._token = _current_span.set(self)
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.duration = time.perf_counter() - self._start
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc_value}"
+        emit(self.to_dict())
+        return False
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'parentId': self.parent_id,
+            'startTime': self.start_time,
+            'durationMs': round(self.duration * 1000, 3),
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+
+class NullSpan:
+    # Returned while no hook is registered, so instrumented code pays for one list check per span.
+    def set(self, **attributes):
+        return self
+
+    def increment(self, name, amount=1):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class SpanCollector:
+    # Keeps finished spans in memory, e.g. to print where a slow profiling job spent its time.
+    def __init__(self, max_spans=None):
+        self.max_spans = max_spans
+        self._spans = []
+        self._lock = threading.Lock()
+
+    def __call__(self, span):
+        with self._lock:
+            if self.max_spans is None or len(self._spans) < self.max_spans:
+                self._spans.append(span)
+
+    def get_spans(self, name=None):
+        with self._lock:
+            return [span for span in self._spans if name is None or span['name'] == name]
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+    def summarize(self):
+        # Totals per span name: count, total and slowest duration, and the sum of numeric attributes.
+        summary = {}
+        for span in self.get_spans():
+            totals = summary.setdefault(span['name'], {'count': 0, 'totalMs': 0, 'maxMs': 0, 'errors': 0})
+            totals['count'] += 1
+            totals['totalMs'] = round(totals['totalMs'] + span['durationMs'], 3)
+            totals['maxMs'] = max(totals['maxMs'], span['durationMs'])
+            totals['errors'] += span['error'] is not None
+            for key, value in span['attributes'].items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    totals[key] = totals.get(key, 0) + value
+                elif isinstance(value, bool):
+                    totals[key] = totals.get(key, 0) + int(value)
+        return summary
+
+
+class JsonLinesExporter:
+    # Appends one JSON object per finished span; the file is opened on the first span.
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def __call__(self, span):
+        line = json.dumps(span, default=str) + '\n'
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class OpenTelemetryExporter:
+    # Replays finished spans into an OpenTelemetry tracer with their original start and end times.
+    # The span hierarchy is kept as attributes because the spans are created after the fact.
+    def __init__(self, tracer=None):
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            raise ImportError("opentelemetry-api is required to export spans to OpenTelemetry")
+        self.tracer = tracer or trace.get_tracer('salesforce.api')
+
+    def __call__(self, span):
+        start_ns = int(span['startTime'] * 1e9)
+        otel_span = self.tracer.start_span(span['name'], start_time=start_ns)
+        otel_span.set_attribute('salesforce.trace_id', span['traceId'])
+        otel_span.set_attribute('salesforce.span_id', span['spanId'])
+        if span['parentId'] is not None:
+            otel_span.set_attribute('salesforce.parent_id', span['parentId'])
+        for key, value in span['attributes'].items():
+            if isinstance(value, (bool, int, float, str)):
+                otel_span.set_attribute(key, value)
+        if span['error']:
+            otel_span.set_attribute('error', span['error'])
+        otel_span.end(end_time=start_ns + int(span['durationMs'] * 1e6))
+
+
+def span(name, **attributes):
+    if not _hooks and (_environment_checked or not configure_from_environment()):
+        return NULL_SPAN
+    return Span(name, attributes)
+
+def is_enabled():
+    return bool(_hooks)
+
+def add_hook(hook):
+    # A hook is any callable taking the finished span as a dict.
+    global _hooks
+    with _hooks_lock:
+        # The list is replaced rather than appended to so emit() can iterate it without the lock.
+        _hooks = _hooks + [hook]
+    return hook
+
+def remove_hook(hook):
+    global _hooks
+    with _hooks_lock:
+        _hooks = [registered for registered in _hooks if registered is not hook]
+
+def clear_hooks():
+    global _hooks
+    with _hooks_lock:
+        _hooks = []
+
+def emit(span_dict):
+    for hook in _hooks:
+        try:
+            hook(span_dict)
+        except Exception:
+            # A broken exporter must never fail the request it is observing.
+            pass
+
+def configure_from_environment():
+    # SALESFORCE_TRACE_FILE turns on JSON lines export without code changes. Checked once.
+    global _environment_checked
+    with _hooks_lock:
+        if _environment_checked:
+            return bool(_hooks)
+        _environment_checked = True
+    path = os.environ.get(TRACE_FILE_VARIABLE)
+    if path:
+        add_hook(JsonLinesExporter(path))
+    return bool(_hooks)
+
+def get_content_length(response):
+    # Bytes on the wire as reported by the server; reading .content here would defeat streaming.
+    try:
+        return int(response.headers.get('Content-Length') or 0)
+    except (AttributeError, TypeError, ValueError):
+        return 0
@@ -0,0 +1,113 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import salesforce.api.limits as limits
+import salesforce.api.tracing as tracing
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 120
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+# 429/503 are left to the limit governor, which backs off across all threads rather than per request.
+RETRY_STATUS_CODES = (500, 502, 504)
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+class Transport:
+    # One pooled keep-alive requests.Session shared by every REST and SOAP call, so
+    # consecutive queries reuse the TCP/TLS connection instead of opening a new one.
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, retries=DEFAULT_RETRIES,
+                 backoff_factor=DEFAULT_BACKOFF_FACTOR, session=None, governor=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_size = pool_size
+        self.session = session if session is not None else create_http_session(pool_size, retries, backoff_factor)
+        self.governor = governor
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        with tracing.span('http', method=method, url=url.split('?')[0]) as span:
+            response = self._send(method, url, span, **kwargs)
+            span.set(statusCode=response.status_code, bytes=tracing.get_content_length(response))
+            return response
+
+    def _send(self, method, url, span, **kwargs):
+        if self.governor is None:
+            return self.session.request(method, url, **kwargs)
+
+        attempt = 0
+        while True:
+            self.governor.acquire()
+            response = None
+            try:
+                response = self.session.request(method, url, **kwargs)
+            finally:
+                self.governor.release(response)
+            if not self.governor.should_retry(response, attempt):
+                return response
+            attempt += 1
+            span.set(retries=attempt)
+            response.close()
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('PATCH', url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def create_http_session(pool_size=DEFAULT_POOL_SIZE, retries=DEFAULT_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR):
+    retry = Retry(total=retries,
+                  backoff_factor=backoff_factor,
+                  status_forcelist=RETRY_STATUS_CODES,
+                  respect_retry_after_header=True,
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Accept-Encoding': 'gzip',
+                            'Connection': 'keep-alive'})
+    return session
+
+def get_transport():
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = Transport(governor=limits.get_governor())
+        return _transport
+
+def set_transport(transport):
+    # Swaps the shared transport (e.g. for a stub in tests) and returns the previous one.
+    global _transport
+    with _transport_lock:
+        previous, _transport = _transport, transport
+    return previous
+
+def configure_transport(**kwargs):
+    kwargs.setdefault('governor', limits.get_governor())
+    previous = set_transport(Transport(**kwargs))
+    if previous is not None:
+        previous.close()
+
+def get(url, **kwargs):
+    return get_transport().get(url, **kwargs)
+
+def post(url, **kwargs):
+    return get_transport().post(url, **kwargs)
+
+def patch(url, **kwargs):
+    return get_transport().patch(url, **kwargs)
@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Add the directory above the package to the sys.path so this runs as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import salesforce.api.async_query as async_query
+import salesforce.api.authenticate as authenticate
+import salesforce.api.limits as limits
+import salesforce.api.metadata_cache as metadata_cache
+import salesforce.api.query as query
+import salesforce.api.transport as transport
+from salesforce.benchmarks.stub_server import StubOrg, StubServer
+
+# Outside the repository, so runs don't leave an untracked file in the working tree.
+DEFAULT_RESULTS_FILE = os.path.join(tempfile.gettempdir(), 'salesforce_benchmarks', 'results.jsonl')
+DEFAULT_REGRESSION_THRESHOLD = 0.2
+OBJECT_NAME = 'Account'
+
+
+def get_benchmarks(org):
+    # Each benchmark returns the number of records it read, so throughput is comparable across them.
+    field_names = ', '.join(org.get_field_names())
+    query_string = f'SELECT {field_names} FROM {OBJECT_NAME}'
+    invalid_query_string = f'SELECT Id, Invalid__c FROM {OBJECT_NAME}'
+
+    def login():
+        create_session_manager().get_session()
+        return 0
+
+    def run_query_using_requests():
+        return count_dto_records(query.run_query_using_requests(query_string))
+
+    def iter_query():
+        return sum(1 for _ in query.iter_query(query_string))
+
+    def iter_query_without_prefetch():
+        return sum(1 for _ in query.iter_query(query_string, prefetch=False))
+
+    def query_tooling_api():
+        return len(query.query_tooling_api(query_string) or [])
+
+    def run_queries_concurrently():
+        results = async_query.run_queries([query_string] * 8, concurrency=4)
+        return sum(len(result['records']) for result in results)
+
+    def describe():
+        return len(metadata_cache.MetadataCache().get_describe(OBJECT_NAME)['fields'])
+
+    def error_response():
+        return count_dto_records(query.run_query_using_requests(invalid_query_string))
+
+    return {
+        'login': login,
+        'run_query_using_requests': run_query_using_requests,
+        'iter_query': iter_query,
+        'iter_query_without_prefetch': iter_query_without_prefetch,
+        'query_tooling_api': query_tooling_api,
+        'run_queries_concurrently': run_queries_concurrently,
+        'describe': describe,
+        'error_response': error_response
+    }
+
+def count_dto_records(parsed_response_dto):
+    # The dto's 'records' is the response body: the query page on success, a list of errors otherwise.
+    body = parsed_response_dto.get('records')
+    return len(body.get('records', [])) if isinstance(body, dict) else 0
+
+def create_session_manager():
+    return authenticate.SessionManager('benchmark@example.com', 'password', 'token', session_seconds=60 * 60)
+
+def run_benchmark(name, function, org, iterations):
+    function()  # Warm up the connection pool, the login and any caches before measuring.
+
+    durations = []
+    records = 0
+    requests_before = org.get_total_requests()
+    bytes_before = org.bytes_sent
+    for _ in range(iterations):
+        start = time.perf_counter()
+        records += function()
+        durations.append(time.perf_counter() - start)
+    requests_sent = org.get_total_requests() - requests_before
+    bytes_received = org.bytes_sent - bytes_before
+
+    # Memory is measured in a separate run because tracemalloc slows every allocation down.
+    tracemalloc.start()
+    try:
+        function()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    total_seconds = sum(durations)
+    return {
+        'name': name,
+        'iterations': iterations,
+        'meanMs': round(statistics.mean(durations) * 1000, 3),
+        'p50Ms': round(get_percentile(durations, 50) * 1000, 3),
+        'p99Ms': round(get_percentile(durations, 99) * 1000, 3),
+        'recordsPerSecond': round(records / total_seconds, 1) if total_seconds and records else 0,
+        'requestsPerCall': round(requests_sent / iterations, 2),
+        'bytesPerCall': round(bytes_received / iterations),
+        'peakMemoryBytes': peak_memory
+    }
+
+def get_percentile(values, percentile):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percentile / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def run_benchmarks(org, iterations, names=None):
+    with StubServer(org) as server:
+        previous_login_url = os.environ.get(authenticate.LOGIN_URL_VARIABLE)
+        os.environ[authenticate.LOGIN_URL_VARIABLE] = server.url
+        previous_manager = query.set_session_manager(create_session_manager())
+        previous_transport = transport.set_transport(transport.Transport(governor=limits.get_governor()))
+        try:
+            benchmarks = get_benchmarks(org)
+            return [run_benchmark(name, function, org, iterations)
+                    for name, function in benchmarks.items() if not names or name in names]
+        finally:
+            query.set_session_manager(previous_manager)
+            transport.set_transport(previous_transport).close()
+            if previous_login_url is None:
+                os.environ.pop(authenticate.LOGIN_URL_VARIABLE, None)
+            else:
+                os.environ[authenticate.LOGIN_URL_VARIABLE] = previous_login_url
+
+def get_config(org, iterations):
+    return {
+        'totalRecords': org.total_records,
+        'pageSize': org.page_size,
+        'recordWidth': org.record_width,
+        'latency': org.latency,
+        'iterations': iterations
+    }
+
+def load_previous_run(results_file, config):
+    # The most recent run with the same configuration is the baseline.
+    if not os.path.exists(results_file):
+        return None
+    previous = None
+    with open(results_file, 'r', encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                run = json.loads(line)
+                if run['config'] == config:
+                    previous = run
+    return previous
+
+def save_run(results_file, run):
+    os.makedirs(os.path.dirname(os.path.abspath(results_file)), exist_ok=True)
+    with open(results_file, 'a', encoding='utf-8') as file:
+        file.write(json.dumps(run) + '\n')
+
+def find_regressions(results, previous_run, threshold=DEFAULT_REGRESSION_THRESHOLD):
+    if previous_run is None:
+        return []
+    previous_results = {result['name']: result for result in previous_run['results']}
+    regressions = []
+    for result in results:
+        previous = previous_results.get(result['name'])
+        if previous is None:
+            continue
+        for metric in ('p50Ms', 'peakMemoryBytes', 'requestsPerCall'):
+            if previous[metric] and result[metric] > previous[metric] * (1 + threshold):
+                regressions.append({'name': result['name'], 'metric': metric, 'previous': previous[metric], 'current': result[metric]})
+    return regressions
+
+def print_results(results, regressions):
+    regressed = {(regression['name'], regression['metric']) for regression in regressions}
+    print(f"{'benchmark':<30}{'p50 ms':>10}{'p99 ms':>10}{'records/s':>12}{'requests':>10}{'peak KiB':>10}")
+    for result in results:
+        flags = [metric for name, metric in regressed if name == result['name']]
+        print(f"{result['name']:<30}{result['p50Ms']:>10.2f}{result['p99Ms']:>10.2f}{result['recordsPerSecond']:>12.0f}"
+              f"{result['requestsPerCall']:>10.2f}{result['peakMemoryBytes'] / 1024:>10.0f}"
+              + (f"  REGRESSION: {', '.join(flags)}" if flags else ''))
+
+def parse_arguments(arguments=None):
+    parser = argparse.ArgumentParser(description='Benchmark the query paths against a local Salesforce stub.')
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--page-size', type=int, default=2000)
+    parser.add_argument('--width', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every stub response')
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--only', nargs='*', help='names of the benchmarks to run')
+    parser.add_argument('--results-file', default=DEFAULT_RESULTS_FILE, help=f'runs are appended here and compared with the last matching one (default {DEFAULT_RESULTS_FILE})')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_REGRESSION_THRESHOLD)
+    return parser.parse_args(arguments)
+
+def main(arguments=None):
+    arguments = parse_arguments(arguments)
+    org = StubOrg(total_records=arguments.records, page_size=arguments.page_size,
+                  record_width=arguments.width, latency=arguments.latency)
+    config = get_config(org, arguments.iterations)
+
+    results = run_benchmarks(org, arguments.iterations, arguments.only)
+    regressions = find_regressions(results, load_previous_run(arguments.results_file, config), arguments.threshold)
+    save_run(arguments.results_file, {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'config': config, 'results': results})
+    print_results(results, regressions)
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,226 @@
+import gzip
+import itertools
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+API_PATH_PATTERN = re.compile(r'^/services/data/v[\d.]+/(?P<resource>.*)$')
+FROM_PATTERN = re.compile(r'\bFROM\s+(\w+)', re.IGNORECASE)
+AGGREGATE_PATTERN = re.compile(r'\b(COUNT|SUM|MIN|MAX|AVG)\(', re.IGNORECASE)
+INVALID_FIELD_PATTERN = re.compile(r'\b(\w*Invalid\w*)\b')
+
+LOGIN_RESPONSE = """<?xml version="1.0" encoding="UTF-8"?>
+<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns="urn:partner.soap.sforce.com">
+  <soapenv:Body>
+    <loginResponse>
+      <result>
+        <serverUrl>{server_url}/services/Soap/u/58.0/00DSTUB</serverUrl>
+        <sessionId>{session_id}</sessionId>
+        <userInfo><sessionSecondsValid>7200</sessionSecondsValid></userInfo>
+      </result>
+    </loginResponse>
+  </soapenv:Body>
+</soapenv:Envelope>"""
+
+
+class StubOrg:
+    # The data and behaviour the stub serves: how many rows each object has, how wide they are,
+    # how they are paged, and how long every response is delayed to stand in for network latency.
+    def __init__(self, total_records=10000, page_size=2000, record_width=20, latency=0.0, daily_limit=15000):
+        self.total_records = total_records
+        self.page_size = page_size
+        self.record_width = record_width
+        self.latency = latency
+        self.daily_limit = daily_limit
+        self.session_id = 'STUB_SESSION_ID'
+        self.request_counts = Counter()
+        self.bytes_sent = 0
+        self._cursors = {}
+        self._cursor_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def count(self, kind):
+        with self._lock:
+            self.request_counts[kind] += 1
+
+    def add_bytes_sent(self, size):
+        with self._lock:
+            self.bytes_sent += size
+
+    def get_total_requests(self):
+        with self._lock:
+            return sum(self.request_counts.values())
+
+    def get_field_names(self):
+        return ['Id'] + [f'Field{index}__c' for index in range(self.record_width)]
+
+    def create_record(self, object_name, index):
+        record = {'attributes': {'type': object_name, 'url': f'/services/data/v58.0/sobjects/{object_name}/{index}'},
+                  'Id': f'001{index:015d}'}
+        for field_index in range(self.record_width):
+            record[f'Field{field_index}__c'] = f'Value {index}-{field_index}'
+        return record
+
+    def get_query_page(self, object_name, offset, path_prefix):
+        end = min(offset + self.page_size, self.total_records)
+        page = {'totalSize': self.total_records,
+                'done': end >= self.total_records,
+                'records': [self.create_record(object_name, index) for index in range(offset, end)]}
+        if end < self.total_records:
+            with self._lock:
+                cursor_id = f'01gSTUB{next(self._cursor_ids)}'
+                self._cursors[cursor_id] = (object_name, end)
+            page['nextRecordsUrl'] = f'{path_prefix}/{cursor_id}-{end}'
+        return page
+
+    def run_query(self, query_string, path_prefix):
+        invalid_field = INVALID_FIELD_PATTERN.search(query_string)
+        if invalid_field:
+            return 400, [{'message': f"No such column '{invalid_field.group(1)}' on entity", 'errorCode': 'INVALID_FIELD'}]
+        match = FROM_PATTERN.search(query_string)
+        if match is None:
+            return 400, [{'message': 'unexpected token', 'errorCode': 'MALFORMED_QUERY'}]
+        object_name = match.group(1)
+        if AGGREGATE_PATTERN.search(query_string):
+            aggregates = len(AGGREGATE_PATTERN.findall(query_string))
+            record = {'attributes': {'type': 'AggregateResult'}}
+            record.update({f'expr{index}': self.total_records for index in range(aggregates)})
+            return 200, {'totalSize': 1, 'done': True, 'records': [record]}
+        return 200, self.get_query_page(object_name, 0, path_prefix)
+
+    def query_more(self, cursor):
+        cursor_id = cursor.split('-')[0]
+        with self._lock:
+            state = self._cursors.pop(cursor_id, None)
+        if state is None:
+            return 400, [{'message': 'invalid query locator', 'errorCode': 'INVALID_QUERY_LOCATOR'}]
+        object_name, offset = state
+        return 200, self.get_query_page(object_name, offset, '')
+
+    def describe(self, object_name):
+        fields = [{'name': 'Id', 'type': 'id', 'aggregatable': True}]
+        fields += [{'name': f'Field{index}__c', 'type': 'string', 'aggregatable': True} for index in range(self.record_width)]
+        return 200, {'name': object_name, 'fields': fields}
+
+    def limits(self):
+        used = self.get_total_requests()
+        return 200, {'DailyApiRequests': {'Max': self.daily_limit, 'Remaining': self.daily_limit - used}}
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; with Nagle on, every keep-alive response waits on a delayed ACK.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def org(self):
+        return self.server.org
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        path = urlsplit(self.path).path
+        if path.startswith('/services/Soap/u/'):
+            self.org.count('login')
+            server_url = f'http://{self.server.server_address[0]}:{self.server.server_address[1]}'
+            self.send_body(200, LOGIN_RESPONSE.format(server_url=server_url, session_id=self.org.session_id).encode('utf-8'), 'text/xml')
+            return
+        if path.endswith('/composite/batch'):
+            self.org.count('composite')
+            results = []
+            for sub_request in json.loads(body)['batchRequests']:
+                sub_url = urlsplit('/services/data/' + sub_request['url'])
+                status_code, result = self.route(sub_url.path, parse_qs(sub_url.query))
+                results.append({'statusCode': status_code, 'result': result})
+            self.send_json(200, {'hasErrors': any(result['statusCode'] >= 400 for result in results), 'results': results})
+            return
+        self.send_json(404, [{'message': 'not found', 'errorCode': 'NOT_FOUND'}])
+
+    def do_GET(self):
+        if self.headers.get('Authorization') != f'Bearer {self.org.session_id}':
+            self.org.count('unauthorized')
+            self.send_json(401, [{'message': 'Session expired or invalid', 'errorCode': 'INVALID_SESSION_ID'}])
+            return
+        url = urlsplit(self.path)
+        status_code, body = self.route(url.path, parse_qs(url.query), count=True)
+        self.send_json(status_code, body)
+
+    def route(self, path, params, count=False):
+        match = API_PATH_PATTERN.match(path)
+        resource = match.group('resource') if match else ''
+        prefix = path[:len(path) - len(resource)].rstrip('/')
+        if resource in ('query', 'queryAll', 'tooling/query'):
+            kind = 'tooling' if resource.startswith('tooling') else 'query'
+            status_code, body = self.org.run_query(params.get('q', [''])[0], f'{prefix}/{resource}')
+        elif re.match(r'^(tooling/)?query(All)?/', resource):
+            kind = 'query_more'
+            status_code, body = self.org.query_more(resource.rsplit('/', 1)[1])
+            if status_code == 200 and body.get('nextRecordsUrl'):
+                body['nextRecordsUrl'] = f"{prefix}/{resource.rsplit('/', 1)[0]}{body['nextRecordsUrl']}"
+        elif resource.startswith('sobjects/') and resource.endswith('/describe'):
+            kind = 'describe'
+            status_code, body = self.org.describe(resource.split('/')[1])
+        elif resource == 'limits':
+            kind = 'limits'
+            status_code, body = self.org.limits()
+        else:
+            kind = 'not_found'
+            status_code, body = 404, [{'message': 'The requested resource does not exist', 'errorCode': 'NOT_FOUND'}]
+        if count:
+            self.org.count(kind if status_code < 400 else 'error')
+        return status_code, body
+
+    def send_json(self, status_code, body):
+        self.send_body(status_code, json.dumps(body).encode('utf-8'), 'application/json', {
+            'Sforce-Limit-Info': f'api-usage={self.org.get_total_requests()}/{self.org.daily_limit}'
+        })
+
+    def send_body(self, status_code, content, content_type, headers=None):
+        if self.org.latency:
+            time.sleep(self.org.latency)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            content = gzip.compress(content, compresslevel=1)
+            headers = dict(headers or {}, **{'Content-Encoding': 'gzip'})
+        self.org.add_bytes_sent(len(content))
+        self.send_response(status_code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class StubServer:
+    def __init__(self, org=None, host='127.0.0.1', port=0):
+        self.org = org or StubOrg()
+        self._server = ThreadingHTTPServer((host, port), StubRequestHandler)
+        self._server.daemon_threads = True
+        self._server.org = self.org
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
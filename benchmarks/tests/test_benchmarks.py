@@ -0,0 +1,72 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import pytest
+import requests
+import salesforce.api.transport as transport
+import salesforce.benchmarks.run_benchmarks as run_benchmarks
+from salesforce.benchmarks.stub_server import StubOrg, StubServer
+
+@pytest.fixture
+def server():
+    with StubServer(StubOrg(total_records=5, page_size=2, record_width=1)) as server:
+        yield server
+
+def get(server, path, params=None):
+    headers = {'Authorization': f'Bearer {server.org.session_id}'}
+    return requests.get(f'{server.url}{path}', params=params, headers=headers)
+
+def test_stub_pages_queries(server):
+    page = get(server, '/services/data/v58.0/query', {'q': 'SELECT Id, Field0__c FROM Account'}).json()
+    records = page['records']
+    while page.get('nextRecordsUrl'):
+        page = get(server, page['nextRecordsUrl']).json()
+        records += page['records']
+    assert [record['Id'] for record in records] == [f'001{index:015d}' for index in range(5)]
+    assert page['done'] and server.org.request_counts == {'query': 1, 'query_more': 2}
+
+def test_stub_errors(server):
+    assert get(server, '/services/data/v58.0/query', {'q': 'SELECT Invalid__c FROM Account'}).json()[0]['errorCode'] == 'INVALID_FIELD'
+    assert get(server, '/services/data/v58.0/query/01gSTUB99-2').json()[0]['errorCode'] == 'INVALID_QUERY_LOCATOR'
+    response = requests.get(f'{server.url}/services/data/v58.0/limits')
+    assert response.status_code == 401 and server.org.request_counts['unauthorized'] == 1
+
+def test_stub_login_and_composite_batch(server):
+    login = requests.post(f'{server.url}/services/Soap/u/58.0', data='<login/>')
+    assert f'<serverUrl>{server.url}/services/Soap/u/58.0/00DSTUB</serverUrl>' in login.text
+    batch = requests.post(f'{server.url}/services/data/v58.0/composite/batch', json={'batchRequests': [
+        {'method': 'GET', 'url': 'v58.0/sobjects/Account/describe'},
+        {'method': 'GET', 'url': 'v58.0/query?q=SELECT+Invalid__c+FROM+Account'}]}).json()
+    assert batch['hasErrors'] and [result['statusCode'] for result in batch['results']] == [200, 400]
+    assert [field['name'] for field in batch['results'][0]['result']['fields']] == ['Id', 'Field0__c']
+
+def test_harness_saves_runs_and_flags_regressions(tmp_path, capsys):
+    results_file = str(tmp_path / 'runs' / 'results.jsonl')
+    arguments = ['--records', '30', '--page-size', '10', '--width', '2', '--iterations', '2',
+                 '--only', 'iter_query', 'describe', 'error_response', '--results-file', results_file]
+    shared_transport = transport.get_transport()
+    assert run_benchmarks.main(arguments) == 0
+    assert transport.get_transport() is shared_transport
+    with open(results_file, 'r', encoding='utf-8') as file:
+        run, = [json.loads(line) for line in file]
+    results = {result['name']: result for result in run['results']}
+    assert set(results) == {'iter_query', 'describe', 'error_response'}
+    assert results['iter_query']['requestsPerCall'] == 3 and results['iter_query']['recordsPerSecond'] > 0
+    assert results['error_response']['recordsPerSecond'] == 0
+    assert 'iter_query' in capsys.readouterr().out
+
+    slower = [dict(result, p50Ms=result['p50Ms'] * 2 + 1) for result in run['results']]
+    regressions = run_benchmarks.find_regressions(slower, run_benchmarks.load_previous_run(results_file, run['config']))
+    assert {regression['name'] for regression in regressions} == set(results)
+    assert run_benchmarks.load_previous_run(results_file, dict(run['config'], iterations=3)) is None
+
+def test_default_results_file_is_outside_the_repository():
+    repository = os.path.dirname(os.path.dirname(os.path.abspath(run_benchmarks.__file__)))
+    assert not os.path.abspath(run_benchmarks.DEFAULT_RESULTS_FILE).startswith(repository + os.sep)
+    assert run_benchmarks.get_percentile([3, 1, 2], 50) == 2 and run_benchmarks.get_percentile([3, 1, 2], 99) == 3
+
+
+# Run the tests
+if __name__ == '__main__':
+    pytest.main(['-v', __file__])
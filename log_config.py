@@ -1,30 +1,176 @@
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+
+LOG_LEVEL_VARIABLE = 'SALESFORCE_LOG_LEVEL'
+LOG_FILE_VARIABLE = 'SALESFORCE_LOG_FILE'
+DEFAULT_LOG_LEVEL = 'INFO'
+DEFAULT_LOG_FILE = 'salesforce.log'
+MAX_LOG_FILE_BYTES = 10 * 1024 * 1024
+LOG_FILE_BACKUP_COUNT = 5
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+PAYLOAD_SAMPLE_RATE_VARIABLE = 'SALESFORCE_LOG_PAYLOAD_SAMPLE_RATE'
+MAX_PAYLOADS_PER_SECOND = 1
+MAX_PAYLOAD_CHARS = 2000
+
+_queue_handler = None
+_queue_listener = None
+_payload_sampler = None
+_listener_started = False
+_listener_stopped = False
+_configure_lock = threading.Lock()
+
+
+class StartingQueueHandler(logging.handlers.QueueHandler):
+    # Starts the listener thread with the first record rather than at import time.
+    def emit(self, record):
+        start_logging()
+        super().emit(record)
 
-def get_logger(module_name, file_name="Log %(asctime)s.log"):
-    # Create a logger
-    logger = logging.getLogger(module_name)
-    # Set the log level
-    logger.setLevel(logging.DEBUG)
-
-    # Create a console handler
-    console_handler = logging.StreamHandler()
-    # Set the level for this handler
-    console_handler.setLevel(logging.DEBUG)
-    # Create a formatter and set the formatter for the console handler.
-    console_format = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    console_handler.setFormatter(console_format)
-    # Add the console handler to the logger
-    logger.addHandler(console_handler)
-    
-    # Create a file handler
-    file_handler = logging.FileHandler(file_name)
-    # Set the level for this handler
-    file_handler.setLevel(logging.DEBUG)
-    # Create a formatter and set the formatter for the file handler.
-    file_format = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    file_handler.setFormatter(file_format)
-    # Add the file handler to the logger
-    logger.addHandler(file_handler)
 
+def configure_logging(file_name=None, level=None):
+    # Safe to call any number of times: the first call builds one QueueHandler on the root logger
+    # and one QueueListener that owns the console and rotating file handlers, later calls reuse them.
+    # Records are only put on a queue by the calling thread; formatting and file I/O happen on
+    # the listener thread, which is started by the first record logged.
+    global _queue_handler, _queue_listener
+    with _configure_lock:
+        if _queue_handler is not None:
+            return _queue_handler
+
+        formatter = logging.Formatter(LOG_FORMAT)
+
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+
+        file_handler = logging.handlers.RotatingFileHandler(file_name or os.environ.get(LOG_FILE_VARIABLE, DEFAULT_LOG_FILE),
+                                                            maxBytes=MAX_LOG_FILE_BYTES,
+                                                            backupCount=LOG_FILE_BACKUP_COUNT,
+                                                            delay=True)
+        file_handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        _queue_handler = StartingQueueHandler(log_queue)
+        _queue_handler.setLevel(get_log_level(level))
+        _queue_listener = logging.handlers.QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+        # On the root logger only, so records from nested module loggers aren't queued once per ancestor.
+        logging.getLogger().addHandler(_queue_handler)
+        return _queue_handler
+
+def get_logger(module_name, file_name=None):
+    handler = configure_logging(file_name)
+    logger = logging.getLogger(module_name)
+    logger.setLevel(handler.level)
     return logger
 
+def get_log_level(level=None):
+    level = level or os.environ.get(LOG_LEVEL_VARIABLE, DEFAULT_LOG_LEVEL)
+    if isinstance(level, int):
+        return level
+    # getLevelName maps a known name to its number and anything else to a 'Level ...' string.
+    level = logging.getLevelName(str(level).upper())
+    return level if isinstance(level, int) else logging.INFO
+
+def start_logging():
+    global _listener_started
+    if _listener_started:
+        return
+    with _configure_lock:
+        if _queue_listener is not None and not _listener_started:
+            _queue_listener.start()
+            _listener_started = True
+            atexit.register(stop_logging)
+
+def stop_logging():
+    # Flushes queued records on exit. The listener is not restarted afterwards, and later calls do nothing.
+    global _listener_stopped
+    with _configure_lock:
+        if _queue_listener is not None and _listener_started and not _listener_stopped:
+            _queue_listener.stop()
+            _listener_stopped = True
+
+
+class PayloadSampler:
+    # Decides whether a payload may be logged: a random sample_rate share of calls, and never
+    # more than max_per_second of them, so DEBUG runs don't turn into full body dumps.
+    def __init__(self, sample_rate=1.0, max_per_second=MAX_PAYLOADS_PER_SECOND):
+        self.sample_rate = sample_rate
+        self.max_per_second = max_per_second
+        self._window_start = 0
+        self._window_count = 0
+        self._lock = threading.Lock()
+
+    def should_log(self):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= 1:
+                self._window_start = now
+                self._window_count = 0
+            if self._window_count >= self.max_per_second:
+                return False
+            self._window_count += 1
+            return True
+
+
+def get_payload_sample_rate():
+    value = os.environ.get(PAYLOAD_SAMPLE_RATE_VARIABLE)
+    if value is None:
+        return 1.0
+    try:
+        return min(max(float(value), 0.0), 1.0)
+    except ValueError:
+        logging.getLogger(__name__).warning("Ignoring %s=%r, not a number", PAYLOAD_SAMPLE_RATE_VARIABLE, value)
+        return 1.0
+
+def get_payload_sampler():
+    # Built on first use, so a bad sample rate in the environment can't break imports.
+    global _payload_sampler
+    if _payload_sampler is None:
+        sampler = PayloadSampler(sample_rate=get_payload_sample_rate())
+        with _configure_lock:
+            if _payload_sampler is None:
+                _payload_sampler = sampler
+    return _payload_sampler
+
+def iter_repr(value):
+    # repr() of dicts and lists in pieces, so a large page can be cut off without rendering all of it.
+    if isinstance(value, dict):
+        yield '{'
+        for index, (key, item) in enumerate(value.items()):
+            yield f'{", " if index else ""}{key!r}: '
+            yield from iter_repr(item)
+        yield '}'
+    elif isinstance(value, list):
+        yield '['
+        for index, item in enumerate(value):
+            if index:
+                yield ', '
+            yield from iter_repr(item)
+        yield ']'
+    elif isinstance(value, str):
+        yield repr(value[:MAX_PAYLOAD_CHARS + 1])
+    else:
+        yield repr(value)
+
+def truncate_payload(payload, max_chars=MAX_PAYLOAD_CHARS):
+    pieces = iter_repr(payload) if not isinstance(payload, str) else iter([payload])
+    text = ''
+    for piece in pieces:
+        text += piece
+        if len(text) > max_chars:
+            return f"{text[:max_chars]}... (truncated)"
+    return text
+
+def log_payload(logger, label, payload, sampler=None):
+    # Payloads are only rendered at DEBUG and when sampled, and only up to MAX_PAYLOAD_CHARS.
+    if not logger.isEnabledFor(logging.DEBUG) or not (sampler or get_payload_sampler()).should_log():
+        return
+    logger.debug("%s: %s", label, truncate_payload(payload))
@@ -1,4 +1,21 @@
-from simple_salesforce import format_soql
+from urllib.parse import quote_plus, urlencode
+
+# The REST query endpoint takes SOQL in the URL, so stay well under its ~16k character limit.
+MAX_QUERY_LENGTH = 15000
+# Queries go out as GET ?q=<urlencoded query>; Salesforce rejects request URIs over 16384 bytes,
+# and the host and path need a few hundred of them.
+MAX_ENCODED_QUERY_LENGTH = 16000
+MAX_AGGREGATE_FUNCTIONS = 100
+MAX_OFFSET = 2000
+SOQL_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+def format_soql(query_string, *args, **kwargs):
+    # simple_salesforce is only imported when there is something to substitute; a query without
+    # placeholders comes back from its formatter unchanged, so this keeps importing soql cheap.
+    if not args and not kwargs and '{' not in query_string and '}' not in query_string:
+        return query_string
+    from simple_salesforce import format_soql as simple_salesforce_format_soql
+    return simple_salesforce_format_soql(query_string, *args, **kwargs)
 
 def get_last_created_with_field(object_name, field_name):
     query_string = f'SELECT CreatedDate, {field_name} FROM {object_name} WHERE {field_name} != null ORDER BY CreatedDate DESC LIMIT 1'
@@ -12,6 +29,109 @@ def get_count_of_fields_values(object_name, field_names):
     query_string = f'SELECT {", ".join([f"COUNT({field_name})" for field_name in field_names])} FROM {object_name}'
     return format_soql(query_string)
 
+def get_changed_since(object_name, field_names, watermark_field='SystemModstamp', since=None):
+    # since is a SOQL datetime literal; >= rather than > so rows sharing the watermark second are not lost.
+    where_clause = f' WHERE {watermark_field} >= {since}' if since else ''
+    query_string = f'SELECT {", ".join(field_names)} FROM {object_name}{where_clause} ORDER BY {watermark_field} ASC'
+    return format_soql(query_string)
+
 def get_most_common_values(object_name, field_name, groups_to_count=3):
     query_string = f'SELECT {field_name}, COUNT(Id) FROM {object_name} GROUP BY {field_name} ORDER BY COUNT(Id) DESC LIMIT {groups_to_count}'
-    return format_soql(query_string)
\ No newline at end of file
+    return format_soql(query_string)
+
+def plan_count_of_fields_values(object_name, field_names, max_query_length=MAX_QUERY_LENGTH, max_aggregate_functions=MAX_AGGREGATE_FUNCTIONS,
+                                max_encoded_length=MAX_ENCODED_QUERY_LENGTH):
+    # Packs the COUNT() columns into as few queries as fit under both the length and the
+    # aggregate function caps, and under max_encoded_length once urlencoded as the q parameter
+    # of a GET. Returns (field_names, query_string) pairs in field order.
+    base_lengths = get_query_lengths(f'SELECT  FROM {object_name}')
+    limits = (max_query_length, max_encoded_length)
+    chunks = []
+    chunk = []
+    chunk_lengths = base_lengths
+    for field_name in field_names:
+        field_lengths = get_text_lengths(f'{", " if chunk else ""}COUNT({field_name})')
+        if chunk and (not fits_lengths(add_lengths(chunk_lengths, field_lengths), limits) or len(chunk) >= max_aggregate_functions):
+            chunks.append(chunk)
+            chunk = []
+            chunk_lengths = base_lengths
+            field_lengths = get_text_lengths(f'COUNT({field_name})')
+        chunk.append(field_name)
+        chunk_lengths = add_lengths(chunk_lengths, field_lengths)
+    if chunk:
+        chunks.append(chunk)
+    return [(chunk, get_count_of_fields_values(object_name, chunk)) for chunk in chunks]
+
+def get_boundary_id(object_name, where_clause=None, descending=False):
+    return get_boundary_value(object_name, 'Id', where_clause, descending=descending)
+
+def get_boundary_value(object_name, field_name, where_clause=None, descending=False):
+    where = f' WHERE {where_clause}' if where_clause else ''
+    query_string = f'SELECT {field_name} FROM {object_name}{where} ORDER BY {field_name} {"DESC" if descending else "ASC"} LIMIT 1'
+    return format_soql(query_string)
+
+def get_record_count(object_name, where_clause=None):
+    where = f' WHERE {where_clause}' if where_clause else ''
+    return format_soql(f'SELECT COUNT() FROM {object_name}{where}')
+
+def get_records_in_id_range(object_name, field_names, lower_id=None, upper_id=None, where_clause=None):
+    # Selects lower_id < Id <= upper_id; a missing bound leaves that side of the range open.
+    conditions = [f'({where_clause})'] if where_clause else []
+    if lower_id:
+        conditions.append(f"Id > '{lower_id}'")
+    if upper_id:
+        conditions.append(f"Id <= '{upper_id}'")
+    where = f' WHERE {" AND ".join(conditions)}' if conditions else ''
+    query_string = f'SELECT {", ".join(field_names)} FROM {object_name}{where}'
+    return format_soql(query_string)
+
+def get_value_at_offset(object_name, field_name, lower_literal, upper_literal, offset):
+    # The offset-th value of field_name in (lower, upper]; SOQL caps offset at 2000.
+    order_by = f'{field_name} ASC' if field_name == 'Id' else f'{field_name} ASC, Id ASC'
+    query_string = (f'SELECT {field_name} FROM {object_name} WHERE {field_name} > {lower_literal} AND {field_name} <= {upper_literal} '
+                    f'ORDER BY {order_by} LIMIT 1 OFFSET {offset}')
+    return format_soql(query_string)
+
+def get_sample_block(object_name, field_names, order_field, start_literal, limit):
+    # limit consecutive rows from start_literal on, in order_field order; order_field should be indexed.
+    # Id breaks ties so that queries over different field lists return the same rows.
+    order_by = f'{order_field} ASC' if order_field == 'Id' else f'{order_field} ASC, Id ASC'
+    query_string = f'SELECT {", ".join(field_names)} FROM {object_name} WHERE {order_field} >= {start_literal} ORDER BY {order_by} LIMIT {limit}'
+    return format_soql(query_string)
+
+def plan_select_field_groups(object_name, field_names, key_field='Id', max_query_length=MAX_QUERY_LENGTH, reserved_length=200,
+                             max_encoded_length=MAX_ENCODED_QUERY_LENGTH):
+    # Splits a long field list into SELECT lists that each fit under the length cap with room for a
+    # WHERE/ORDER BY of reserved_length characters. Every group starts with key_field so rows can be matched.
+    # Groups also fit under max_encoded_length once urlencoded, allowing for a reserved clause that
+    # triples in length when encoded.
+    base_lengths = add_lengths(get_query_lengths(f'SELECT {key_field} FROM {object_name}'), (reserved_length, 3 * reserved_length))
+    limits = (max_query_length, max_encoded_length)
+    groups = []
+    group = [key_field]
+    group_lengths = base_lengths
+    for field_name in field_names:
+        if field_name == key_field:
+            continue
+        field_lengths = get_text_lengths(f', {field_name}')
+        if len(group) > 1 and not fits_lengths(add_lengths(group_lengths, field_lengths), limits):
+            groups.append(group)
+            group = [key_field]
+            group_lengths = base_lengths
+        group.append(field_name)
+        group_lengths = add_lengths(group_lengths, field_lengths)
+    groups.append(group)
+    return groups
+
+def get_text_lengths(text):
+    # (characters, characters once urlencoded) of a piece of a query.
+    return len(text), len(quote_plus(text))
+
+def get_query_lengths(query_string):
+    return len(query_string), len(urlencode({'q': query_string}))
+
+def add_lengths(lengths, other_lengths):
+    return tuple(length + other for length, other in zip(lengths, other_lengths))
+
+def fits_lengths(lengths, limits):
+    return all(length <= limit for length, limit in zip(lengths, limits))
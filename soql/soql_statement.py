@@ -1,61 +1,143 @@
+import datetime
+import numbers
 import os
 import sys
+from urllib.parse import quote_plus, urlencode
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from abc import ABC, abstractmethod
 
+import salesforce.soql.soql as soql
+
+SOQL_ESCAPES = str.maketrans({'\\': '\\\\', "'": "\\'", '"': '\\"', '\n': '\\n', '\r': '\\r', '\t': '\\t', '\b': '\\b', '\f': '\\f'})
+IN_VALUES_PARAMETER = '_in_values'
+# Stands for a parameter added without a value, which must be bound before rendering.
+_UNBOUND = object()
+
+
+class Parameter:
+    # A placeholder for a value that is quoted and escaped when the query is rendered.
+    def __init__(self, name):
+        self.name = name
+
+    def __str__(self):
+        return f':{self.name}'
+
+    def __repr__(self):
+        return f'Parameter({self.name!r})'
+
+
+def quote_soql_value(value):
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, numbers.Number):
+        return str(value)
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc)
+        return value.strftime(soql.SOQL_DATETIME_FORMAT)
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return f"({', '.join(quote_soql_value(item) for item in value)})"
+    return f"'{str(value).translate(SOQL_ESCAPES)}'"
+
+
 class SOQLStatement(ABC):
-    def __init__(self, object_name, fields=[]):
+    # The rendered query is cached until the statement changes through one of its methods. Code
+    # that edits fields or where_conditions in place must call invalidate() afterwards.
+    def __init__(self, object_name, fields=None):
         self.object_name = object_name
-        self.fields = fields
+        self.fields = list(fields) if fields else []
         self.where_conditions = []
         self.order_by_fields = []
+        self.parameters = {}
+        self._template = None
+        self._query = None
 
     def add_field(self, field):
         if field not in self.fields:
             self.fields.append(field)
+            self.invalidate()
 
     def remove_field(self, field):
         if field in self.fields:
             self.fields.remove(field)
+            self.invalidate()
 
     def add_condition(self, field, operator, value):
+        # value is inserted as written, unless it is a Parameter, which is bound with bind().
         self.where_conditions.append((field, operator, value))
-    
+        self.invalidate()
+
+    def add_parameter_condition(self, field, operator, name, value=_UNBOUND):
+        # Pass value=None to compare with null; without a value the parameter stays unbound.
+        self.add_condition(field, operator, Parameter(name))
+        if value is not _UNBOUND:
+            self.parameters[name] = value
+        return self
+
+    def bind(self, **parameters):
+        self.parameters.update(parameters)
+        self._query = None
+        return self
+
+    def invalidate(self):
+        self._template = None
+        self._query = None
+
+    def get_template(self):
+        if self._template is None:
+            self._template = self.build_template()
+        return self._template
+
     @abstractmethod
-    def construct_query(self):
+    def build_template(self, extra_conditions=()):
         pass
-    
+
+    def construct_query(self):
+        if self._query is None:
+            self._query = self.render_template(self.get_template(), self.quote_parameters(self.parameters))
+        return self._query
+
+    def render(self, **parameters):
+        # Renders with these values without storing them, reusing the cached template.
+        return self.render_template(self.get_template(), self.quote_parameters({**self.parameters, **parameters}))
+
+    def quote_parameters(self, parameters):
+        return {name: quote_soql_value(value) for name, value in parameters.items()}
+
+    def render_template(self, template, literals):
+        try:
+            return ''.join(part if isinstance(part, str) else literals[part.name] for part in template)
+        except KeyError as e:
+            raise ValueError(f"No value bound for parameter {e.args[0]}") from None
+
     def __str__(self):
         return self.construct_query()
 
 class SelectSOQLStatement(SOQLStatement):
     def __init__(self, object_name, fields):
         super().__init__(object_name, fields)
-        
+
     def add_order_by(self, field, direction='ASC'):
         self.order_by_fields.append((field, direction))
+        self.invalidate()
 
     def echo_where_clause(self):
-        where_str = ''
-        if self.where_conditions:
-            where_str = ' AND '.join([f"{field} {operator} {value}" for field, operator, value in self.where_conditions])
-            where_str = f"WHERE {where_str}"
-            print(f"{where_str}")
-
-        return where_str
+        return ''.join(str(part) for part in self.get_where_parts())
 
     def echo_select_clause(self):
         fields_str = ''
         if self.fields:
             fields_str = ', '.join(self.fields)
             fields_str = f"SELECT {fields_str}"
-            print(f"{fields_str}")
 
         return fields_str
 
     def echo_from_clause(self):
         from_clause = f"FROM {self.object_name}"
-        print(f"{from_clause}")
 
         return from_clause
 
@@ -64,11 +146,59 @@ class SelectSOQLStatement(SOQLStatement):
         if self.order_by_fields:
             order_by_str = ', '.join([f"{field} {direction}" for field, direction in self.order_by_fields])
             order_by_str = f"ORDER BY {order_by_str}"
-            print(f"{order_by_str}")
         return order_by_str
 
-    def construct_query(self):
-        query = f"{self.echo_select_clause()} {self.echo_from_clause()} {self.echo_where_clause()} {self.echo_order_by_clause()}"
+    def get_where_parts(self, extra_conditions=()):
+        parts = []
+        for field, operator, value in [*self.where_conditions, *extra_conditions]:
+            parts.append(' AND ' if parts else 'WHERE ')
+            parts.append(f"{field} {operator} ")
+            parts.append(value if isinstance(value, Parameter) else str(value))
+        return parts
+
+    def build_template(self, extra_conditions=()):
+        # The query as literal strings and Parameter placeholders, with neighbouring strings merged.
+        template = []
+        clauses = [[self.echo_select_clause()], [self.echo_from_clause()], self.get_where_parts(extra_conditions), [self.echo_order_by_clause()]]
+        for clause in clauses:
+            if not any(clause):
+                continue
+            for part in ([' '] if template else []) + clause:
+                if isinstance(part, str) and template and isinstance(template[-1], str):
+                    template[-1] += part
+                else:
+                    template.append(part)
+        return template
 
-        return query
+    def construct_in_queries(self, field, values, max_query_length=soql.MAX_QUERY_LENGTH, max_encoded_length=soql.MAX_ENCODED_QUERY_LENGTH):
+        # Adds 'field IN (...)' to the statement and packs the distinct values into as few queries
+        # as fit, e.g. to look up a large set of Ids. Each query is at most max_query_length
+        # characters, and at most max_encoded_length once urlencoded as the q parameter of a GET.
+        template = self.build_template(extra_conditions=[(field, 'IN', Parameter(IN_VALUES_PARAMETER))])
+        literals = self.quote_parameters(self.parameters)
+        quoted_values = list(dict.fromkeys(quote_soql_value(value) for value in values))
+        base_query = self.render_template(template, {**literals, IN_VALUES_PARAMETER: '()'})
+        base_lengths = (len(base_query), len(urlencode({'q': base_query})))
+        separator_lengths = (len(', '), len(quote_plus(', ')))
+        limits = (max_query_length, max_encoded_length)
 
+        queries = []
+        chunk = []
+        chunk_lengths = base_lengths
+        for quoted_value in quoted_values:
+            value_lengths = (len(quoted_value), len(quote_plus(quoted_value)))
+            if any(base + value > limit for base, value, limit in zip(base_lengths, value_lengths, limits)):
+                raise ValueError(f"A query for value {quoted_value} would be longer than {max_query_length} characters "
+                                 f"or {max_encoded_length} once encoded")
+            if chunk:
+                value_lengths = tuple(value + separator for value, separator in zip(value_lengths, separator_lengths))
+                if any(length + value > limit for length, value, limit in zip(chunk_lengths, value_lengths, limits)):
+                    queries.append(self.render_template(template, {**literals, IN_VALUES_PARAMETER: f"({', '.join(chunk)})"}))
+                    chunk = []
+                    chunk_lengths = base_lengths
+                    value_lengths = tuple(value - separator for value, separator in zip(value_lengths, separator_lengths))
+            chunk.append(quoted_value)
+            chunk_lengths = tuple(length + value for length, value in zip(chunk_lengths, value_lengths))
+        if chunk:
+            queries.append(self.render_template(template, {**literals, IN_VALUES_PARAMETER: f"({', '.join(chunk)})"}))
+        return queries
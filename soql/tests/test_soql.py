@@ -0,0 +1,55 @@
+import unittest
+from urllib.parse import urlencode
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from .. import soql
+
+
+class TestPlanCountOfFieldsValues(unittest.TestCase):
+    def test_small_field_list_is_one_query(self):
+        plan = soql.plan_count_of_fields_values('Account', ['Name', 'Industry'])
+        self.assertEqual(plan, [(['Name', 'Industry'], 'SELECT COUNT(Name), COUNT(Industry) FROM Account')])
+
+    def test_aggregate_cap_splits_fields(self):
+        fields = [f'Field{index}__c' for index in range(7)]
+        plan = soql.plan_count_of_fields_values('Account', fields, max_aggregate_functions=3)
+        self.assertEqual([chunk for chunk, _ in plan], [fields[0:3], fields[3:6], fields[6:7]])
+
+    def test_every_query_fits_the_length_cap(self):
+        fields = [f'Very_Long_Custom_Field_Name_{index}__c' for index in range(500)]
+        plan = soql.plan_count_of_fields_values('Account', fields, max_query_length=1000)
+        self.assertTrue(all(len(query_string) <= 1000 for _, query_string in plan))
+        self.assertEqual([field for chunk, _ in plan for field in chunk], fields)
+
+    def test_every_query_fits_in_a_request_uri_once_encoded(self):
+        fields = [f'Field{index}__c' for index in range(3000)]
+        plan = soql.plan_count_of_fields_values('Account', fields, max_aggregate_functions=len(fields))
+        self.assertGreater(len(plan), 1)
+        self.assertTrue(all(len(urlencode({'q': query_string})) <= soql.MAX_ENCODED_QUERY_LENGTH for _, query_string in plan))
+        self.assertEqual([field for chunk, _ in plan for field in chunk], fields)
+
+
+class TestPlanSelectFieldGroups(unittest.TestCase):
+    def test_groups_fit_in_a_request_uri_once_encoded(self):
+        fields = [f'Field{index}__c' for index in range(3000)]
+        groups = soql.plan_select_field_groups('Account', fields)
+        self.assertEqual([field for group in groups for field in group[1:]], fields)
+        for group in groups:
+            query_string = soql.get_sample_block('Account', group, 'CreatedDate', '2024-01-01T00:00:00Z', 500)
+            self.assertEqual(group[0], 'Id')
+            self.assertLessEqual(len(query_string), soql.MAX_QUERY_LENGTH)
+            self.assertLessEqual(len(urlencode({'q': query_string})), soql.MAX_ENCODED_QUERY_LENGTH)
+
+
+class TestGetRecordsInIdRange(unittest.TestCase):
+    def test_bounds_and_filter_are_combined(self):
+        query_string = soql.get_records_in_id_range('Account', ['Id', 'Name'], '001A', '001B', 'IsDeleted = false')
+        self.assertEqual(query_string, "SELECT Id, Name FROM Account WHERE (IsDeleted = false) AND Id > '001A' AND Id <= '001B'")
+
+    def test_open_range_has_no_where_clause(self):
+        self.assertEqual(soql.get_records_in_id_range('Account', ['Id']), 'SELECT Id FROM Account')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,9 @@ import re
 import os
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from ..soql_statement import SOQLStatement, SelectSOQLStatement
+import datetime
+from urllib.parse import urlencode
+from ..soql_statement import SOQLStatement, SelectSOQLStatement, Parameter, quote_soql_value
 
 
 class TestSOQLStatement(unittest.TestCase):
@@ -36,5 +38,74 @@ class TestSOQLStatement(unittest.TestCase):
         self.assertEqual(query, expected_query)
 
 
+class TestBoundParameters(unittest.TestCase):
+    def test_values_are_quoted_and_escaped(self):
+        self.assertEqual(quote_soql_value("O'Brien \\ \n"), "'O\\'Brien \\\\ \\n'")
+        self.assertEqual(quote_soql_value(None), 'null')
+        self.assertEqual(quote_soql_value(True), 'true')
+        self.assertEqual(quote_soql_value(datetime.date(2024, 1, 31)), '2024-01-31')
+        self.assertEqual(quote_soql_value(datetime.datetime(2024, 1, 31, 12, 0, tzinfo=datetime.timezone.utc)), '2024-01-31T12:00:00Z')
+        self.assertEqual(quote_soql_value(['a', 1]), "('a', 1)")
+
+    def test_bound_parameter_is_rendered(self):
+        statement = SelectSOQLStatement('Account', ['Id'])
+        statement.add_parameter_condition('Name', '=', 'name', "O'Brien")
+        self.assertEqual(statement.construct_query(), "SELECT Id FROM Account WHERE Name = 'O\\'Brien'")
+        self.assertEqual(statement.render(name='Acme'), "SELECT Id FROM Account WHERE Name = 'Acme'")
+        self.assertEqual(statement.echo_where_clause(), 'WHERE Name = :name')
+
+    def test_unbound_parameter_raises(self):
+        statement = SelectSOQLStatement('Account', ['Id'])
+        statement.add_condition('Name', '=', Parameter('name'))
+        with self.assertRaises(ValueError):
+            statement.construct_query()
+
+    def test_parameter_added_without_value_stays_unbound(self):
+        statement = SelectSOQLStatement('Account', ['Id'])
+        statement.add_parameter_condition('Name', '=', 'name')
+        with self.assertRaises(ValueError):
+            statement.construct_query()
+        statement.add_parameter_condition('ParentId', '=', 'parent', None)
+        self.assertEqual(statement.render(name='A'), "SELECT Id FROM Account WHERE Name = 'A' AND ParentId = null")
+
+    def test_rendering_is_cached_until_mutation(self):
+        statement = SelectSOQLStatement('Account', ['Id'])
+        query = statement.construct_query()
+        self.assertIs(statement.construct_query(), query)
+        statement.add_field('Name')
+        self.assertEqual(statement.construct_query(), 'SELECT Id, Name FROM Account')
+        statement.add_parameter_condition('Name', '=', 'name', 'A')
+        statement.bind(name='B')
+        self.assertEqual(statement.construct_query(), "SELECT Id, Name FROM Account WHERE Name = 'B'")
+
+
+class TestInQueries(unittest.TestCase):
+    def test_values_are_split_to_fit_the_length_limit(self):
+        statement = SelectSOQLStatement('Account', ['Id', 'Name'])
+        statement.add_condition('IsDeleted', '=', 'false')
+        statement.add_order_by('Name')
+        ids = [f'001{index:015d}' for index in range(1000)] + ['001000000000000000']
+        queries = statement.construct_in_queries('Id', ids, max_query_length=2000)
+        self.assertTrue(all(len(query) <= 2000 for query in queries))
+        self.assertTrue(queries[0].startswith("SELECT Id, Name FROM Account WHERE IsDeleted = false AND Id IN ('001000000000000000', "))
+        self.assertTrue(queries[0].endswith(') ORDER BY Name ASC'))
+        self.assertEqual(sum(query.count("'") // 2 for query in queries), 1000)
+        self.assertTrue(all(len(query) + len(", '001000000000000000'") > 2000 for query in queries[:-1]))
+
+    def test_encoded_queries_fit_in_a_request_uri(self):
+        statement = SelectSOQLStatement('Account', ['Id', 'Name'])
+        ids = [f'001{index:012d}AAA' for index in range(100000)]
+        queries = statement.construct_in_queries('Id', ids)
+        encoded_lengths = [len(urlencode({'q': query})) for query in queries]
+        self.assertLessEqual(max(encoded_lengths), 16000)
+        self.assertGreater(min(encoded_lengths[:-1]), 16000 - len(urlencode({'q': ", '001000000000000AAA'"})))
+        self.assertEqual(sum(query.count("'") // 2 for query in queries), 100000)
+
+    def test_too_long_value_raises(self):
+        statement = SelectSOQLStatement('Account', ['Id'])
+        with self.assertRaises(ValueError):
+            statement.construct_in_queries('Name', ['x' * 100], max_query_length=50)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file